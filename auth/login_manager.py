@@ -1,51 +1,61 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from database.models import User
-from datetime import datetime, timedelta
-from config import TOKEN_EXPIRY_DAYS
+from auth.session_manager import session_manager
 
 logger = logging.getLogger(__name__)
 
 class LoginManager:
-    """Klasa zarządzająca sesją zalogowanego użytkownika."""
+    """
+    Sesja zalogowanego użytkownika aplikacji okienkowej.
+    Przechowuje tylko token bieżącej sesji - stan sesji (użytkownik, data
+    wygaśnięcia) należy do session_manager, który obsługuje też inne
+    równoczesne sesje w tym samym procesie.
+    """
     
-    _current_user = None
-    _login_timestamp = None
+    _current_token = None
     
     @classmethod
     def login(cls, user):
         """
-        Zapisuje obecnie zalogowanego użytkownika.
+        Tworzy sesję dla zalogowanego użytkownika i zwraca jej token.
         """
-        cls._current_user = user
-        cls._login_timestamp = datetime.now()
+        if cls._current_token:
+            session_manager.revoke(cls._current_token)
+        cls._current_token = session_manager.create(user, client='desktop')
         logger.debug(f"Zalogowano użytkownika: {user.username}")
+        return cls._current_token
     
     @classmethod
     def logout(cls):
         """
         Wylogowuje obecnie zalogowanego użytkownika.
         """
-        if cls._current_user:
-            logger.debug(f"Wylogowano użytkownika: {cls._current_user.username}")
-            cls._current_user = None
-            cls._login_timestamp = None
+        if cls._current_token:
+            session_manager.revoke(cls._current_token)
+            cls._current_token = None
+            logger.debug("Wylogowano użytkownika")
+    
+    @classmethod
+    def get_token(cls):
+        """
+        Zwraca token bieżącej sesji lub None.
+        """
+        return cls._current_token
     
     @classmethod
     def get_current_user(cls):
         """
-        Zwraca obecnie zalogowanego użytkownika lub None.
+        Zwraca obecnie zalogowanego użytkownika lub None (także po wygaśnięciu sesji).
         """
-        # Sprawdzenie czy sesja nie wygasła
-        if cls._current_user and cls._login_timestamp:
-            expiry_time = cls._login_timestamp + timedelta(days=TOKEN_EXPIRY_DAYS)
-            if datetime.now() > expiry_time:
-                logger.debug("Sesja użytkownika wygasła, wylogowywanie...")
-                cls.logout()
-                return None
+        if not cls._current_token:
+            return None
         
-        return cls._current_user
+        user = session_manager.validate(cls._current_token)
+        if user is None:
+            logger.debug("Sesja użytkownika wygasła, wylogowywanie...")
+            cls._current_token = None
+        return user
     
     @classmethod
     def is_authenticated(cls):
@@ -65,8 +75,7 @@ class LoginManager:
     @classmethod
     def refresh_session(cls):
         """
-        Odświeża timestamp sesji użytkownika.
+        Przedłuża ważność bieżącej sesji.
         """
-        if cls._current_user:
-            cls._login_timestamp = datetime.now()
-            logger.debug(f"Odświeżono sesję użytkownika: {cls._current_user.username}")
\ No newline at end of file
+        if cls._current_token and session_manager.refresh(cls._current_token):
+            logger.debug("Odświeżono sesję użytkownika")
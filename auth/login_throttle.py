@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from database.db_manager import DatabaseManager
+from config import (MAX_LOGIN_ATTEMPTS, LOGIN_ATTEMPT_WINDOW, LOGIN_CLIENT_MAX_ATTEMPTS,
+                    LOGIN_THROTTLE_MAX_ENTRIES, LOGIN_THROTTLE_PRUNE_RATIO,
+                    LOGIN_THROTTLE_PERSIST_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+class LoginThrottle:
+    """
+    Ogranicznik nieudanych prób logowania (token bucket).
+    
+    Każda nazwa użytkownika ma kubełek o pojemności MAX_LOGIN_ATTEMPTS, a każdy
+    klient (np. adres stanowiska) - LOGIN_CLIENT_MAX_ATTEMPTS. Dopuszczona próba
+    od razu zabiera (rezerwuje) jeden żeton, więc równoległe próby nie mogą
+    przekroczyć limitu; udane logowanie go zwraca. Kubełek napełnia się do pełna
+    w ciągu LOGIN_ATTEMPT_WINDOW sekund. Sprawdzenie limitu to odczyt słownika
+    w pamięci, więc odrzucenie próby nie dotyka bazy ani funkcji haszującej.
+    Zmienione kubełki są okresowo zapisywane w tabeli login_attempts,
+    żeby limit przetrwał ponowne uruchomienie aplikacji.
+    """
+    
+    def __init__(self, max_attempts=MAX_LOGIN_ATTEMPTS, window=LOGIN_ATTEMPT_WINDOW,
+                 client_max_attempts=LOGIN_CLIENT_MAX_ATTEMPTS, max_entries=LOGIN_THROTTLE_MAX_ENTRIES,
+                 prune_ratio=LOGIN_THROTTLE_PRUNE_RATIO, persist_interval=LOGIN_THROTTLE_PERSIST_INTERVAL):
+        """Inicjalizacja ogranicznika."""
+        self.max_attempts = max_attempts
+        self.window = window
+        self.client_max_attempts = client_max_attempts
+        self.max_entries = max_entries
+        # Przycinanie schodzi od razu do tego poziomu, żeby nie powtarzać go przy każdym nowym wpisie
+        self.low_water = int(max_entries * prune_ratio)
+        self.persist_interval = persist_interval
+        # klucz ('u:<nazwa>' lub 'c:<klient>') -> [liczba żetonów, czas ostatniej zmiany],
+        # w kolejności ostatniej zmiany (najdawniej zmieniany na początku)
+        self._buckets = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._next_persist = time.monotonic() + persist_interval
+        self._stats = {
+            'allowed': 0,
+            'rejected': 0,
+            'failures': 0,
+            'prunes': 0,
+        }
+    
+    @staticmethod
+    def _keys(username, client):
+        """Zwraca klucze kubełków dla nazwy użytkownika i (opcjonalnie) klienta."""
+        if client is None:
+            return (f"u:{username}",)
+        return (f"u:{username}", f"c:{client}")
+    
+    def _capacity(self, key):
+        """Pojemność kubełka dla danego klucza."""
+        return self.max_attempts if key[0] == 'u' else self.client_max_attempts
+    
+    def _level(self, key, now):
+        """Aktualna liczba żetonów w kubełku (brak wpisu = pełny kubełek)."""
+        capacity = self._capacity(key)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket[0] + (now - bucket[1]) * capacity / self.window)
+    
+    def _take(self, key, now):
+        """Zabiera żeton z kubełka. Wywoływane z założoną blokadą."""
+        self._buckets[key] = [max(0.0, self._level(key, now) - 1), now]
+        self._buckets.move_to_end(key)
+        self._dirty.add(key)
+    
+    def _give_back(self, key, now):
+        """Zwraca żeton do kubełka (pełny kubełek jest usuwany). Wywoływane z założoną blokadą."""
+        if key not in self._buckets:
+            return
+        level = self._level(key, now) + 1
+        if level >= self._capacity(key):
+            del self._buckets[key]
+        else:
+            self._buckets[key] = [level, now]
+            self._buckets.move_to_end(key)
+        self._dirty.add(key)
+    
+    def allow(self, username, client=None):
+        """
+        Sprawdza, czy można podjąć próbę logowania, i jeśli tak - rezerwuje
+        po jednym żetonie z każdego kubełka. Po udanej próbie należy wywołać
+        reset(), a po próbie, której nie należy liczyć - release().
+        """
+        now = time.time()
+        keys = self._keys(username, client)
+        with self._lock:
+            for key in keys:
+                if self._level(key, now) < 1:
+                    self._stats['rejected'] += 1
+                    return False
+            for key in keys:
+                self._take(key, now)
+            self._stats['allowed'] += 1
+            if len(self._buckets) > self.max_entries:
+                self._prune(now)
+            return True
+    
+    def retry_after(self, username, client=None):
+        """Zwraca liczbę sekund do odzyskania kolejnej próby (0, jeśli można próbować)."""
+        now = time.time()
+        with self._lock:
+            wait = 0.0
+            for key in self._keys(username, client):
+                missing = 1 - self._level(key, now)
+                if missing > 0:
+                    wait = max(wait, missing * self.window / self._capacity(key))
+            return wait
+    
+    def record_failure(self, username, client=None):
+        """
+        Zapisuje nieudaną próbę logowania. Żeton zarezerwowany przez allow()
+        przepada, więc kubełki nie są już zmieniane.
+        """
+        with self._lock:
+            self._stats['failures'] += 1
+        
+        if time.monotonic() >= self._next_persist:
+            self.persist()
+    
+    def release(self, username, client=None):
+        """Zwraca żetony zarezerwowane przez allow() dla próby, której nie liczymy."""
+        now = time.time()
+        with self._lock:
+            for key in self._keys(username, client):
+                self._give_back(key, now)
+    
+    def reset(self, username, client=None):
+        """Czyści limit użytkownika po udanym logowaniu i zwraca żeton klienta."""
+        key = f"u:{username}"
+        now = time.time()
+        with self._lock:
+            if self._buckets.pop(key, None) is not None:
+                self._dirty.add(key)
+            if client is not None:
+                self._give_back(f"c:{client}", now)
+    
+    def _prune(self, now):
+        """
+        Usuwa najdawniej zmieniane kubełki (napełniają się jako pierwsze),
+        aż liczba wpisów spadnie do low_water. Wywoływane z założoną blokadą.
+        """
+        while len(self._buckets) > self.low_water:
+            key, _ = self._buckets.popitem(last=False)
+            self._dirty.add(key)
+        self._stats['prunes'] += 1
+    
+    def persist(self):
+        """
+        Zapisuje zmienione kubełki w tabeli login_attempts jedną transakcją
+        i usuwa wiersze, które zdążyły się napełnić. Zwraca liczbę zapisanych wpisów.
+        """
+        now = time.time()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            removed = []
+            for key in dirty:
+                bucket = self._buckets.get(key)
+                if bucket is None or self._level(key, now) >= self._capacity(key):
+                    removed.append((key,))
+                else:
+                    rows.append((key, bucket[0], bucket[1]))
+            self._next_persist = time.monotonic() + self.persist_interval
+        
+        try:
+            with DatabaseManager() as db:
+                with db.transaction():
+                    if rows:
+                        db.cursor.executemany(
+                            "INSERT OR REPLACE INTO login_attempts (key, tokens, updated_at) VALUES (?, ?, ?)",
+                            rows
+                        )
+                    if removed:
+                        db.cursor.executemany("DELETE FROM login_attempts WHERE key = ?", removed)
+                    # Po upływie okna każdy kubełek jest znowu pełny
+                    db.delete('login_attempts', 'updated_at < ?', (now - self.window,))
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisywania limitów logowania: {e}")
+            with self._lock:
+                self._dirty |= dirty
+            return 0
+        return len(rows)
+    
+    def load(self):
+        """Wczytuje zapisane kubełki z bazy (np. przy starcie aplikacji). Zwraca ich liczbę."""
+        now = time.time()
+        with DatabaseManager() as db:
+            rows = db.fetch_all(
+                "SELECT key, tokens, updated_at FROM login_attempts WHERE updated_at >= ? ORDER BY updated_at",
+                (now - self.window,)
+            )
+        with self._lock:
+            for row in rows:
+                bucket = self._buckets.get(row['key'])
+                if bucket is None or bucket[1] < row['updated_at']:
+                    self._buckets[row['key']] = [row['tokens'], row['updated_at']]
+                    self._buckets.move_to_end(row['key'])
+            if len(self._buckets) > self.max_entries:
+                self._prune(now)
+        return len(rows)
+    
+    def clear(self):
+        """Czyści wszystkie limity w pamięci."""
+        with self._lock:
+            self._buckets.clear()
+            self._dirty.clear()
+    
+    def stats(self):
+        """Zwraca liczniki ogranicznika."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._buckets)
+        return stats
+
+login_throttle = LoginThrottle()
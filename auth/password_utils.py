@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import os
+import hmac
+import time
 import hashlib
 import binascii
 import logging
-from config import PASSWORD_SALT_LENGTH, PASSWORD_HASH_METHOD
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from config import (PASSWORD_SALT_LENGTH, PASSWORD_HASH_METHOD, PASSWORD_SCRYPT_N,
+                    PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P, PASSWORD_PBKDF2_ITERATIONS,
+                    PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_TARGET_TIME, PASSWORD_HASH_WORKERS,
+                    PASSWORD_HASH_CALIBRATE)
+
+try:
+    import bcrypt
+except ImportError:  # bcrypt jest opcjonalny - bez niego dostępne są scrypt i PBKDF2
+    bcrypt = None
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +25,195 @@ def generate_salt(length=PASSWORD_SALT_LENGTH):
     """Generuje losowy salt o określonej długości."""
     return binascii.hexlify(os.urandom(length)).decode()
 
+class PasswordHasher(ABC):
+    """
+    Bazowa klasa algorytmu haszowania haseł.
+    
+    Hash jest zapisywany w postaci "<algorytm>$<parametry...>", dzięki czemu
+    przy weryfikacji wiadomo, jakim algorytmem i kosztem został utworzony.
+    """
+    
+    algorithm = None
+    
+    @abstractmethod
+    def encode(self, password, salt):
+        """Zwraca zakodowany hash hasła."""
+    
+    @abstractmethod
+    def verify(self, password, encoded, salt):
+        """Sprawdza hasło względem zakodowanego hasha (w stałym czasie)."""
+    
+    def needs_update(self, encoded):
+        """Sprawdza czy hash został utworzony słabszymi parametrami niż obecne."""
+        return False
+    
+    @abstractmethod
+    def with_cost(self, cost):
+        """Zwraca hasher tego samego typu z podanym kosztem."""
+    
+    @property
+    @abstractmethod
+    def cost(self):
+        """Główny parametr kosztu (używany przy kalibracji)."""
+
+class ScryptHasher(PasswordHasher):
+    """Haszowanie scrypt z hashlib (odporne na ataki GPU dzięki kosztowi pamięci)."""
+    
+    algorithm = "scrypt"
+    
+    def __init__(self, n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P):
+        self.n = n
+        self.r = r
+        self.p = p
+    
+    def _derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(
+            password.encode('utf-8'), salt=salt.encode('utf-8'), n=n, r=r, p=p,
+            maxmem=256 * n * r * p + 1024 * 1024, dklen=32
+        ).hex()
+    
+    def encode(self, password, salt):
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${salt}${digest}"
+    
+    def verify(self, password, encoded, salt):
+        _, n, r, p, salt, digest = encoded.split('$')
+        calculated = self._derive(password, salt, int(n), int(r), int(p))
+        return hmac.compare_digest(calculated, digest)
+    
+    def needs_update(self, encoded):
+        _, n, r, p, _, _ = encoded.split('$')
+        return (int(n), int(r), int(p)) < (self.n, self.r, self.p)
+    
+    def with_cost(self, cost):
+        return ScryptHasher(cost, self.r, self.p)
+    
+    @property
+    def cost(self):
+        return self.n
+
+class PBKDF2Hasher(PasswordHasher):
+    """Haszowanie PBKDF2-HMAC-SHA256 z hashlib."""
+    
+    algorithm = "pbkdf2_sha256"
+    
+    def __init__(self, iterations=PASSWORD_PBKDF2_ITERATIONS):
+        self.iterations = iterations
+    
+    def _derive(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac(
+            'sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations
+        ).hex()
+    
+    def encode(self, password, salt):
+        digest = self._derive(password, salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${salt}${digest}"
+    
+    def verify(self, password, encoded, salt):
+        _, iterations, salt, digest = encoded.split('$')
+        return hmac.compare_digest(self._derive(password, salt, int(iterations)), digest)
+    
+    def needs_update(self, encoded):
+        return int(encoded.split('$')[1]) < self.iterations
+    
+    def with_cost(self, cost):
+        return PBKDF2Hasher(cost)
+    
+    @property
+    def cost(self):
+        return self.iterations
+
+class BCryptHasher(PasswordHasher):
+    """Haszowanie bcrypt (wymaga pakietu bcrypt; salt jest częścią hasha)."""
+    
+    algorithm = "bcrypt"
+    
+    def __init__(self, rounds=PASSWORD_BCRYPT_ROUNDS):
+        if bcrypt is None:
+            raise RuntimeError("Pakiet bcrypt nie jest zainstalowany")
+        self.rounds = rounds
+    
+    def encode(self, password, salt):
+        digest = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        return f"{self.algorithm}${digest.decode('ascii')}"
+    
+    def verify(self, password, encoded, salt):
+        digest = encoded[len(self.algorithm) + 1:].encode('ascii')
+        return bcrypt.checkpw(password.encode('utf-8'), digest)
+    
+    def needs_update(self, encoded):
+        # Format bcrypt: $2b$<rounds>$<salt+hash>
+        return int(encoded.split('$')[3]) < self.rounds
+    
+    def with_cost(self, cost):
+        return BCryptHasher(cost)
+    
+    @property
+    def cost(self):
+        return self.rounds
+
+class LegacySHA256Hasher(PasswordHasher):
+    """Dawny format: pojedynczy sha256(hasło + salt) zapisany jako hex. Tylko do weryfikacji."""
+    
+    algorithm = "sha256"
+    
+    def encode(self, password, salt):
+        hash_obj = hashlib.sha256()
+        hash_obj.update(password.encode('utf-8') + salt.encode('utf-8'))
+        return hash_obj.hexdigest()
+    
+    def verify(self, password, encoded, salt):
+        return hmac.compare_digest(self.encode(password, salt), encoded)
+    
+    def needs_update(self, encoded):
+        return True
+    
+    def with_cost(self, cost):
+        # Format nie ma parametru kosztu - zawsze jedno przejście sha256
+        return self
+    
+    @property
+    def cost(self):
+        return 1
+
+HASHERS = {
+    ScryptHasher.algorithm: ScryptHasher,
+    PBKDF2Hasher.algorithm: PBKDF2Hasher,
+    BCryptHasher.algorithm: BCryptHasher,
+}
+
+_default_hasher = None
+
+def get_hasher():
+    """Zwraca hasher skonfigurowany w PASSWORD_HASH_METHOD."""
+    global _default_hasher
+    if _default_hasher is None:
+        try:
+            _default_hasher = HASHERS[PASSWORD_HASH_METHOD]()
+        except RuntimeError as e:
+            logger.warning(f"Nie można użyć {PASSWORD_HASH_METHOD} ({e}), używam scrypt")
+            _default_hasher = ScryptHasher()
+    return _default_hasher
+
+def set_hasher(hasher):
+    """Ustawia hasher używany dla nowych haseł (np. po kalibracji kosztu)."""
+    global _default_hasher
+    _default_hasher = hasher
+
+def _hasher_for(encoded):
+    """Wybiera hasher na podstawie prefiksu zapisanego hasha."""
+    algorithm, separator, _ = encoded.partition('$')
+    if not separator:
+        return LegacySHA256Hasher()
+    hasher = get_hasher()
+    if algorithm == hasher.algorithm:
+        return hasher
+    return HASHERS[algorithm]()
+
+# Ogranicza liczbę równoczesnych haszowań i weryfikacji (także z wątków zapytań),
+# żeby łączne zużycie pamięci przez scrypt nie przekroczyło PASSWORD_HASH_WORKERS razy koszt
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS)
+
 def hash_password(password, salt=None):
     """
     Haszuje hasło z podanym salt lub generuje nowy salt.
@@ -20,23 +222,79 @@ def hash_password(password, salt=None):
     if salt is None:
         salt = generate_salt()
     
-    # Łączymy hasło z salt i tworzymy hash
-    password_bytes = password.encode('utf-8')
-    salt_bytes = salt.encode('utf-8')
+    hasher = get_hasher()
+    with _hash_slots:
+        return hasher.encode(password, salt), salt
+
+def verify_password(password, stored_hash, salt):
+    """
+    Weryfikuje czy podane hasło pasuje do zapisanego hasha
+    (obsługuje wszystkie algorytmy, w tym dawny format sha256).
+    """
+    try:
+        hasher = _hasher_for(stored_hash)
+        with _hash_slots:
+            return hasher.verify(password, stored_hash, salt)
+    except (KeyError, ValueError, RuntimeError) as e:
+        logger.error(f"Nie można zweryfikować hasła - nieobsługiwany format hasha: {e}")
+        return False
+
+def needs_rehash(stored_hash):
+    """Sprawdza czy hash należy przeliczyć obecnym algorytmem i kosztem."""
+    hasher = get_hasher()
+    algorithm = stored_hash.partition('$')[0] if '$' in stored_hash else LegacySHA256Hasher.algorithm
+    if algorithm != hasher.algorithm:
+        return True
+    return hasher.needs_update(stored_hash)
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+def hash_password_async(password, salt=None):
+    """
+    Haszuje hasło w puli wątków haszujących i zwraca Future z (hash, salt) -
+    do równoległego haszowania wielu haseł (np. import kont).
+    hashlib i bcrypt zwalniają GIL, a zużycie CPU i pamięci ogranicza _hash_slots.
+    """
+    return _hash_executor.submit(hash_password, password, salt)
+
+def calibrate_hasher(hasher=None, target_time=PASSWORD_HASH_TARGET_TIME, max_doublings=20):
+    """
+    Dobiera koszt hashera tak, by haszowanie na tej maszynie trwało co najmniej
+    target_time sekund (koszt jest podwajany, bcrypt zwiększa liczbę rund o 1).
+    Zwraca skalibrowany hasher; koszt nigdy nie spada poniżej wyjściowego.
+    """
+    if hasher is None:
+        hasher = get_hasher()
     
-    hash_obj = hashlib.new(PASSWORD_HASH_METHOD)
-    hash_obj.update(password_bytes + salt_bytes)
-    password_hash = hash_obj.hexdigest()
+    candidate = hasher
+    elapsed = 0.0
+    for _ in range(max_doublings):
+        with _hash_slots:
+            start = time.perf_counter()
+            candidate.encode("calibration-password", generate_salt(16))
+            elapsed = time.perf_counter() - start
+        if elapsed >= target_time:
+            break
+        next_cost = candidate.cost + 1 if isinstance(candidate, BCryptHasher) else candidate.cost * 2
+        candidate = candidate.with_cost(next_cost)
     
-    return password_hash, salt
+    logger.info(f"Skalibrowano {candidate.algorithm}: koszt {candidate.cost}, {elapsed * 1000:.0f} ms")
+    return candidate
 
-def verify_password(password, stored_hash, salt):
+def calibrate_default_hasher():
     """
-    Weryfikuje czy podane hasło po zaszyfrowaniu z zapisanym
-    salt daje taki sam hash jak zapisany hash.
+    Kalibruje koszt domyślnego hashera (przy PASSWORD_HASH_CALIBRATE) i ustawia
+    go dla nowych haseł. Hashe o niższym koszcie są przeliczane przy logowaniu.
     """
-    calculated_hash, _ = hash_password(password, salt)
-    return calculated_hash == stored_hash
+    if not PASSWORD_HASH_CALIBRATE:
+        return get_hasher()
+    hasher = calibrate_hasher(get_hasher())
+    set_hasher(hasher)
+    return hasher
+
+def start_calibration():
+    """Uruchamia kalibrację w puli wątków haszujących (przy starcie aplikacji) i zwraca Future."""
+    return _hash_executor.submit(calibrate_default_hasher)
 
 def is_password_strong(password):
     """
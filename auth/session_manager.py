@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from database.db_manager import DatabaseManager
+from database.models import User
+from config import (TOKEN_EXPIRY_DAYS, SESSION_KEY_FILE, SESSION_CACHE_SIZE,
+                    SESSION_REVALIDATE_INTERVAL, SESSION_SWEEP_INTERVAL,
+                    SESSION_SWEEP_BATCH_SIZE)
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def load_session_key(path=SESSION_KEY_FILE):
+    """
+    Wczytuje klucz podpisujący tokeny sesji z pliku, a jeśli plik nie istnieje -
+    generuje losowy klucz i zapisuje go z uprawnieniami tylko dla właściciela.
+    Nowy klucz trafia najpierw do pliku tymczasowego i jest podpinany pod docelową
+    nazwę atomowo, więc gdy dwa procesy tworzą go jednocześnie, oba używają
+    klucza tego, który zdążył pierwszy.
+    """
+    existing = None
+    try:
+        with open(path, 'rb') as key_file:
+            existing = key_file.read()
+        if len(existing) >= 32:
+            return existing
+    except FileNotFoundError:
+        pass
+    
+    key = secrets.token_bytes(32)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as key_file:
+            key_file.write(key)
+        if existing is None:
+            # link() nie nadpisuje istniejącego pliku - przegrany wyścig czyta klucz zwycięzcy
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                return load_session_key(path)
+        else:
+            # Uszkodzony (za krótki) klucz jest zastępowany
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Wygenerowano nowy klucz sesji: {path}")
+    return key
+
+class SessionManager:
+    """
+    Sesje użytkowników oparte na podpisanych tokenach.
+    
+    Token ma postać '<id sesji>.<podpis HMAC-SHA256>', więc sfałszowane
+    lub uszkodzone tokeny są odrzucane bez zapytania do bazy. Sesje są
+    zapisywane w tabeli sessions, a zweryfikowane trzymane w pamięci w cache
+    LRU (do SESSION_CACHE_SIZE wpisów) i ponownie sprawdzane w bazie co
+    SESSION_REVALIDATE_INTERVAL sekund - wtedy widać też unieważnienia
+    wykonane w innym procesie. Wygasłe wiersze są usuwane porcjami.
+    Jeden obiekt obsługuje dowolnie wiele równoczesnych sesji (kiosk, lokalne API).
+    """
+    
+    def __init__(self, secret=None, expiry_days=TOKEN_EXPIRY_DAYS, cache_size=SESSION_CACHE_SIZE,
+                 revalidate_interval=SESSION_REVALIDATE_INTERVAL,
+                 sweep_interval=SESSION_SWEEP_INTERVAL):
+        """Inicjalizacja managera sesji (klucz jest wczytywany przy pierwszym użyciu)."""
+        self._secret = secret
+        self.expiry = timedelta(days=expiry_days)
+        self.cache_size = cache_size
+        self.revalidate_interval = revalidate_interval
+        self.sweep_interval = sweep_interval
+        # id sesji -> [użytkownik, data wygaśnięcia, czas ponownej weryfikacji (monotonic)]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_lock = threading.Lock()
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._stats = {
+            'created': 0,
+            'hits': 0,
+            'misses': 0,
+            'rejected': 0,
+            'revoked': 0,
+            'swept': 0,
+        }
+    
+    def _key(self):
+        """Zwraca klucz podpisujący, wczytując go przy pierwszym użyciu."""
+        if self._secret is None:
+            with self._key_lock:
+                if self._secret is None:
+                    self._secret = load_session_key()
+        return self._secret
+    
+    def _sign(self, session_id):
+        """Zwraca podpis HMAC identyfikatora sesji."""
+        digest = hmac.new(self._key(), session_id.encode('ascii'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+    
+    def _parse(self, token):
+        """Zwraca id sesji z poprawnie podpisanego tokenu albo None."""
+        if not token or not isinstance(token, str):
+            return None
+        session_id, _, signature = token.partition('.')
+        if not session_id or not signature or not session_id.isascii():
+            return None
+        if not hmac.compare_digest(signature, self._sign(session_id)):
+            return None
+        return session_id
+    
+    def _remember(self, session_id, user, expires_at):
+        """Zapisuje zweryfikowaną sesję w cache LRU."""
+        with self._lock:
+            self._entries[session_id] = [user, expires_at, time.monotonic() + self.revalidate_interval]
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+    
+    def _forget(self, session_id):
+        """Usuwa sesję z cache."""
+        with self._lock:
+            self._entries.pop(session_id, None)
+    
+    def create(self, user, client=None):
+        """
+        Tworzy nową sesję dla użytkownika i zwraca jej token
+        albo None, jeśli nie udało się jej zapisać.
+        """
+        session_id = secrets.token_urlsafe(24)
+        now = datetime.now().replace(microsecond=0)
+        expires_at = now + self.expiry
+        
+        with DatabaseManager() as db:
+            created = db.insert('sessions', {
+                'id': session_id,
+                'user_id': user.id,
+                'created_at': now.strftime(TIMESTAMP_FORMAT),
+                'expires_at': expires_at.strftime(TIMESTAMP_FORMAT),
+                'client': client,
+            })
+        if created is None:
+            return None
+        
+        self._remember(session_id, user, expires_at)
+        with self._lock:
+            self._stats['created'] += 1
+        logger.debug(f"Utworzono sesję użytkownika {user.username}")
+        
+        if time.monotonic() >= self._next_sweep:
+            self.sweep_expired()
+        return f"{session_id}.{self._sign(session_id)}"
+    
+    def validate(self, token):
+        """
+        Zwraca użytkownika przypisanego do ważnej sesji albo None.
+        Trafienie w cache nie wykonuje żadnego zapytania do bazy, a ponowna
+        weryfikacja czyta z bazy także stan konta (is_active).
+        """
+        session_id = self._parse(token)
+        if session_id is None:
+            with self._lock:
+                self._stats['rejected'] += 1
+            return None
+        
+        now = datetime.now()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and time.monotonic() < entry[2]:
+                if now >= entry[1]:
+                    del self._entries[session_id]
+                    return None
+                self._entries.move_to_end(session_id)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+        
+        with DatabaseManager() as db:
+            row = db.fetch_one(
+                "SELECT s.user_id, s.expires_at, u.is_active FROM sessions s "
+                "JOIN users u ON u.id = s.user_id WHERE s.id = ?",
+                (session_id,)
+            )
+        if not row or not row['is_active']:
+            self._forget(session_id)
+            return None
+        
+        expires_at = datetime.strptime(row['expires_at'], TIMESTAMP_FORMAT)
+        if now >= expires_at:
+            self._forget(session_id)
+            return None
+        
+        if entry is not None and entry[0].id == row['user_id']:
+            user = entry[0]
+            user.is_active = bool(row['is_active'])
+        else:
+            user = User.get_by_id(row['user_id'])
+        if not user or not user.is_active:
+            self._forget(session_id)
+            return None
+        
+        self._remember(session_id, user, expires_at)
+        return user
+    
+    def refresh(self, token):
+        """Przedłuża ważność sesji o pełny okres. Zwraca True, jeśli sesja była ważna."""
+        user = self.validate(token)
+        if user is None:
+            return False
+        
+        session_id = self._parse(token)
+        expires_at = datetime.now().replace(microsecond=0) + self.expiry
+        with DatabaseManager() as db:
+            updated = db.update('sessions', {'expires_at': expires_at.strftime(TIMESTAMP_FORMAT)},
+                                'id = ?', (session_id,))
+        if not updated:
+            self._forget(session_id)
+            return False
+        
+        self._remember(session_id, user, expires_at)
+        return True
+    
+    def revoke(self, token):
+        """Unieważnia pojedynczą sesję (wylogowanie)."""
+        session_id = self._parse(token)
+        if session_id is None:
+            return False
+        
+        self._forget(session_id)
+        with DatabaseManager() as db:
+            deleted = db.delete('sessions', 'id = ?', (session_id,))
+        with self._lock:
+            self._stats['revoked'] += deleted
+        return bool(deleted)
+    
+    def revoke_user(self, user_id):
+        """Unieważnia wszystkie sesje użytkownika (np. po zmianie hasła). Zwraca ich liczbę."""
+        with self._lock:
+            for session_id in [sid for sid, entry in self._entries.items() if entry[0].id == user_id]:
+                del self._entries[session_id]
+        
+        with DatabaseManager() as db:
+            deleted = db.delete('sessions', 'user_id = ?', (user_id,))
+        with self._lock:
+            self._stats['revoked'] += deleted
+        return deleted
+    
+    def sweep_expired(self, batch_size=SESSION_SWEEP_BATCH_SIZE):
+        """
+        Usuwa wygasłe sesje porcjami po batch_size wierszy (każda porcja to
+        osobna, krótka transakcja korzystająca z indeksu po expires_at).
+        Zwraca liczbę usuniętych wierszy.
+        """
+        now = datetime.now()
+        cutoff = now.strftime(TIMESTAMP_FORMAT)
+        
+        with self._lock:
+            for session_id in [sid for sid, entry in self._entries.items() if now >= entry[1]]:
+                del self._entries[session_id]
+            self._next_sweep = time.monotonic() + self.sweep_interval
+        
+        total = 0
+        with DatabaseManager() as db:
+            while True:
+                deleted = db.delete(
+                    'sessions',
+                    'id IN (SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?)',
+                    (cutoff, batch_size)
+                )
+                total += deleted
+                if deleted < batch_size:
+                    break
+        
+        with self._lock:
+            self._stats['swept'] += total
+        if total:
+            logger.info(f"Usunięto {total} wygasłych sesji")
+        return total
+    
+    def clear(self):
+        """Czyści cache sesji w pamięci (sesje w bazie pozostają ważne)."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Zwraca liczniki sesji."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+session_manager = SessionManager()
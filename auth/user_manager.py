@@ -1,81 +1,198 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import sqlite3
 from datetime import datetime
+from config import REGISTRATION_BATCH_SIZE
 from database.models import User
-from auth.password_utils import hash_password, verify_password, is_password_strong
-from database.db_manager import DatabaseManager
+from auth.password_utils import (hash_password, hash_password_async, verify_password, needs_rehash,
+                                 is_password_strong)
+from auth.login_throttle import login_throttle
+from database.db_manager import DatabaseManager, compile_statement
 
 logger = logging.getLogger(__name__)
 
 class UserManager:
     """Klasa zarządzająca użytkownikami w systemie."""
     
+    @staticmethod
+    def _integrity_error_message(error):
+        """Zamienia naruszenie ograniczenia UNIQUE tabeli users na komunikat dla użytkownika."""
+        message = str(error)
+        if 'users.username' in message:
+            return "Użytkownik o takiej nazwie już istnieje."
+        if 'users.email' in message:
+            return "Ten adres email jest już używany."
+        return None
+    
+    @staticmethod
+    def _insert_account(cursor, data):
+        """
+        Wstawia użytkownika wraz z pustymi statystykami i streakiem.
+        Musi być wywołane wewnątrz transakcji - konto powstaje w całości albo wcale.
+        Zwraca ID użytkownika; naruszenie UNIQUE zgłasza sqlite3.IntegrityError.
+        """
+        cursor.execute(compile_statement('insert', 'users', tuple(data)), tuple(data.values()))
+        user_id = cursor.lastrowid
+        cursor.execute(compile_statement('insert', 'user_stats', ('user_id',)), (user_id,))
+        cursor.execute(compile_statement('insert', 'user_streaks', ('user_id',)), (user_id,))
+        return user_id
+    
+    @staticmethod
+    def _account_data(username, email, password_hash, salt):
+        """Buduje wiersz tabeli users dla nowego konta."""
+        return {
+            'username': username,
+            'email': email,
+            'password_hash': password_hash,
+            'salt': salt,
+            'registration_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'is_admin': False,
+            'is_active': True,
+        }
+    
     @staticmethod
     def register_user(username, email, password):
         """
         Rejestruje nowego użytkownika w systemie.
         Zwraca (User, None) w przypadku sukcesu lub (None, error_message) w przypadku błędu.
-        """
-        # Sprawdzenie czy użytkownik o takiej nazwie już istnieje
-        existing_user = User.get_by_username(username)
-        if existing_user:
-            return None, "Użytkownik o takiej nazwie już istnieje."
-        
-        # Sprawdzenie czy email jest już używany
-        existing_email = User.get_by_email(email)
-        if existing_email:
-            return None, "Ten adres email jest już używany."
         
+        Unikalność nazwy i adresu email sprawdzają ograniczenia UNIQUE tabeli users,
+        a użytkownik, jego statystyki i streak są zapisywane w jednej transakcji -
+        bez wcześniejszych zapytań SELECT, które przy równoczesnych rejestracjach
+        i tak nie gwarantowałyby unikalności.
+        Haszowanie trwa tyle, ile skalibrowany koszt - interfejs wywołuje tę
+        metodę w tle (run_async), tak jak authenticate_user.
+        """
         # Sprawdzenie siły hasła
         if not is_password_strong(password):
             return None, "Hasło nie spełnia wymagań bezpieczeństwa."
         
         # Haszowanie hasła
         password_hash, salt = hash_password(password)
+        data = UserManager._account_data(username, email, password_hash, salt)
         
-        # Tworzenie nowego użytkownika
-        user = User()
-        user.username = username
-        user.email = email
-        user.password_hash = password_hash
-        user.salt = salt
-        user.registration_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        user.is_admin = False
-        user.is_active = True
-        
-        # Zapisanie użytkownika w bazie
-        user_id = user.save()
-        if not user_id:
+        # Zapisanie użytkownika, statystyk i streaka jednym commitem
+        try:
+            with DatabaseManager() as db:
+                with db.transaction():
+                    user_id = UserManager._insert_account(db.cursor, data)
+        except sqlite3.IntegrityError as e:
+            message = UserManager._integrity_error_message(e)
+            if message:
+                return None, message
+            logger.error(f"Błąd podczas rejestracji użytkownika {username}: {e}")
+            return None, "Nie udało się utworzyć konta. Spróbuj ponownie później."
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas rejestracji użytkownika {username}: {e}")
             return None, "Nie udało się utworzyć konta. Spróbuj ponownie później."
         
-        # Inicjalizacja statystyk użytkownika
-        with DatabaseManager() as db:
-            db.insert('user_stats', {'user_id': user_id})
-            db.insert('user_streaks', {'user_id': user_id})
+        user = User(data)
+        user.id = user_id
         
         logger.info(f"Zarejestrowano nowego użytkownika: {username}")
         return user, None
     
     @staticmethod
-    def authenticate_user(username, password):
+    def register_users(accounts, batch_size=REGISTRATION_BATCH_SIZE):
+        """
+        Rejestruje wiele kont naraz (np. import klasy), przyjmując iterowalną
+        kolekcję krotek (username, email, password).
+        Hasła są haszowane równolegle w puli wątków haszujących, a konta zapisywane
+        porcjami po batch_size - każda porcja w jednej transakcji. Konto z zajętą
+        nazwą lub adresem email jest pomijane bez przerywania reszty porcji.
+        Zwraca listę krotek (username, user_id, error_message) w kolejności wejścia;
+        dla poprawnie utworzonych kont error_message to None, dla pozostałych user_id to None.
+        """
+        results = []
+        batch = []
+        for account in accounts:
+            batch.append(account)
+            if len(batch) >= batch_size:
+                results.extend(UserManager._register_batch(batch))
+                batch = []
+        if batch:
+            results.extend(UserManager._register_batch(batch))
+        
+        created = sum(1 for _, user_id, _ in results if user_id)
+        logger.info(f"Zarejestrowano {created} z {len(results)} kont")
+        return results
+    
+    @staticmethod
+    def _register_batch(batch):
+        """Haszuje hasła jednej porcji kont i zapisuje je w jednej transakcji."""
+        results = [None] * len(batch)
+        hashes = {}
+        for index, (username, email, password) in enumerate(batch):
+            if is_password_strong(password):
+                hashes[index] = hash_password_async(password)
+            else:
+                results[index] = (username, None, "Hasło nie spełnia wymagań bezpieczeństwa.")
+        
+        # Wszystkie hashe przed otwarciem transakcji - blokada zapisu obejmuje tylko INSERT-y
+        accounts = {}
+        for index, future in hashes.items():
+            username, email, _ = batch[index]
+            password_hash, salt = future.result()
+            accounts[index] = UserManager._account_data(username, email, password_hash, salt)
+        
+        with DatabaseManager() as db:
+            try:
+                with db.transaction():
+                    for index, data in accounts.items():
+                        username = data['username']
+                        try:
+                            # Nieudany INSERT wycofuje tylko własną instrukcję, nie całą transakcję
+                            user_id = UserManager._insert_account(db.cursor, data)
+                        except sqlite3.IntegrityError as e:
+                            message = UserManager._integrity_error_message(e)
+                            if not message:
+                                raise
+                            results[index] = (username, None, message)
+                        else:
+                            results[index] = (username, user_id, None)
+            except sqlite3.Error as e:
+                logger.error(f"Błąd podczas rejestracji porcji {len(batch)} kont: {e}")
+                error = "Nie udało się utworzyć konta. Spróbuj ponownie później."
+                return [(account[0], None, error) if result is None or result[1] else result
+                        for account, result in zip(batch, results)]
+        return results
+    
+    @staticmethod
+    def authenticate_user(username, password, client=None):
         """
         Uwierzytelnia użytkownika na podstawie nazwy użytkownika i hasła.
         Zwraca (User, None) w przypadku sukcesu lub (None, error_message) w przypadku błędu.
+        Po przekroczeniu limitu nieudanych prób (dla nazwy użytkownika lub klienta)
+        kolejne próby są odrzucane bez zapytania do bazy i haszowania hasła.
         """
+        if not login_throttle.allow(username, client):
+            return None, "Zbyt wiele nieudanych prób logowania. Spróbuj ponownie później."
+        
         # Pobieranie użytkownika
-        user = User.get_by_username(username)
+        user = User.get_by_username(username, with_credentials=True)
         if not user:
+            login_throttle.record_failure(username, client)
             return None, "Nieprawidłowa nazwa użytkownika lub hasło."
         
         # Sprawdzenie czy konto jest aktywne
         if not user.is_active:
+            login_throttle.release(username, client)
             return None, "Konto zostało dezaktywowane."
         
         # Weryfikacja hasła
         if not verify_password(password, user.password_hash, user.salt):
+            login_throttle.record_failure(username, client)
             return None, "Nieprawidłowa nazwa użytkownika lub hasło."
         
+        login_throttle.reset(username, client)
+        
+        # Przeliczenie hasha starszym algorytmem lub słabszym kosztem (np. dawny sha256)
+        if needs_rehash(user.password_hash):
+            user.password_hash, user.salt = hash_password(password)
+            user.save()
+            logger.info(f"Zaktualizowano hash hasła użytkownika {username}")
+        
         # Aktualizacja daty ostatniego logowania
         user.update_last_login()
         
@@ -120,7 +237,7 @@ class UserManager:
         Na potrzeby tego przykładu zwraca nowe hasło.
         """
         # Pobieranie użytkownika
-        user = User.get_by_email(email)
+        user = User.get_by_email(email, with_credentials=True)
         if not user:
             return None, "Nie znaleziono użytkownika o podanym adresie email."
         
@@ -17,19 +17,96 @@ SOUNDS_DIR = os.path.join(RESOURCES_DIR, "sounds")
 # Ścieżka do pliku bazy danych
 DATABASE_PATH = os.path.join(BASE_DIR, "database", "lingualeap.db")
 
+# Ustawienia puli połączeń z bazą danych
+DB_POOL_SIZE = 8                  # Maksymalna liczba jednocześnie wypożyczonych połączeń
+DB_POOL_TIMEOUT = 5.0             # Maksymalny czas oczekiwania na wolne połączenie (s)
+DB_POOL_IDLE_TIMEOUT = 300        # Czas bezczynności, po którym połączenie jest zamykane (s)
+DB_POOL_HEALTH_CHECK_INTERVAL = 30  # Po ilu sekundach bezczynności sprawdzać połączenie (s)
+DB_CACHED_STATEMENTS = 256        # Rozmiar cache przygotowanych instrukcji w każdym połączeniu
+SQL_CACHE_SIZE = 512              # Liczba zapamiętanych treści instrukcji INSERT/UPDATE/SELECT
+DB_FETCH_BATCH_SIZE = 500         # Liczba wierszy pobieranych naraz przy strumieniowym odczycie
+DB_IN_CLAUSE_BATCH_SIZE = 500     # Maksymalna liczba parametrów w jednym warunku IN (...)
+DB_QUERY_WORKERS = 4              # Liczba wątków wykonujących zapytania w tle dla interfejsu
+
+# Profil przechowywania SQLite - PRAGMA ustawiane przy każdym nowym połączeniu
+DB_STORAGE_PROFILE = {
+    'journal_mode': 'WAL',        # Czytelnicy nie blokują zapisującego
+    'synchronous': 'NORMAL',      # W trybie WAL bezpieczne i bez fsync przy każdym commicie
+    'busy_timeout': 5000,         # Czas oczekiwania na zwolnienie blokady (ms)
+    'cache_size': -16384,         # Ujemna wartość = rozmiar w KiB (16 MiB)
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Harmonogram utrzymania bazy (checkpoint WAL i PRAGMA optimize)
+DB_CHECKPOINT_INTERVAL = 300      # Co ile sekund wykonywać checkpoint WAL
+DB_CHECKPOINT_MODE = "PASSIVE"    # PASSIVE nie blokuje czytelników ani zapisujących
+DB_OPTIMIZE_INTERVAL = 3600       # Co ile sekund uruchamiać PRAGMA optimize
+
+# Migracje schematu
+MIGRATION_BATCH_SIZE = 5000       # Liczba wierszy uzupełnianych w jednej transakcji
+
+# Cache katalogu treści (języki, lekcje, ćwiczenia)
+CATALOG_CACHE_SIZE = 10000        # Maksymalna liczba wpisów w cache
+CATALOG_CACHE_TTL = 600           # Czas życia wpisu (s)
+CONTENT_VERSION_CHECK_INTERVAL = 5  # Co ile sekund sprawdzać licznik wersji treści w bazie
+
+# Import pakietów treści
+CONTENT_IMPORT_BATCH_SIZE = 5000  # Liczba wierszy zapisywanych w jednej transakcji importu
+CONTENT_READ_CHUNK_SIZE = 64 * 1024  # Rozmiar porcji (znaki) czytanej przy parsowaniu pliku JSON
+
+# Wyszukiwanie pełnotekstowe
+SEARCH_RESULTS_LIMIT = 20         # Maksymalna liczba wyników wyszukiwania
+SEARCH_DEBOUNCE_MS = 250          # Opóźnienie wyszukiwania po ostatnim naciśnięciu klawisza (ms)
+
+# Sprawdzanie odpowiedzi
+ANSWER_CACHE_SIZE = 4096          # Liczba zapamiętanych znormalizowanych poprawnych odpowiedzi
+ANSWER_MAX_TYPOS = 2              # Maksymalna liczba tolerowanych literówek w odpowiedzi
+ANSWER_CHARS_PER_TYPO = 5         # Jedna tolerowana literówka na tyle znaków odpowiedzi
+
 # Ścieżki do plików zasobów
 LOGO_PATH = os.path.join(IMAGES_DIR, "logo.png")
 LANGUAGES_FILE = os.path.join(DATA_DIR, "languages.json")
+CONTENT_PACK_FILE = os.path.join(DATA_DIR, "content.pack")  # Skompilowany katalog lekcji (tylko do odczytu)
 
 # Ustawienia bezpieczeństwa
 PASSWORD_SALT_LENGTH = 32
-PASSWORD_HASH_METHOD = "sha256"
+PASSWORD_HASH_METHOD = "scrypt"   # scrypt, pbkdf2_sha256 lub bcrypt (wymaga pakietu bcrypt)
+PASSWORD_SCRYPT_N = 2 ** 14       # Koszt scrypt (pamięć ~ 128 * N * r bajtów)
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_PBKDF2_ITERATIONS = 600000
+PASSWORD_BCRYPT_ROUNDS = 12
+PASSWORD_HASH_TARGET_TIME = 0.1   # Docelowy czas haszowania przy kalibracji kosztu (s)
+PASSWORD_HASH_CALIBRATE = True    # Kalibracja kosztu haszowania przy starcie aplikacji
+PASSWORD_HASH_WORKERS = 2         # Liczba równoległych haszowań (ogranicza CPU i pamięć)
 TOKEN_EXPIRY_DAYS = 30
+SESSION_KEY_FILE = os.path.join(DATA_DIR, "session.key")  # Klucz podpisujący tokeny sesji
+SESSION_CACHE_SIZE = 4096         # Liczba zweryfikowanych sesji trzymanych w pamięci
+SESSION_REVALIDATE_INTERVAL = 60  # Co ile sekund ponownie sprawdzać sesję z cache w bazie
+SESSION_SWEEP_INTERVAL = 3600     # Co ile sekund usuwać wygasłe sesje z bazy
+SESSION_SWEEP_BATCH_SIZE = 1000   # Liczba wygasłych sesji usuwanych w jednej transakcji
+REGISTRATION_BATCH_SIZE = 1000    # Liczba kont zapisywanych w jednej transakcji przy imporcie
 
 # Ustawienia aplikacji
 DEFAULT_LANGUAGE = "en"  # Domyślny język interfejsu
 MAX_LOGIN_ATTEMPTS = 5   # Maksymalna liczba nieudanych prób logowania
+LOGIN_ATTEMPT_WINDOW = 900        # Czas (s), w którym limit prób odnawia się w całości
+LOGIN_CLIENT_MAX_ATTEMPTS = 20    # Limit nieudanych prób z jednego stanowiska (dla wszystkich kont)
+LOGIN_THROTTLE_MAX_ENTRIES = 100000  # Maksymalna liczba limitów trzymanych w pamięci
+LOGIN_THROTTLE_PRUNE_RATIO = 0.9     # Do jakiej części MAX_ENTRIES przycinać limity po przekroczeniu
+LOGIN_THROTTLE_PERSIST_INTERVAL = 60  # Co ile sekund zapisywać limity w bazie
 STREAK_RESET_HOURS = 36  # Liczba godzin, po których streak zostanie zresetowany
+STREAK_TIMEZONE = None   # Strefa (tzinfo) wyznaczająca granicę dnia streaka; None = strefa systemowa
+STREAK_ROLLOVER_INTERVAL = 24 * 3600  # Co ile sekund zerować wygasłe streaki wszystkich użytkowników
+STATS_FLUSH_SIZE = 200            # Liczba zdarzeń postępu buforowanych przed zapisem do bazy
+STATS_FLUSH_INTERVAL = 5          # Co ile sekund zapisywać bufor zdarzeń postępu
+REVIEW_SESSION_SIZE = 50          # Liczba ćwiczeń w jednej sesji powtórek
+REVIEW_HEAP_SIZE = 500            # Maksymalna liczba najbliższych powtórek użytkownika trzymanych w pamięci
+REVIEW_PRELOAD_HOURS = 12         # Z jakim wyprzedzeniem (h) wczytywać terminy powtórek do pamięci
+REVIEW_FLUSH_SIZE = 50            # Liczba ocen powtórek zapisywanych w bazie jedną transakcją
+REVIEW_DAILY_LIMIT = 200          # Maksymalna liczba zaległych powtórek zostawianych na jeden dzień
+REVIEW_RESCHEDULE_INTERVAL = 24 * 3600  # Co ile sekund rozkładać zaległe powtórki na kolejne dni
 
 # Ustawienia systemowe
 LOG_LEVEL = "INFO"
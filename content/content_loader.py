@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import json
+import logging
+from database.db_manager import DatabaseManager, compile_statement
+from database.cache import catalog_cache
+from database.migrations import SEARCH_DEFERRED_KEY, search_index_sql
+from config import LANGUAGES_FILE, CONTENT_IMPORT_BATCH_SIZE, CONTENT_READ_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Kolumny ćwiczeń zapisywane przez importer (kolejność krotek przekazywanych do executemany)
+EXERCISE_COLUMNS = ('lesson_id', 'type', 'content', 'correct_answer', 'options', 'hint',
+                    'image_path', 'audio_path', 'xp_reward', 'order_index')
+
+# Kolumny pliku CSV - jeden wiersz to jedno ćwiczenie wraz z danymi jego lekcji
+CSV_REQUIRED_COLUMNS = ('language', 'lesson', 'type', 'content', 'correct_answer')
+CSV_LESSON_COLUMNS = {
+    'language': 'language',
+    'category': 'category',
+    'lesson': 'title',
+    'lesson_description': 'description',
+    'difficulty': 'difficulty',
+    'lesson_xp': 'xp_reward',
+    'lesson_order': 'order_index',
+}
+CSV_OPTION_SEPARATOR = '|'
+
+FORMATS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+class ContentError(ValueError):
+    """Niepoprawny plik lub rekord pakietu treści."""
+
+def iter_json_array(stream, chunk_size=CONTENT_READ_CHUNK_SIZE):
+    """
+    Parsuje przyrostowo tablicę JSON, zwracając kolejne jej elementy.
+    Plik jest czytany porcjami po chunk_size znaków - w pamięci jest
+    tylko bieżący element, a nie cały dokument.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    state = 'start'   # start -> first -> (value -> separator)* -> koniec
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ContentError("Niekompletna tablica JSON")
+            buffer = stream.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+        
+        char = buffer[position]
+        if state == 'start':
+            if char != '[':
+                raise ContentError("Plik JSON musi zawierać tablicę lekcji")
+            position += 1
+            state = 'first'
+        elif char == ']' and state in ('first', 'separator'):
+            return
+        elif state == 'separator':
+            if char != ',':
+                raise ContentError(f"Oczekiwano ',' lub ']' w tablicy JSON, znaleziono '{char}'")
+            position += 1
+            state = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ContentError(f"Błąd składni JSON: {e}")
+                end = None
+            # Element urwany na granicy porcji - doczytujemy i parsujemy ponownie
+            if end is None or (end == len(buffer) and not eof):
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            position = end
+            state = 'separator'
+            yield value
+
+def iter_ndjson(stream):
+    """Zwraca rekordy pliku NDJSON (jeden obiekt JSON w każdej niepustej linii)."""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ContentError(f"Linia {line_number}: błąd składni JSON: {e}")
+
+def iter_csv(stream):
+    """
+    Zwraca rekordy lekcji z pliku CSV - każdy wiersz to lekcja z jednym
+    ćwiczeniem (opcje odpowiedzi rozdzielone znakiem '|').
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in CSV_REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ContentError(f"Brak kolumn w pliku CSV: {', '.join(missing)}")
+    
+    for row in reader:
+        lesson = {}
+        exercise = {}
+        for column, value in row.items():
+            if column is None or value is None or value == '':
+                continue
+            if column in CSV_LESSON_COLUMNS:
+                lesson[CSV_LESSON_COLUMNS[column]] = value
+            else:
+                exercise[column] = value
+        if 'options' in exercise:
+            exercise['options'] = exercise['options'].split(CSV_OPTION_SEPARATOR)
+        lesson['exercises'] = [exercise]
+        yield lesson
+
+def detect_format(path):
+    """Rozpoznaje format pakietu po rozszerzeniu pliku."""
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ContentError(f"Nieobsługiwany format pliku: {path}")
+    return fmt
+
+def _text(record, key, required=False):
+    """Zwraca przycięty tekst pola rekordu (None dla pustego pola opcjonalnego)."""
+    value = record.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ContentError(f"Brak wymaganego pola '{key}'")
+        return None
+    if not isinstance(value, str):
+        raise ContentError(f"Pole '{key}' musi być tekstem")
+    return value.strip()
+
+def _integer(record, key, default=None, minimum=0):
+    """Zwraca pole liczbowe rekordu (liczbę lub tekst z CSV) sprawdzając dolną granicę."""
+    value = record.get(key)
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        raise ContentError(f"Pole '{key}' musi być liczbą całkowitą")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ContentError(f"Pole '{key}' musi być liczbą całkowitą")
+    if number < minimum:
+        raise ContentError(f"Pole '{key}' musi być nie mniejsze niż {minimum}")
+    return number
+
+def validate_exercise(record):
+    """Sprawdza rekord ćwiczenia i zwraca słownik kolumn tabeli exercises (bez lesson_id)."""
+    if not isinstance(record, dict):
+        raise ContentError("Ćwiczenie musi być obiektem")
+    options = record.get('options')
+    if options is not None:
+        if not isinstance(options, list) or not all(isinstance(option, str) for option in options):
+            raise ContentError("Pole 'options' musi być listą tekstów")
+        options = json.dumps([option.strip() for option in options], ensure_ascii=False)
+    return {
+        'type': _text(record, 'type', required=True),
+        'content': _text(record, 'content', required=True),
+        'correct_answer': _text(record, 'correct_answer', required=True),
+        'options': options,
+        'hint': _text(record, 'hint'),
+        'image_path': _text(record, 'image_path'),
+        'audio_path': _text(record, 'audio_path'),
+        'xp_reward': _integer(record, 'xp_reward', default=5),
+        'order_index': _integer(record, 'order_index'),
+    }
+
+def validate_lesson(record):
+    """
+    Sprawdza rekord lekcji i zwraca parę (lekcja, lista ćwiczeń).
+    Błąd w którymkolwiek ćwiczeniu odrzuca cały rekord.
+    """
+    if isinstance(record, ContentError):
+        raise record
+    if not isinstance(record, dict):
+        raise ContentError("Rekord lekcji musi być obiektem")
+    lesson = {
+        'language': _text(record, 'language', required=True).lower(),
+        'category': _text(record, 'category'),
+        'title': _text(record, 'title', required=True),
+        'description': _text(record, 'description'),
+        'difficulty': _integer(record, 'difficulty', default=1, minimum=1),
+        'xp_reward': _integer(record, 'xp_reward', default=10),
+        'order_index': _integer(record, 'order_index'),
+    }
+    exercises = record.get('exercises') or []
+    if not isinstance(exercises, list):
+        raise ContentError("Pole 'exercises' musi być listą")
+    validated = []
+    for number, exercise in enumerate(exercises, 1):
+        try:
+            validated.append(validate_exercise(exercise))
+        except ContentError as e:
+            raise ContentError(f"Ćwiczenie {number}: {e}")
+    return lesson, validated
+
+def iter_records(path, fmt=None):
+    """Otwiera pakiet treści i zwraca jego rekordy lekcji (parsowane strumieniowo)."""
+    fmt = fmt or detect_format(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='' if fmt == 'csv' else None) as stream:
+        if fmt == 'json':
+            yield from iter_json_array(stream)
+        elif fmt == 'ndjson':
+            yield from iter_ndjson(stream)
+        elif fmt == 'csv':
+            yield from iter_csv(stream)
+        else:
+            raise ContentError(f"Nieobsługiwany format: {fmt}")
+
+class ContentImporter:
+    """
+    Strumieniowy import pakietów lekcji (JSON, NDJSON, CSV).
+    
+    Rekordy są parsowane i sprawdzane pojedynczo, a ID języków, kategorii
+    i lekcji są rozwiązywane przez tablice w pamięci wczytane raz na import
+    (brakujące kategorie i lekcje są tworzone). Ćwiczenia są zapisywane
+    porcjami po batch_size wierszy - każda porcja to jedna transakcja
+    z jednym executemany, a indeks wyszukiwania porcji jest uzupełniany
+    jednym INSERT ... SELECT (bez wyzwalacza na wiersz). Niepoprawne rekordy są pomijane i raportowane;
+    ćwiczenia o treści już istniejącej w lekcji są pomijane, więc ponowny
+    import tego samego pakietu niczego nie duplikuje.
+    """
+    
+    def __init__(self, batch_size=CONTENT_IMPORT_BATCH_SIZE):
+        """Inicjalizacja importera."""
+        self.batch_size = batch_size
+        self._languages = None
+        self._categories = {}
+        self._lessons = {}
+        self._existing = {}
+    
+    def _load_lookups(self, db):
+        """Wczytuje tablice języków, kategorii i lekcji (kod/nazwa/tytuł -> ID)."""
+        self._languages = {row['code']: row['id'] for row in db.fetch_all("SELECT id, code FROM languages")}
+        self._categories = {(row['language_id'], row['name']): row['id']
+                            for row in db.fetch_all("SELECT id, name, language_id FROM lesson_categories")}
+        # Lekcja -> [ID, zbiór treści ćwiczeń (wczytywany przy pierwszym użyciu), następny order_index]
+        self._lessons = {(row['language_id'], row['title']): [row['id'], None, None]
+                         for row in db.fetch_all("SELECT id, title, language_id FROM lessons")}
+        self._next_lesson_order = {row['language_id']: row['next']
+                                   for row in db.fetch_all("SELECT language_id, MAX(order_index) + 1 AS next "
+                                                           "FROM lessons GROUP BY language_id")}
+    
+    def import_languages(self, path=LANGUAGES_FILE):
+        """
+        Wczytuje języki z pliku JSON - listy obiektów {code, name, is_active}
+        lub słownika {kod: nazwa}. Istniejące języki są aktualizowane.
+        Zwraca liczbę zapisanych języków.
+        """
+        if not os.path.exists(path):
+            logger.warning(f"Plik języków nie istnieje: {path}")
+            return 0
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [{'code': code, 'name': name} for code, name in data.items()]
+        
+        rows = []
+        for number, record in enumerate(data, 1):
+            try:
+                if not isinstance(record, dict):
+                    raise ContentError("Język musi być obiektem")
+                rows.append((_text(record, 'code', required=True).lower(), _text(record, 'name', required=True),
+                             0 if record.get('is_active') is False else 1))
+            except ContentError as e:
+                logger.warning(f"Pominięto język {number} z pliku {path}: {e}")
+        
+        with DatabaseManager() as db:
+            with db.transaction():
+                db.cursor.executemany('''
+                    INSERT INTO languages (code, name, is_active) VALUES (?, ?, ?)
+                    ON CONFLICT (code) DO UPDATE SET name = excluded.name, is_active = excluded.is_active
+                ''', rows)
+        catalog_cache.invalidate()
+        self._languages = None
+        logger.info(f"Zapisano {len(rows)} języków z pliku {path}")
+        return len(rows)
+    
+    def import_file(self, path, fmt=None):
+        """Importuje pakiet lekcji z pliku. Zwraca raport jak import_records()."""
+        logger.info(f"Import pakietu treści: {path}")
+        return self.import_records(iter_records(path, fmt))
+    
+    def import_records(self, records):
+        """
+        Importuje rekordy lekcji (słowniki z listą 'exercises').
+        Zwraca raport: liczby utworzonych kategorii, lekcji i ćwiczeń, liczbę
+        pominiętych duplikatów oraz listę błędów (numer rekordu, opis).
+        Błąd składni całego pliku przerywa import - zapisane porcje pozostają.
+        """
+        report = {'categories': 0, 'lessons': 0, 'exercises': 0, 'duplicates': 0, 'errors': []}
+        with DatabaseManager() as db:
+            self._load_lookups(db)
+            chunk = []
+            pending = 0
+            number = 0
+            try:
+                for number, record in enumerate(records, 1):
+                    try:
+                        lesson, exercises = validate_lesson(record)
+                        if lesson['language'] not in self._languages:
+                            raise ContentError(f"Nieznany język '{lesson['language']}'")
+                    except ContentError as e:
+                        report['errors'].append((number, str(e)))
+                        continue
+                    chunk.append((number, lesson, exercises))
+                    pending += len(exercises) + 1
+                    if pending >= self.batch_size:
+                        self._write_chunk(db, chunk, report)
+                        chunk = []
+                        pending = 0
+            except ContentError as e:
+                report['errors'].append((number + 1, str(e)))
+                logger.error(f"Przerwano import pakietu treści: {e}")
+            if chunk:
+                self._write_chunk(db, chunk, report)
+        
+        if report['lessons'] or report['exercises'] or report['categories']:
+            catalog_cache.invalidate()
+        logger.info(
+            f"Zaimportowano {report['lessons']} lekcji i {report['exercises']} ćwiczeń "
+            f"({report['duplicates']} duplikatów, {len(report['errors'])} błędów)"
+        )
+        return report
+    
+    def _write_chunk(self, db, chunk, report):
+        """Zapisuje porcję rekordów w jednej transakcji (lekcje pojedynczo, ćwiczenia jednym executemany)."""
+        rows = []
+        created = {'categories': 0, 'lessons': 0}
+        try:
+            with db.transaction():
+                # Indeks wyszukiwania i content_version są uzupełniane raz na porcję zamiast wyzwalaczy na wiersz
+                last_lesson_id = db.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM lessons").fetchone()[0]
+                last_id = db.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM exercises").fetchone()[0]
+                db.cursor.execute("INSERT INTO app_meta (key, value) VALUES (?, 1)", (SEARCH_DEFERRED_KEY,))
+                for number, lesson, exercises in chunk:
+                    entry = self._lesson_entry(db, lesson, created)
+                    for exercise in exercises:
+                        if exercise['content'] in entry[1]:
+                            report['duplicates'] += 1
+                            continue
+                        entry[1].add(exercise['content'])
+                        if exercise['order_index'] is None:
+                            exercise['order_index'] = entry[2]
+                        entry[2] = max(entry[2], exercise['order_index'] + 1)
+                        exercise['lesson_id'] = entry[0]
+                        rows.append(tuple(exercise[column] for column in EXERCISE_COLUMNS))
+                
+                db.cursor.executemany(compile_statement('insert', 'exercises', EXERCISE_COLUMNS), rows)
+                db.cursor.execute("DELETE FROM app_meta WHERE key = ?", (SEARCH_DEFERRED_KEY,))
+                db.cursor.execute(search_index_sql('lessons_fts', "id > ?"), (last_lesson_id,))
+                db.cursor.execute(search_index_sql('exercises_fts', "id > ?"), (last_id,))
+                if rows or created['lessons'] or created['categories']:
+                    db.cursor.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'content_version'")
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisywania porcji pakietu treści: {e}")
+            first, last = chunk[0][0], chunk[-1][0]
+            report['errors'].append((first, f"Nie zapisano rekordów {first}-{last}: {e}"))
+            # Wycofana transakcja mogła zawierać nowe kategorie i lekcje - odświeżamy tablice
+            self._load_lookups(db)
+            return
+        report['categories'] += created['categories']
+        report['lessons'] += created['lessons']
+        report['exercises'] += len(rows)
+    
+    def _lesson_entry(self, db, lesson, created):
+        """Zwraca wpis lekcji z tablicy w pamięci, tworząc brakującą kategorię i lekcję."""
+        language_id = self._languages[lesson['language']]
+        entry = self._lessons.get((language_id, lesson['title']))
+        if entry is not None:
+            if entry[1] is None:
+                # Lekcja istniała przed importem - wczytujemy treści jej ćwiczeń raz
+                rows = db.fetch_all("SELECT content, order_index FROM exercises WHERE lesson_id = ?", (entry[0],))
+                entry[1] = {row['content'] for row in rows}
+                entry[2] = max((row['order_index'] or 0 for row in rows), default=0) + 1
+            return entry
+        
+        category_id = None
+        if lesson['category']:
+            category_id = self._categories.get((language_id, lesson['category']))
+            if category_id is None:
+                db.cursor.execute(
+                    "INSERT INTO lesson_categories (name, language_id) VALUES (?, ?)",
+                    (lesson['category'], language_id)
+                )
+                category_id = self._categories[(language_id, lesson['category'])] = db.cursor.lastrowid
+                created['categories'] += 1
+        
+        order_index = lesson['order_index']
+        if order_index is None:
+            order_index = self._next_lesson_order.get(language_id) or 1
+        self._next_lesson_order[language_id] = max(self._next_lesson_order.get(language_id) or 1, order_index + 1)
+        db.cursor.execute('''
+            INSERT INTO lessons (title, description, category_id, language_id, difficulty, xp_reward, order_index)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (lesson['title'], lesson['description'], category_id, language_id,
+              lesson['difficulty'], lesson['xp_reward'], order_index))
+        entry = self._lessons[(language_id, lesson['title'])] = [db.cursor.lastrowid, set(), 1]
+        created['lessons'] += 1
+        return entry
+
+def import_languages(path=LANGUAGES_FILE):
+    """Wczytuje języki z pliku LANGUAGES_FILE (lub podanego)."""
+    return ContentImporter().import_languages(path)
+
+def import_content(path, fmt=None, batch_size=CONTENT_IMPORT_BATCH_SIZE):
+    """Importuje pakiet lekcji z pliku JSON, NDJSON lub CSV. Zwraca raport importu."""
+    return ContentImporter(batch_size).import_file(path, fmt)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+import re
+import logging
+import unicodedata
+from functools import lru_cache
+from database.migrations import SEARCH_FOLDING
+from config import ANSWER_CACHE_SIZE, ANSWER_MAX_TYPOS, ANSWER_CHARS_PER_TYPO
+
+logger = logging.getLogger(__name__)
+
+# Poprawne odpowiedzi mogą mieć warianty rozdzielone '|', a fragmenty
+# w nawiasach są opcjonalne: "(to) be|being" = "to be", "be", "being"
+ALTERNATIVE_SEPARATOR = '|'
+_OPTIONAL = re.compile(r'\(([^()]*)\)')
+
+# Apostrofy są usuwane (l'élève = lélève), pozostała interpunkcja zastępuje spację
+APOSTROPHES = "'’‘`´ʼ"
+
+class _CharTable(dict):
+    """
+    Tablica dla str.translate wypełniana przy pierwszym wystąpieniu znaku -
+    kolejne odpowiedzi są przetwarzane w całości przez str.translate w C.
+    """
+    
+    def __init__(self, convert):
+        super().__init__()
+        self._convert = convert
+    
+    def __missing__(self, code):
+        value = self._convert(chr(code))
+        self[code] = value
+        return value
+
+def _basic_char(char):
+    """Znak po normalizacji wielkości liter, odstępów i interpunkcji."""
+    if char in APOSTROPHES:
+        return None
+    if char.isspace() or unicodedata.category(char)[0] in 'PS':
+        return ' '
+    return char.casefold()
+
+def _folded_char(char):
+    """Znak bez znaków diakrytycznych (także ł, ß, œ, æ, ё)."""
+    if unicodedata.category(char) == 'Mn':
+        return None
+    char = SEARCH_FOLDING.get(char, char)
+    return ''.join(c for c in unicodedata.normalize('NFD', char) if unicodedata.category(c) != 'Mn')
+
+_BASIC = _CharTable(_basic_char)
+_FOLDED = _CharTable(_folded_char)
+
+def normalize_answer(text, fold_diacritics=True):
+    """
+    Normalizuje odpowiedź: wielkość liter, odstępy, interpunkcja
+    i - przy fold_diacritics=True - znaki diakrytyczne.
+    """
+    text = ' '.join(unicodedata.normalize('NFC', text).translate(_BASIC).split())
+    return text.translate(_FOLDED) if fold_diacritics else text
+
+def bounded_edit_distance(peq, length, text, limit):
+    """
+    Odległość edycyjna (Levenshteina) między wzorcem a tekstem algorytmem
+    bitowo-równoległym Myersa (w wersji Hyyrö dla całych napisów): jedna
+    kolumna macierzy na znak tekstu, niezależnie od długości wzorca.
+    peq to maski pozycji znaków wzorca o długości length. Zwraca None, gdy
+    odległość przekracza limit - obliczenie kończy się wtedy, gdy tylko
+    dolne ograniczenie wyniku przekroczy limit.
+    """
+    n = len(text)
+    if abs(n - length) > limit:
+        return None
+    if length == 0:
+        return n
+    
+    mask = (1 << length) - 1
+    high = 1 << (length - 1)
+    vp = mask
+    vn = 0
+    score = length
+    get = peq.get
+    for j, char in enumerate(text):
+        eq = get(char, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | ~(xh | vp)
+        hn = vp & xh
+        if hp & high:
+            score += 1
+        elif hn & high:
+            score -= 1
+        # Każdy kolejny znak zmienia wynik najwyżej o 1
+        if score - (n - j - 1) > limit:
+            return None
+        hp = (hp << 1) | 1
+        hn <<= 1
+        vp = (hn | ~(xv | hp)) & mask
+        vn = hp & xv & mask
+    return score
+
+class CompiledAnswer:
+    """Wariant poprawnej odpowiedzi z postaciami znormalizowanymi i maskami wzorca."""
+    
+    __slots__ = ('text', 'strict', 'folded', 'peq', 'max_typos')
+    
+    def __init__(self, text, fuzzy=True):
+        """Normalizuje wariant i przygotowuje maski znaków dla odległości edycyjnej."""
+        self.text = text
+        self.strict = normalize_answer(text, fold_diacritics=False)
+        self.folded = self.strict.translate(_FOLDED)
+        self.peq = {}
+        for position, char in enumerate(self.folded):
+            self.peq[char] = self.peq.get(char, 0) | 1 << position
+        self.max_typos = min(ANSWER_MAX_TYPOS, len(self.folded) // ANSWER_CHARS_PER_TYPO) if fuzzy else 0
+
+class AnswerResult:
+    """
+    Wynik sprawdzenia odpowiedzi: correct - odpowiedź zaliczona, exact - zgodna
+    co do znaku (po normalizacji wielkości liter, odstępów i interpunkcji),
+    typos - liczba literówek (0 także gdy różnią się tylko znaki diakrytyczne),
+    expected - wariant poprawnej odpowiedzi, do którego dopasowano odpowiedź.
+    """
+    
+    __slots__ = ('correct', 'exact', 'typos', 'expected')
+    
+    def __init__(self, correct, exact=False, typos=None, expected=None):
+        """Inicjalizacja wyniku."""
+        self.correct = correct
+        self.exact = exact
+        self.typos = typos
+        self.expected = expected
+    
+    def __bool__(self):
+        return self.correct
+    
+    def __repr__(self):
+        return (f"AnswerResult(correct={self.correct}, exact={self.exact}, "
+                f"typos={self.typos}, expected={self.expected!r})")
+
+def _expand(alternative):
+    """Rozwija opcjonalne fragmenty w nawiasach w listę wariantów."""
+    variants = [alternative]
+    while any('(' in variant for variant in variants):
+        expanded = []
+        for variant in variants:
+            match = _OPTIONAL.search(variant)
+            if match is None:
+                expanded.append(variant.replace('(', '').replace(')', ''))
+                continue
+            expanded.append(variant[:match.start()] + match.group(1) + variant[match.end():])
+            expanded.append(variant[:match.start()] + variant[match.end():])
+        variants = expanded
+    return [' '.join(variant.split()) for variant in variants]
+
+@lru_cache(maxsize=ANSWER_CACHE_SIZE)
+def compile_answer(correct_answer, fuzzy=True):
+    """
+    Rozbija poprawną odpowiedź na warianty i zapamiętuje ich postaci
+    znormalizowane - normalizacja poprawnej odpowiedzi odbywa się raz,
+    a nie przy każdym sprawdzeniu.
+    """
+    compiled = []
+    seen = set()
+    for alternative in correct_answer.split(ALTERNATIVE_SEPARATOR):
+        for variant in _expand(alternative):
+            answer = CompiledAnswer(variant, fuzzy)
+            if answer.strict and answer.strict not in seen:
+                seen.add(answer.strict)
+                compiled.append(answer)
+    return tuple(compiled)
+
+def answer_cache_stats():
+    """Zwraca liczniki cache skompilowanych odpowiedzi (trafienia, chybienia, rozmiar)."""
+    info = compile_answer.cache_info()
+    requests = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_rate': info.hits / requests if requests else 0.0,
+    }
+
+def check_answer(answer, correct_answer, fuzzy=True):
+    """
+    Sprawdza odpowiedź użytkownika. Kolejno: zgodność dokładna, zgodność
+    bez znaków diakrytycznych, a przy fuzzy=True - literówki w granicy
+    ANSWER_MAX_TYPOS (1 na każde ANSWER_CHARS_PER_TYPO znaków wariantu).
+    """
+    if not answer or not correct_answer:
+        return AnswerResult(False)
+    alternatives = compile_answer(correct_answer, fuzzy)
+    strict = normalize_answer(answer, fold_diacritics=False)
+    for alternative in alternatives:
+        if strict == alternative.strict:
+            return AnswerResult(True, True, 0, alternative.text)
+    
+    folded = strict.translate(_FOLDED)
+    for alternative in alternatives:
+        if folded == alternative.folded:
+            return AnswerResult(True, False, 0, alternative.text)
+    
+    best = None
+    for alternative in alternatives:
+        limit = alternative.max_typos if best is None else min(alternative.max_typos, best[0] - 1)
+        if limit <= 0:
+            continue
+        distance = bounded_edit_distance(alternative.peq, len(alternative.folded), folded, limit)
+        if distance is not None and distance <= limit:
+            best = (distance, alternative)
+    if best is not None:
+        return AnswerResult(True, False, best[0], best[1].text)
+    return AnswerResult(False)
+
+def check_exercise_answer(exercise, answer):
+    """
+    Sprawdza odpowiedź na ćwiczenie. W ćwiczeniach z opcjami do wyboru
+    literówki nie są tolerowane.
+    """
+    return check_answer(answer, exercise.correct_answer, fuzzy=not exercise.options)
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import mmap
+import struct
+import time
+import logging
+import threading
+from itertools import groupby
+import database.db_manager
+from database.db_manager import DatabaseManager
+from database.models import Language, Lesson, Exercise
+from database.migrations import SEARCH_FOLDING
+from config import CONTENT_PACK_FILE, CONTENT_VERSION_CHECK_INTERVAL, SEARCH_RESULTS_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Format skompilowanego pakietu treści (liczby little-endian):
+#   nagłówek | tabela języków | tabela lekcji | dane (JSON w UTF-8)
+# Lekcje w tabeli są ułożone według języka i order_index, więc lekcje języka
+# to ciągły zakres wpisów. Ćwiczenia lekcji to jedna tablica JSON wierszy
+# w kolejności PACK_EXERCISE_COLUMNS - zmiana kolumn wymaga podbicia PACK_VERSION.
+PACK_MAGIC = b'LLCP'
+PACK_VERSION = 1
+PACK_EXERCISE_COLUMNS = Exercise.columns
+
+# magic, wersja, zarezerwowane, liczba języków, liczba lekcji, content_version bazy
+HEADER = struct.Struct('<4sHHIIQ')
+# language_id, pierwsza lekcja, liczba lekcji, offset i długość danych języka
+LANGUAGE_ENTRY = struct.Struct('<IIIQI')
+# lesson_id, language_id, offset i długość danych lekcji, offset i długość ćwiczeń, liczba ćwiczeń
+LESSON_ENTRY = struct.Struct('<IIQIQII')
+
+class ContentPackError(ValueError):
+    """Niepoprawny lub uszkodzony plik pakietu treści."""
+
+_FOLDING = str.maketrans(SEARCH_FOLDING)
+_WORD = re.compile(r'\w+')
+
+def match_query(text):
+    """
+    Zamienia tekst wpisany przez użytkownika na zapytanie FTS5: każde słowo
+    jest wyszukiwane jako prefiks (wyszukiwanie w trakcie pisania), a litery
+    z SEARCH_FOLDING są zamieniane tak jak w indeksie. Składnia FTS5 w tekście
+    nie jest interpretowana. Zwraca None, gdy tekst nie zawiera słów.
+    """
+    words = _WORD.findall(text.translate(_FOLDING))
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def _encode(data):
+    """Serializuje dane do zwartego JSON w UTF-8."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def build_pack(path=CONTENT_PACK_FILE, db_path=None):
+    """
+    Kompiluje aktywne języki, lekcje i ich ćwiczenia z bazy do pliku pakietu.
+    Plik jest zapisywany obok i podmieniany atomowo, więc otwarte
+    wcześniej pakiety nadal widzą poprzednią wersję. Na Windows podmiana
+    pliku otwartego przez inny proces się nie uda (PermissionError) - pakiet
+    trzeba budować przy zamkniętych instancjach aplikacji; pakiet otwarty
+    przez lesson_manager w tym procesie jest zamykany przed podmianą.
+    Zwraca słownik z liczbą języków, lekcji, ćwiczeń i rozmiarem pliku.
+    """
+    with DatabaseManager(db_path) as db:
+        content_version = db.fetch_scalar(
+            "SELECT value FROM app_meta WHERE key = 'content_version'", default=0
+        )
+        languages = db.fetch_all("SELECT * FROM languages WHERE is_active = 1 ORDER BY id")
+        lessons = db.fetch_all('''
+            SELECT l.* FROM lessons l JOIN languages g ON g.id = l.language_id
+            WHERE l.is_active = 1 AND g.is_active = 1
+            ORDER BY l.language_id, l.order_index, l.id
+        ''')
+        lesson_ids = {row['id'] for row in lessons}
+        
+        tables_size = HEADER.size + LANGUAGE_ENTRY.size * len(languages) + LESSON_ENTRY.size * len(lessons)
+        exercise_count = 0
+        lesson_entries = []
+        language_entries = []
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.seek(tables_size)
+            
+            # Ćwiczenia wszystkich lekcji jednym strumieniowym odczytem indeksu (lesson_id, order_index)
+            payloads = {}
+            columns = ', '.join(PACK_EXERCISE_COLUMNS)
+            rows = db.iter_rows(f"SELECT {columns} FROM exercises ORDER BY lesson_id, order_index, id")
+            for lesson_id, group in groupby(rows, key=lambda row: row['lesson_id']):
+                if lesson_id not in lesson_ids:
+                    continue
+                exercises = [tuple(row) for row in group]
+                offset = f.tell()
+                f.write(_encode(exercises))
+                payloads[lesson_id] = (offset, f.tell() - offset, len(exercises))
+                exercise_count += len(exercises)
+            
+            by_language = {key: list(group) for key, group in groupby(lessons, key=lambda row: row['language_id'])}
+            for language in languages:
+                first = len(lesson_entries)
+                for lesson in by_language.get(language['id'], ()):
+                    offset = f.tell()
+                    f.write(_encode(dict(lesson)))
+                    exercises_offset, exercises_length, count = payloads.get(lesson['id'], (0, 0, 0))
+                    lesson_entries.append((lesson['id'], lesson['language_id'], offset, f.tell() - offset,
+                                           exercises_offset, exercises_length, count))
+                offset = f.tell()
+                f.write(_encode(dict(language)))
+                language_entries.append((language['id'], first, len(lesson_entries) - first,
+                                         offset, f.tell() - offset))
+            
+            f.seek(0)
+            f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(language_entries), len(lesson_entries),
+                                content_version or 0))
+            for entry in language_entries:
+                f.write(LANGUAGE_ENTRY.pack(*entry))
+            for entry in lesson_entries:
+                f.write(LESSON_ENTRY.pack(*entry))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.seek(0, os.SEEK_END)
+        if lesson_manager.pack_path and os.path.abspath(lesson_manager.pack_path) == os.path.abspath(path):
+            lesson_manager.close()
+        try:
+            os.replace(temp_path, path)
+        except PermissionError:
+            os.remove(temp_path)
+            logger.error(f"Nie można podmienić pakietu treści {path} - plik jest otwarty przez inny proces")
+            raise
+    
+    logger.info(f"Zbudowano pakiet treści {path}: {len(lesson_entries)} lekcji, {exercise_count} ćwiczeń")
+    return {
+        'languages': len(language_entries),
+        'lessons': len(lesson_entries),
+        'exercises': exercise_count,
+        'size': size,
+    }
+
+class ContentPack:
+    """
+    Skompilowany pakiet treści otwarty tylko do odczytu przez mmap.
+    
+    Przy otwarciu wczytywane są jedynie tabele offsetów; dane lekcji są
+    wycinkami (memoryview) zmapowanego pliku, więc wiele procesów (np.
+    stanowiska w pracowni) współdzieli jedną kopię w pamięci podręcznej
+    systemu, a wczytanie lekcji to odczyt z indeksu i wycinek.
+    """
+    
+    def __init__(self, path=CONTENT_PACK_FILE):
+        """Otwiera i mapuje plik pakietu (ContentPackError dla złego pliku)."""
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ContentPackError(f"Pusty plik pakietu treści: {path}")
+        self._view = memoryview(self._map)
+        try:
+            self._read_tables()
+        except (ContentPackError, struct.error) as e:
+            self.close()
+            raise ContentPackError(f"Uszkodzony pakiet treści {path}: {e}")
+    
+    def _read_tables(self):
+        """Wczytuje nagłówek i tabele offsetów."""
+        magic, version, _, language_count, lesson_count, self.content_version = HEADER.unpack_from(self._map, 0)
+        if magic != PACK_MAGIC:
+            raise ContentPackError("nieprawidłowy nagłówek")
+        if version != PACK_VERSION:
+            raise ContentPackError(f"nieobsługiwana wersja {version}")
+        
+        start = HEADER.size
+        end = start + LANGUAGE_ENTRY.size * language_count
+        if end + LESSON_ENTRY.size * lesson_count > len(self._map):
+            raise ContentPackError("plik jest niekompletny")
+        # language_id -> (pierwsza lekcja, liczba lekcji, offset, długość)
+        self._languages = {entry[0]: entry[1:] for entry in LANGUAGE_ENTRY.iter_unpack(self._view[start:end])}
+        
+        start, end = end, end + LESSON_ENTRY.size * lesson_count
+        self._lesson_table = self._view[start:end]
+        # lesson_id -> numer wpisu w tabeli lekcji
+        self._lesson_index = {entry[0]: number
+                              for number, entry in enumerate(LESSON_ENTRY.iter_unpack(self._lesson_table))}
+    
+    def _slice(self, offset, length):
+        """Zwraca wycinek pliku bez kopiowania."""
+        if offset + length > len(self._map):
+            raise ContentPackError(f"Uszkodzony pakiet treści {self.path}: offset poza plikiem")
+        return self._view[offset:offset + length]
+    
+    def _lesson_entry(self, number):
+        """Zwraca wpis tabeli lekcji o podanym numerze."""
+        return LESSON_ENTRY.unpack_from(self._lesson_table, number * LESSON_ENTRY.size)
+    
+    def _load(self, offset, length):
+        """Dekoduje dane JSON z wycinka pliku."""
+        return json.loads(str(self._slice(offset, length), 'utf-8'))
+    
+    def language_ids(self):
+        """Zwraca ID języków w pakiecie."""
+        return list(self._languages)
+    
+    def get_languages(self):
+        """Zwraca aktywne języki zapisane w pakiecie."""
+        return [Language(self._load(*entry[2:])) for entry in self._languages.values()]
+    
+    def get_lessons(self, language_id):
+        """Zwraca lekcje języka w kolejności order_index."""
+        entry = self._languages.get(language_id)
+        if entry is None:
+            return []
+        first, count = entry[:2]
+        return [Lesson(self._load(*self._lesson_entry(number)[2:4])) for number in range(first, first + count)]
+    
+    def get_lesson(self, lesson_id):
+        """Zwraca lekcję po ID (None, gdy nie ma jej w pakiecie)."""
+        number = self._lesson_index.get(lesson_id)
+        if number is None:
+            return None
+        return Lesson(self._load(*self._lesson_entry(number)[2:4]))
+    
+    def exercise_count(self, lesson_id):
+        """Zwraca liczbę ćwiczeń lekcji bez dekodowania danych."""
+        number = self._lesson_index.get(lesson_id)
+        return 0 if number is None else self._lesson_entry(number)[6]
+    
+    def exercise_payload(self, lesson_id):
+        """
+        Zwraca wycinek (memoryview) z ćwiczeniami lekcji zapisanymi jako JSON
+        - bez kopiowania danych. None, gdy lekcji nie ma w pakiecie.
+        Wycinek trzeba zwolnić (release()) przed zamknięciem pakietu.
+        """
+        number = self._lesson_index.get(lesson_id)
+        if number is None:
+            return None
+        _, _, _, _, offset, length, _ = self._lesson_entry(number)
+        return self._slice(offset, length)
+    
+    def get_exercises(self, lesson_id):
+        """Zwraca ćwiczenia lekcji (obiekty Exercise) w kolejności order_index."""
+        payload = self.exercise_payload(lesson_id)
+        if not payload:
+            return []
+        with payload:
+            rows = json.loads(str(payload, 'utf-8'))
+        factory = Exercise.row_factory([(column,) for column in PACK_EXERCISE_COLUMNS])
+        return [factory(None, row) for row in rows]
+    
+    def close(self):
+        """Zamyka mapowanie i plik."""
+        try:
+            if getattr(self, '_lesson_table', None) is not None:
+                self._lesson_table.release()
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # Wycinki zwrócone przez exercise_payload() wciąż są używane -
+            # mapowanie zostanie zwolnione razem z nimi
+            logger.warning(f"Pakiet treści {self.path} ma niezwolnione wycinki danych")
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class LessonManager:
+    """
+    Dostęp do katalogu lekcji dla interfejsu.
+    
+    Jeśli istnieje skompilowany pakiet treści (CONTENT_PACK_FILE), lekcje
+    i ćwiczenia są czytane z niego; w przeciwnym razie - z bazy przez modele
+    (z cache katalogu). Pakiet zbudowany przed zmianą treści w bazie (inny
+    content_version) jest pomijany, tak jak CatalogCache unieważnia wpisy.
+    """
+    
+    def __init__(self, pack_path=CONTENT_PACK_FILE, check_interval=CONTENT_VERSION_CHECK_INTERVAL):
+        """Inicjalizacja managera (pakiet jest otwierany przy pierwszym użyciu)."""
+        self.pack_path = pack_path
+        self.check_interval = check_interval
+        self._pack = None
+        self._pack_signature = None
+        # Sygnatura pliku uszkodzonego lub nieaktualnego - nie jest otwierany, dopóki się nie zmieni
+        self._rejected = None
+        self._db_path = None
+        self._next_check = 0.0
+        self._lock = threading.RLock()
+    
+    def _signature(self):
+        """Zwraca (i-węzeł, rozmiar, czas modyfikacji) pliku pakietu albo None, gdy go brak."""
+        try:
+            stat = os.stat(self.pack_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    def _read_content_version(self):
+        """Odczytuje licznik content_version z bazy."""
+        with DatabaseManager() as db:
+            return db.fetch_scalar("SELECT value FROM app_meta WHERE key = 'content_version'", default=0) or 0
+    
+    def _close_pack(self):
+        """Zamyka otwarty pakiet."""
+        if self._pack is not None:
+            self._pack.close()
+        self._pack = None
+        self._pack_signature = None
+    
+    def pack(self):
+        """
+        Zwraca otwarty pakiet treści albo None, gdy go brak, jest uszkodzony
+        lub nieaktualny. Przy otwarciu i potem co check_interval sekund wersja
+        pakietu jest porównywana z licznikiem content_version w bazie: pakiet
+        starszy niż baza jest pomijany (odczyt z bazy), a przebudowany plik
+        jest otwierany ponownie.
+        """
+        if not self.pack_path:
+            return None
+        db_path = database.db_manager.DATABASE_PATH
+        now = time.monotonic()
+        with self._lock:
+            if db_path == self._db_path and now < self._next_check:
+                return self._pack
+            self._db_path = db_path
+            self._next_check = now + self.check_interval
+            
+            signature = self._signature()
+            if self._pack is not None and signature != self._pack_signature:
+                logger.info(f"Plik pakietu treści zmienił się: {self.pack_path}")
+                self._close_pack()
+            if self._pack is None:
+                if signature is None or signature == self._rejected:
+                    return None
+                try:
+                    self._pack = ContentPack(self.pack_path)
+                    self._pack_signature = signature
+                except (OSError, ContentPackError) as e:
+                    logger.error(f"Nie można otworzyć pakietu treści: {e}")
+                    self._rejected = signature
+                    return None
+                logger.info(f"Otwarto pakiet treści: {self.pack_path}")
+            
+            version = self._read_content_version()
+            if self._pack.content_version != version:
+                logger.warning(f"Pakiet treści {self.pack_path} jest nieaktualny (wersja {self._pack.content_version}, "
+                               f"w bazie {version}) - treść będzie czytana z bazy")
+                self._rejected = self._pack_signature
+                self._close_pack()
+            return self._pack
+    
+    def get_languages(self):
+        """Zwraca aktywne języki."""
+        with self._lock:
+            pack = self.pack()
+            if pack:
+                return pack.get_languages()
+        return Language.get_active()
+    
+    def get_lessons(self, language_id):
+        """Zwraca lekcje języka w kolejności order_index."""
+        with self._lock:
+            pack = self.pack()
+            if pack:
+                return pack.get_lessons(language_id)
+        return Lesson.get_by_language(language_id)
+    
+    def get_lesson_list(self, language_id):
+        """
+        Zwraca listę lekcji języka do wyświetlenia jako krotki (lekcja, liczba ćwiczeń).
+        Bez pakietu lekcje są pobierane tylko z kolumnami listy, a ćwiczenia
+        jedynie zliczane - bez wczytywania ich treści.
+        """
+        with self._lock:
+            pack = self.pack()
+            if pack:
+                return [(lesson, pack.exercise_count(lesson.id)) for lesson in pack.get_lessons(language_id)]
+        lessons = Lesson.get_list(language_id)
+        counts = Exercise.count_by_lessons(lesson.id for lesson in lessons)
+        return [(lesson, counts[lesson.id]) for lesson in lessons]
+    
+    def get_lesson(self, lesson_id):
+        """Zwraca lekcję po ID."""
+        with self._lock:
+            pack = self.pack()
+            if pack:
+                return pack.get_lesson(lesson_id)
+        return Lesson.get_by_id(lesson_id)
+    
+    def get_exercises(self, lesson_id):
+        """Zwraca ćwiczenia lekcji w kolejności order_index."""
+        with self._lock:
+            pack = self.pack()
+            if pack:
+                return pack.get_exercises(lesson_id)
+        return Exercise.get_by_lesson(lesson_id)
+    
+    def search_lessons(self, text, language_id=None, limit=SEARCH_RESULTS_LIMIT):
+        """Wyszukuje aktywne lekcje po tytule i opisie (trafienia w tytule ważą więcej)."""
+        query = match_query(text)
+        if query is None:
+            return []
+        condition = "AND l.language_id = ?" if language_id is not None else ""
+        params = (query,) + ((language_id,) if language_id is not None else ()) + (limit,)
+        with DatabaseManager() as db:
+            return db.fetch_models(Lesson, f'''
+                SELECT l.* FROM lessons_fts JOIN lessons l ON l.id = lessons_fts.rowid
+                WHERE lessons_fts MATCH ? AND l.is_active = 1 {condition}
+                ORDER BY bm25(lessons_fts, 10.0, 1.0)
+                LIMIT ?
+            ''', params)
+    
+    def search_exercises(self, text, language_id=None, limit=SEARCH_RESULTS_LIMIT):
+        """Wyszukuje ćwiczenia aktywnych lekcji po treści, odpowiedzi i podpowiedzi."""
+        query = match_query(text)
+        if query is None:
+            return []
+        condition = "AND l.language_id = ?" if language_id is not None else ""
+        params = (query,) + ((language_id,) if language_id is not None else ()) + (limit,)
+        with DatabaseManager() as db:
+            return db.fetch_models(Exercise, f'''
+                SELECT e.* FROM exercises_fts
+                JOIN exercises e ON e.id = exercises_fts.rowid
+                JOIN lessons l ON l.id = e.lesson_id
+                WHERE exercises_fts MATCH ? AND l.is_active = 1 {condition}
+                ORDER BY bm25(exercises_fts, 5.0, 3.0, 1.0)
+                LIMIT ?
+            ''', params)
+    
+    def search_favorites(self, user_id, text, limit=SEARCH_RESULTS_LIMIT):
+        """Wyszukuje ulubione słowa użytkownika (słowo lub tłumaczenie). Zwraca listę słowników."""
+        query = match_query(text)
+        if query is None:
+            return []
+        with DatabaseManager() as db:
+            rows = db.fetch_all('''
+                SELECT f.id, f.word, f.translation, f.language_id, f.date_added
+                FROM favorites_fts JOIN user_favorites f ON f.id = favorites_fts.rowid
+                WHERE favorites_fts MATCH ? AND f.user_id = ?
+                ORDER BY bm25(favorites_fts, 5.0, 3.0)
+                LIMIT ?
+            ''', (query, user_id, limit))
+        return [dict(row) for row in rows]
+    
+    def reload(self):
+        """Zamyka pakiet - przy następnym użyciu zostanie otwarty ponownie (np. po przebudowie)."""
+        self.close()
+    
+    def close(self):
+        """Zamyka otwarty pakiet treści (przy następnym użyciu plik jest sprawdzany od nowa)."""
+        with self._lock:
+            self._close_pack()
+            self._rejected = None
+            self._db_path = None
+            self._next_check = 0.0
+
+lesson_manager = LessonManager()
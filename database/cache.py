@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+import database.db_manager
+from database.db_manager import DatabaseManager
+from config import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL, CONTENT_VERSION_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class CatalogCache:
+    """
+    Cache read-through dla rzadko zmienianych tabel katalogu treści.
+    
+    Wpisy są przechowywane w kolejności LRU z ograniczeniem rozmiaru i czasu
+    życia. Obiekty modeli trafiają do mapy tożsamości pod kluczem (klasa, id),
+    więc ten sam wiersz jest reprezentowany przez jeden obiekt. Całość jest
+    unieważniana przez save() modeli oraz po zmianie licznika content_version
+    w bazie (sprawdzanego co CONTENT_VERSION_CHECK_INTERVAL sekund).
+    """
+    
+    def __init__(self, max_size=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL,
+                 check_interval=CONTENT_VERSION_CHECK_INTERVAL):
+        """Inicjalizacja cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._db_path = None
+        self._content_version = None
+        self._next_check = 0.0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+    
+    def _read_content_version(self):
+        """Odczytuje licznik content_version z bazy."""
+        with DatabaseManager() as db:
+            return db.fetch_scalar("SELECT value FROM app_meta WHERE key = 'content_version'")
+    
+    def _validate(self):
+        """Czyści cache, jeśli zmieniła się baza lub wersja treści."""
+        db_path = database.db_manager.DATABASE_PATH
+        now = time.monotonic()
+        if db_path == self._db_path and now < self._next_check:
+            return
+        
+        version = self._read_content_version()
+        with self._lock:
+            if db_path != self._db_path or version != self._content_version:
+                if self._entries:
+                    self._stats['invalidations'] += 1
+                self._entries.clear()
+            self._db_path = db_path
+            self._content_version = version
+            self._next_check = now + self.check_interval
+    
+    def get(self, key, default=None):
+        """Zwraca wartość z cache lub default (liczy trafienia i chybienia)."""
+        self._validate()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._stats['evictions'] += 1
+            self._stats['misses'] += 1
+            return default
+    
+    def put(self, key, value):
+        """Zapisuje wartość w cache, usuwając najdawniej używane wpisy ponad limit."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return value
+    
+    def identity(self, obj):
+        """
+        Zwraca obiekt z mapy tożsamości dla (klasa, id) albo rejestruje
+        w niej podany obiekt, jeśli jeszcze go tam nie ma.
+        """
+        key = (type(obj), obj.id)
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and time.monotonic() < entry[0]:
+                return entry[1]
+            return self.put(key, obj)
+    
+    def load(self, key, loader):
+        """
+        Read-through: zwraca wartość z cache albo wynik loader() zapisany w cache.
+        Listy są zwracane jako kopie, żeby wywołujący nie zmieniał wpisu w cache.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return self.store(key, loader())
+        return list(value) if isinstance(value, list) else value
+    
+    def store(self, key, value):
+        """
+        Zapisuje wynik zapytania (obiekt, listę obiektów lub None) pod kluczem,
+        przepuszczając obiekty przez mapę tożsamości.
+        """
+        if isinstance(value, list):
+            value = [self.identity(obj) for obj in value]
+        elif value is not None:
+            value = self.identity(value)
+        self.put(key, value)
+        return list(value) if isinstance(value, list) else value
+    
+    def invalidate(self):
+        """Unieważnia cały cache (np. po zapisie zmian w katalogu)."""
+        with self._lock:
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+            # Wymuszenie ponownego odczytu wersji - zapis właśnie ją zmienił
+            self._next_check = 0.0
+    
+    def clear(self):
+        """Czyści cache i stan wersji bez liczenia unieważnienia."""
+        with self._lock:
+            self._entries.clear()
+            self._db_path = None
+            self._content_version = None
+            self._next_check = 0.0
+    
+    def stats(self):
+        """Zwraca liczniki cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+catalog_cache = CatalogCache()
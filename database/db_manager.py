@@ -2,27 +2,311 @@
 
 import sqlite3
 import logging
-from config import DATABASE_PATH
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from config import (DATABASE_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+                    DB_POOL_IDLE_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL,
+                    DB_STORAGE_PROFILE, DB_CACHED_STATEMENTS, SQL_CACHE_SIZE,
+                    DB_FETCH_BATCH_SIZE)
 
 logger = logging.getLogger(__name__)
 
+def apply_storage_profile(connection, profile=None):
+    """
+    Ustawia PRAGMA z profilu przechowywania (tryb dziennika, synchronizacja,
+    cache, mmap, busy timeout) na podanym połączeniu.
+    """
+    if profile is None:
+        profile = DB_STORAGE_PROFILE
+    for pragma, value in profile.items():
+        try:
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        except sqlite3.Error as e:
+            logger.warning(f"Nie udało się ustawić PRAGMA {pragma} = {value}: {e}")
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def compile_statement(operation, table, columns=(), condition=None):
+    """
+    Buduje (i zapamiętuje) treść instrukcji SQL dla operacji 'select', 'insert',
+    'update' lub 'delete'. Ten sam obiekt tekstu dla tych samych argumentów
+    pozwala też SQLite ponownie użyć przygotowanej instrukcji z cache połączenia.
+    """
+    if operation == 'select':
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+    elif operation == 'insert':
+        placeholders = ', '.join(['?' for _ in columns])
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    elif operation == 'update':
+        set_clause = ', '.join([f"{column} = ?" for column in columns])
+        query = f"UPDATE {table} SET {set_clause}"
+    elif operation == 'delete':
+        query = f"DELETE FROM {table}"
+    else:
+        raise ValueError(f"Nieznana operacja SQL: {operation}")
+    
+    if condition:
+        query += f" WHERE {condition}"
+    return query
+
+def statement_cache_stats():
+    """Zwraca liczniki cache instrukcji SQL (trafienia, chybienia, rozmiar)."""
+    info = compile_statement.cache_info()
+    requests = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_rate': info.hits / requests if requests else 0.0,
+    }
+
+class ConnectionPool:
+    """
+    Pula długo żyjących połączeń SQLite.
+    
+    Połączenia są przypisane do wątków - każdy wątek ma własną listę
+    bezczynnych połączeń, więc jedno połączenie nigdy nie jest używane
+    równocześnie przez dwa wątki. Rozmiar puli ogranicza liczbę połączeń
+    wypożyczonych w tym samym czasie.
+    """
+    
+    def __init__(self, db_path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        """Inicjalizacja puli połączeń."""
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        # id wątku -> lista par (połączenie, czas zwrotu do puli)
+        self._idle = {}
+        self._closed = False
+        self._trace_callback = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'evicted': 0,
+            'discarded': 0,
+        }
+    
+    def _create_connection(self):
+        """Otwiera nowe połączenie z bazą danych."""
+        connection = sqlite3.connect(self.db_path, check_same_thread=False,
+                                     cached_statements=DB_CACHED_STATEMENTS)
+        apply_storage_profile(connection)
+        # Włączenie obsługi kluczy obcych
+        connection.execute("PRAGMA foreign_keys = ON")
+        # Ustawienie zwracania wierszy jako słowniki
+        connection.row_factory = sqlite3.Row
+        return connection
+    
+    def _is_healthy(self, connection):
+        """Sprawdza czy połączenie nadal odpowiada."""
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def _close_quietly(self, connection):
+        """Zamyka połączenie ignorując błędy."""
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+    
+    def acquire(self):
+        """
+        Wypożycza połączenie z puli dla bieżącego wątku.
+        Rzuca sqlite3.OperationalError, gdy w czasie timeout nie zwolni się żadne miejsce.
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("Pula połączeń została zamknięta")
+        
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += waited
+            if not acquired:
+                raise sqlite3.OperationalError(
+                    f"Przekroczono czas oczekiwania na połączenie z pulą ({self.timeout} s)"
+                )
+        
+        thread_id = threading.get_ident()
+        now = time.monotonic()
+        try:
+            while True:
+                with self._lock:
+                    idle = self._idle.get(thread_id)
+                    entry = idle.pop() if idle else None
+                if entry is None:
+                    break
+                
+                connection, released_at = entry
+                idle_for = now - released_at
+                if idle_for > self.idle_timeout:
+                    self._close_quietly(connection)
+                    with self._lock:
+                        self._stats['evicted'] += 1
+                    continue
+                if idle_for > self.health_check_interval and not self._is_healthy(connection):
+                    self._close_quietly(connection)
+                    with self._lock:
+                        self._stats['discarded'] += 1
+                    continue
+                
+                with self._lock:
+                    self._stats['hits'] += 1
+                connection.set_trace_callback(self._trace_callback)
+                return connection
+            
+            connection = self._create_connection()
+            with self._lock:
+                self._stats['misses'] += 1
+            connection.set_trace_callback(self._trace_callback)
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def release(self, connection):
+        """Zwraca połączenie do puli bieżącego wątku."""
+        try:
+            if self._closed:
+                self._close_quietly(connection)
+                return
+            
+            try:
+                # Niezatwierdzone zmiany nie mogą przejść do kolejnego użytkownika
+                if connection.in_transaction:
+                    connection.rollback()
+            except sqlite3.Error:
+                self._close_quietly(connection)
+                with self._lock:
+                    self._stats['discarded'] += 1
+                return
+            
+            with self._lock:
+                idle = self._idle.setdefault(threading.get_ident(), [])
+                idle.append((connection, time.monotonic()))
+                overflow = idle[:-self.max_size] if len(idle) > self.max_size else []
+                del idle[:len(overflow)]
+                self._stats['evicted'] += len(overflow)
+            for old_connection, _ in overflow:
+                self._close_quietly(old_connection)
+        finally:
+            self._slots.release()
+    
+    def set_trace_callback(self, callback):
+        """Ustawia funkcję wywoływaną z treścią każdej instrukcji SQL (None wyłącza)."""
+        self._trace_callback = callback
+    
+    def evict_idle(self):
+        """Zamyka połączenia bezczynne dłużej niż idle_timeout (również z zakończonych wątków)."""
+        now = time.monotonic()
+        alive = {thread.ident for thread in threading.enumerate()}
+        expired = []
+        with self._lock:
+            for thread_id in list(self._idle):
+                idle = self._idle[thread_id]
+                if thread_id not in alive:
+                    expired.extend(idle)
+                    idle = []
+                else:
+                    expired.extend(e for e in idle if now - e[1] > self.idle_timeout)
+                    idle = [e for e in idle if now - e[1] <= self.idle_timeout]
+                if idle:
+                    self._idle[thread_id] = idle
+                else:
+                    del self._idle[thread_id]
+            self._stats['evicted'] += len(expired)
+        for connection, _ in expired:
+            self._close_quietly(connection)
+        return len(expired)
+    
+    def close(self):
+        """Zamyka wszystkie bezczynne połączenia i blokuje dalsze wypożyczanie."""
+        with self._lock:
+            self._closed = True
+            entries = [e for idle in self._idle.values() for e in idle]
+            self._idle.clear()
+        for connection, _ in entries:
+            self._close_quietly(connection)
+    
+    def stats(self):
+        """Zwraca liczniki puli (trafienia, nowe połączenia, czas oczekiwania)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path=None):
+    """Zwraca (tworząc w razie potrzeby) pulę połączeń dla danego pliku bazy."""
+    if db_path is None:
+        db_path = DATABASE_PATH
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+@contextmanager
+def trace_statements(db_path=None):
+    """
+    Zbiera treść instrukcji SQL wykonywanych przez połączenia z puli
+    w obrębie bloku 'with' (diagnostyka planów zapytań, testy).
+    """
+    pool = get_pool(db_path)
+    statements = []
+    pool.set_trace_callback(statements.append)
+    try:
+        yield statements
+    finally:
+        pool.set_trace_callback(None)
+
+def close_all_pools():
+    """Zamyka wszystkie pule połączeń, np. przy zamykaniu aplikacji."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 class DatabaseManager:
     """Klasa zarządzająca połączeniem z bazą danych SQLite."""
     
-    def __init__(self, db_path=DATABASE_PATH):
-        """Inicjalizacja managera bazy danych."""
+    def __init__(self, db_path=None):
+        """Inicjalizacja managera bazy danych (domyślnie baza z DATABASE_PATH)."""
+        if db_path is None:
+            db_path = DATABASE_PATH
         self.db_path = db_path
+        self.pool = get_pool(db_path)
         self.connection = None
         self.cursor = None
+        self._transaction_depth = 0
     
     def connect(self):
-        """Ustanawia połączenie z bazą danych."""
+        """Wypożycza połączenie z bazą danych z puli."""
+        if self.connection:
+            return True
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            # Włączenie obsługi kluczy obcych
-            self.connection.execute("PRAGMA foreign_keys = ON")
-            # Ustawienie zwracania wierszy jako słowniki
-            self.connection.row_factory = sqlite3.Row
+            self.connection = self.pool.acquire()
             self.cursor = self.connection.cursor()
             logger.debug(f"Połączono z bazą danych: {self.db_path}")
             return True
@@ -31,12 +315,54 @@ class DatabaseManager:
             return False
     
     def disconnect(self):
-        """Zamyka połączenie z bazą danych."""
+        """Zwraca połączenie z bazą danych do puli."""
         if self.connection:
-            self.connection.close()
+            self.cursor.close()
+            self.pool.release(self.connection)
             self.connection = None
             self.cursor = None
-            logger.debug("Zamknięto połączenie z bazą danych")
+            logger.debug("Zwrócono połączenie z bazą danych do puli")
+    
+    def _commit(self):
+        """Zatwierdza zmiany, chyba że trwa jawna transakcja - wtedy zatwierdzi ją transaction()."""
+        if not self._transaction_depth:
+            self.connection.commit()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Otwiera transakcję (unit of work) - wszystkie zapisy w bloku 'with'
+        są zatwierdzane jednym commitem na jego końcu albo wycofywane w całości,
+        jeśli w bloku wystąpi wyjątek. Wewnątrz transakcji błędy SQL są
+        propagowane zamiast zwracania False/None.
+        Zagnieżdżone wywołania korzystają z punktów zapisu (SAVEPOINT).
+        """
+        if not self.connection and not self.connect():
+            raise sqlite3.OperationalError("Brak połączenia z bazą danych")
+        
+        savepoint = f"sp_{self._transaction_depth}" if self._transaction_depth else None
+        if savepoint:
+            self.connection.execute(f"SAVEPOINT {savepoint}")
+        else:
+            self.connection.execute("BEGIN IMMEDIATE")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if savepoint:
+                self.connection.execute(f"ROLLBACK TO {savepoint}")
+                self.connection.execute(f"RELEASE {savepoint}")
+            else:
+                self.connection.rollback()
+                logger.debug("Wycofano transakcję")
+            raise
+        else:
+            self._transaction_depth -= 1
+            if savepoint:
+                self.connection.execute(f"RELEASE {savepoint}")
+            else:
+                self.connection.commit()
     
     def execute_query(self, query, params=None):
         """Wykonuje zapytanie SQL bez zwracania wyników."""
@@ -48,10 +374,12 @@ class DatabaseManager:
                 self.cursor.execute(query, params)
             else:
                 self.cursor.execute(query)
-            self.connection.commit()
+            self._commit()
             return True
         except sqlite3.Error as e:
             logger.error(f"Błąd wykonania zapytania: {e}\nZapytanie: {query}\nParametry: {params}")
+            if self._transaction_depth:
+                raise
             return False
     
     def fetch_one(self, query, params=None):
@@ -64,7 +392,8 @@ class DatabaseManager:
                 self.cursor.execute(query, params)
             else:
                 self.cursor.execute(query)
-            return dict(self.cursor.fetchone()) if self.cursor.fetchone() else None
+            row = self.cursor.fetchone()
+            return dict(row) if row else None
         except sqlite3.Error as e:
             logger.error(f"Błąd podczas pobierania wiersza: {e}\nZapytanie: {query}\nParametry: {params}")
             return None
@@ -86,23 +415,111 @@ class DatabaseManager:
             logger.error(f"Błąd podczas pobierania wierszy: {e}\nZapytanie: {query}\nParametry: {params}")
             return []
     
+    def fetch_models(self, model, query, params=None, defer_missing=False):
+        """
+        Wykonuje zapytanie i zwraca listę obiektów modelu tworzonych
+        bezpośrednio z krotek kursora (model.row_factory), bez słowników.
+        Przy defer_missing=True kolumny spoza zapytania są doczytywane leniwie.
+        """
+        if not self.connection:
+            self.connect()
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params or ())
+            cursor.row_factory = model.row_factory(cursor.description, defer_missing)
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania obiektów: {e}\nZapytanie: {query}\nParametry: {params}")
+            return []
+        finally:
+            cursor.close()
+    
+    def fetch_model(self, model, query, params=None):
+        """Wykonuje zapytanie i zwraca jeden obiekt modelu lub None."""
+        if not self.connection:
+            self.connect()
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params or ())
+            cursor.row_factory = model.row_factory(cursor.description)
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania obiektu: {e}\nZapytanie: {query}\nParametry: {params}")
+            return None
+        finally:
+            cursor.close()
+    
+    def iter_rows(self, query, params=None, batch_size=DB_FETCH_BATCH_SIZE):
+        """
+        Generator zwracający wiersze (sqlite3.Row) partiami pobieranymi przez
+        fetchmany, więc pamięć zależy od batch_size, a nie od liczby wierszy.
+        Używa osobnego kursora - w trakcie iteracji można wykonywać inne zapytania.
+        """
+        if not self.connection:
+            self.connect()
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas strumieniowego pobierania wierszy: {e}\nZapytanie: {query}\nParametry: {params}")
+        finally:
+            cursor.close()
+    
+    def fetch_column(self, query, params=None, batch_size=DB_FETCH_BATCH_SIZE):
+        """Wykonuje zapytanie i zwraca listę wartości pierwszej kolumny."""
+        if not self.connection:
+            self.connect()
+        
+        try:
+            self.cursor.execute(query, params or ())
+            values = []
+            while True:
+                rows = self.cursor.fetchmany(batch_size)
+                if not rows:
+                    return values
+                values.extend(row[0] for row in rows)
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania kolumny: {e}\nZapytanie: {query}\nParametry: {params}")
+            return []
+    
+    def fetch_scalar(self, query, params=None, default=None):
+        """Wykonuje zapytanie i zwraca pierwszą kolumnę pierwszego wiersza (lub default)."""
+        if not self.connection:
+            self.connect()
+        
+        try:
+            self.cursor.execute(query, params or ())
+            row = self.cursor.fetchone()
+            return row[0] if row is not None else default
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas pobierania wartości: {e}\nZapytanie: {query}\nParametry: {params}")
+            return default
+    
     def insert(self, table, data):
         """Wstawia dane do tabeli i zwraca ID wstawionego wiersza."""
         if not self.connection:
             self.connect()
         
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['?' for _ in data])
         values = tuple(data.values())
         
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        query = compile_statement('insert', table, tuple(data))
         
         try:
             self.cursor.execute(query, values)
-            self.connection.commit()
+            self._commit()
             return self.cursor.lastrowid
         except sqlite3.Error as e:
             logger.error(f"Błąd podczas wstawiania danych: {e}\nTabela: {table}\nDane: {data}")
+            if self._transaction_depth:
+                raise
             return None
     
     def update(self, table, data, condition, condition_params):
@@ -110,17 +527,85 @@ class DatabaseManager:
         if not self.connection:
             self.connect()
         
-        set_clause = ', '.join([f"{column} = ?" for column in data.keys()])
         values = tuple(data.values()) + condition_params
         
-        query = f"UPDATE {table} SET {set_clause} WHERE {condition}"
+        query = compile_statement('update', table, tuple(data), condition)
         
         try:
             self.cursor.execute(query, values)
-            self.connection.commit()
+            self._commit()
             return self.cursor.rowcount
         except sqlite3.Error as e:
             logger.error(f"Błąd podczas aktualizacji danych: {e}\nTabela: {table}\nDane: {data}\nWarunek: {condition}")
+            if self._transaction_depth:
+                raise
+            return 0
+    
+    def insert_many(self, table, rows):
+        """
+        Wstawia wiele wierszy jednym wywołaniem executemany i jednym commitem.
+        Wiersze to słowniki o tych samych kluczach. Zwraca liczbę wstawionych wierszy.
+        """
+        if not self.connection:
+            self.connect()
+        
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        
+        keys = tuple(first.keys())
+        query = compile_statement('insert', table, keys)
+        
+        def values():
+            yield tuple(first[key] for key in keys)
+            for row in rows:
+                yield tuple(row[key] for key in keys)
+        
+        try:
+            self.cursor.executemany(query, values())
+            self._commit()
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas wstawiania wielu wierszy: {e}\nTabela: {table}")
+            if self._transaction_depth:
+                raise
+            self.connection.rollback()
+            return 0
+    
+    def update_many(self, table, rows, key_columns=('id',)):
+        """
+        Aktualizuje wiele wierszy jednym wywołaniem executemany i jednym commitem.
+        Każdy wiersz to słownik zawierający kolumny klucza (domyślnie 'id')
+        oraz kolumny do ustawienia. Zwraca liczbę zmienionych wierszy.
+        """
+        if not self.connection:
+            self.connect()
+        
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        
+        set_columns = tuple(key for key in first.keys() if key not in key_columns)
+        condition = ' AND '.join([f"{column} = ?" for column in key_columns])
+        order = set_columns + tuple(key_columns)
+        query = compile_statement('update', table, set_columns, condition)
+        
+        def values():
+            yield tuple(first[key] for key in order)
+            for row in rows:
+                yield tuple(row[key] for key in order)
+        
+        try:
+            self.cursor.executemany(query, values())
+            self._commit()
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas aktualizacji wielu wierszy: {e}\nTabela: {table}")
+            if self._transaction_depth:
+                raise
+            self.connection.rollback()
             return 0
     
     def delete(self, table, condition, params):
@@ -128,14 +613,16 @@ class DatabaseManager:
         if not self.connection:
             self.connect()
         
-        query = f"DELETE FROM {table} WHERE {condition}"
+        query = compile_statement('delete', table, condition=condition)
         
         try:
             self.cursor.execute(query, params)
-            self.connection.commit()
+            self._commit()
             return self.cursor.rowcount
         except sqlite3.Error as e:
             logger.error(f"Błąd podczas usuwania danych: {e}\nTabela: {table}\nWarunek: {condition}")
+            if self._transaction_depth:
+                raise
             return 0
     
     def __enter__(self):
@@ -144,5 +631,5 @@ class DatabaseManager:
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        """Zamyka połączenie po wyjściu z bloku 'with'."""
+        """Zwraca połączenie do puli po wyjściu z bloku 'with'."""
         self.disconnect()
\ No newline at end of file
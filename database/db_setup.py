@@ -1,180 +1,39 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import sqlite3
 import logging
-from config import DATABASE_PATH
+import threading
+from config import (DATABASE_PATH, DB_CHECKPOINT_INTERVAL, DB_CHECKPOINT_MODE,
+                    DB_OPTIMIZE_INTERVAL)
+from database.db_manager import DatabaseManager, apply_storage_profile, get_pool
+from database.migrations import apply_migrations, migrate
 
 logger = logging.getLogger(__name__)
 
-def ensure_db_exists():
+def ensure_db_exists(db_path=DATABASE_PATH):
     """Sprawdza czy baza danych istnieje, jeśli nie - tworzy ją."""
-    db_dir = os.path.dirname(DATABASE_PATH)
-    if not os.path.exists(db_dir):
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir)
     
-    if not os.path.exists(DATABASE_PATH):
-        logger.info(f"Tworzenie nowej bazy danych w: {DATABASE_PATH}")
-        create_database()
+    if not os.path.exists(db_path):
+        logger.info(f"Tworzenie nowej bazy danych w: {db_path}")
+        create_database(db_path)
     else:
-        logger.info(f"Baza danych już istnieje w: {DATABASE_PATH}")
-        # Opcjonalnie można dodać sprawdzenie wersji schematu i migrację
+        logger.info(f"Baza danych już istnieje w: {db_path}")
+        # Przy aktualnym schemacie kosztuje to jeden odczyt PRAGMA user_version
+        migrate(db_path)
         
-def create_database():
+def create_database(db_path=DATABASE_PATH):
     """Tworzy bazę danych i wszystkie potrzebne tabele."""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Tabela użytkowników
-        cursor.execute('''
-        CREATE TABLE users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            is_admin BOOLEAN DEFAULT 0,
-            is_active BOOLEAN DEFAULT 1
-        )
-        ''')
-        
-        # Tabela języków
-        cursor.execute('''
-        CREATE TABLE languages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT 1
-        )
-        ''')
-        
-        # Tabela kategorii lekcji
-        cursor.execute('''
-        CREATE TABLE lesson_categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            language_id INTEGER,
-            FOREIGN KEY (language_id) REFERENCES languages (id)
-        )
-        ''')
-        
-        # Tabela lekcji
-        cursor.execute('''
-        CREATE TABLE lessons (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            category_id INTEGER,
-            language_id INTEGER,
-            difficulty INTEGER DEFAULT 1,
-            xp_reward INTEGER DEFAULT 10,
-            order_index INTEGER,
-            is_active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (category_id) REFERENCES lesson_categories (id),
-            FOREIGN KEY (language_id) REFERENCES languages (id)
-        )
-        ''')
-        
-        # Tabela ćwiczeń
-        cursor.execute('''
-        CREATE TABLE exercises (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            lesson_id INTEGER,
-            type TEXT NOT NULL,
-            content TEXT NOT NULL,
-            correct_answer TEXT NOT NULL,
-            options TEXT,
-            hint TEXT,
-            image_path TEXT,
-            audio_path TEXT,
-            xp_reward INTEGER DEFAULT 5,
-            order_index INTEGER,
-            FOREIGN KEY (lesson_id) REFERENCES lessons (id)
-        )
-        ''')
-        
-        # Tabela postępów użytkownika
-        cursor.execute('''
-        CREATE TABLE user_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            lesson_id INTEGER,
-            completed BOOLEAN DEFAULT 0,
-            completion_date TIMESTAMP,
-            score INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (lesson_id) REFERENCES lessons (id)
-        )
-        ''')
-        
-        # Tabela odznak/osiągnięć
-        cursor.execute('''
-        CREATE TABLE achievements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            image_path TEXT,
-            requirement TEXT NOT NULL,
-            xp_reward INTEGER DEFAULT 20
-        )
-        ''')
-        
-        # Tabela osiągnięć użytkownika
-        cursor.execute('''
-        CREATE TABLE user_achievements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            achievement_id INTEGER,
-            earned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (achievement_id) REFERENCES achievements (id)
-        )
-        ''')
-        
-        # Tabela streaka (codziennej aktywności)
-        cursor.execute('''
-        CREATE TABLE user_streaks (
-            user_id INTEGER PRIMARY KEY,
-            current_streak INTEGER DEFAULT 0,
-            max_streak INTEGER DEFAULT 0,
-            last_activity_date TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Tabela statystyk użytkownika
-        cursor.execute('''
-        CREATE TABLE user_stats (
-            user_id INTEGER PRIMARY KEY,
-            total_xp INTEGER DEFAULT 0,
-            lessons_completed INTEGER DEFAULT 0,
-            exercises_completed INTEGER DEFAULT 0,
-            correct_answers INTEGER DEFAULT 0,
-            incorrect_answers INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Tabela ulubionych słówek użytkownika
-        cursor.execute('''
-        CREATE TABLE user_favorites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            word TEXT NOT NULL,
-            translation TEXT NOT NULL,
-            language_id INTEGER,
-            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (language_id) REFERENCES languages (id)
-        )
-        ''')
-        
-        # Zapisanie zmian
-        conn.commit()
+        conn = sqlite3.connect(db_path)
+        # Tryb WAL jest zapisywany w pliku bazy, więc ustawiamy go od razu
+        apply_storage_profile(conn)
+        # Utworzenie tabel i indeksów przez migracje schematu
+        apply_migrations(conn)
         logger.info("Utworzono bazę danych z wszystkimi tabelami")
         
         # Dodanie podstawowych danych
@@ -212,6 +71,9 @@ def insert_initial_data(conn):
         'INSERT INTO users (username, email, password_hash, salt, is_admin) VALUES (?, ?, ?, ?, ?)',
         ('admin', 'admin@lingualeap.com', password_hash, salt, 1)
     )
+    admin_id = cursor.lastrowid
+    cursor.execute('INSERT INTO user_stats (user_id) VALUES (?)', (admin_id,))
+    cursor.execute('INSERT INTO user_streaks (user_id) VALUES (?)', (admin_id,))
     
     # Dodanie podstawowych osiągnięć
     achievements = [
@@ -226,4 +88,132 @@ def insert_initial_data(conn):
     )
     
     conn.commit()
-    logger.info("Dodano podstawowe dane do bazy")
\ No newline at end of file
+    logger.info("Dodano podstawowe dane do bazy")
+
+class CheckpointScheduler:
+    """
+    Wątek w tle, który okresowo wykonuje checkpoint dziennika WAL
+    oraz PRAGMA optimize, zbierając metryki czasu trwania i rozmiaru WAL,
+    a przy okazji zamyka bezczynne połączenia z puli.
+    """
+    
+    def __init__(self, db_path=DATABASE_PATH, interval=DB_CHECKPOINT_INTERVAL,
+                 mode=DB_CHECKPOINT_MODE, optimize_interval=DB_OPTIMIZE_INTERVAL):
+        """Inicjalizacja harmonogramu."""
+        self.db_path = db_path
+        self.interval = interval
+        self.mode = mode
+        self.optimize_interval = optimize_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_optimize = time.monotonic()
+        self._lock = threading.Lock()
+        self._metrics = {
+            'checkpoints': 0,
+            'last_checkpoint_duration': 0.0,
+            'total_checkpoint_duration': 0.0,
+            'last_wal_size_before': 0,
+            'last_wal_size_after': 0,
+            'last_pages_checkpointed': 0,
+            'last_busy': False,
+            'optimizations': 0,
+            'last_optimize_duration': 0.0,
+            'evicted_connections': 0,
+            'errors': 0,
+        }
+    
+    def wal_size(self):
+        """Zwraca rozmiar pliku WAL w bajtach (0, gdy plik nie istnieje)."""
+        try:
+            return os.path.getsize(f"{self.db_path}-wal")
+        except OSError:
+            return 0
+    
+    def checkpoint(self):
+        """Wykonuje checkpoint WAL i zapisuje jego metryki."""
+        size_before = self.wal_size()
+        start = time.perf_counter()
+        try:
+            with DatabaseManager(self.db_path) as db:
+                busy, _, checkpointed = db.connection.execute(
+                    f"PRAGMA wal_checkpoint({self.mode})"
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas checkpointu WAL: {e}")
+            with self._lock:
+                self._metrics['errors'] += 1
+            return False
+        duration = time.perf_counter() - start
+        
+        with self._lock:
+            self._metrics['checkpoints'] += 1
+            self._metrics['last_checkpoint_duration'] = duration
+            self._metrics['total_checkpoint_duration'] += duration
+            self._metrics['last_wal_size_before'] = size_before
+            self._metrics['last_wal_size_after'] = self.wal_size()
+            self._metrics['last_pages_checkpointed'] = max(checkpointed, 0)
+            self._metrics['last_busy'] = bool(busy)
+        logger.debug(f"Checkpoint WAL: {checkpointed} stron w {duration * 1000:.1f} ms")
+        return True
+    
+    def optimize(self):
+        """Uruchamia PRAGMA optimize (aktualizacja statystyk planera)."""
+        start = time.perf_counter()
+        try:
+            with DatabaseManager(self.db_path) as db:
+                db.connection.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            logger.error(f"Błąd podczas PRAGMA optimize: {e}")
+            with self._lock:
+                self._metrics['errors'] += 1
+            return False
+        
+        with self._lock:
+            self._metrics['optimizations'] += 1
+            self._metrics['last_optimize_duration'] = time.perf_counter() - start
+        self._last_optimize = time.monotonic()
+        return True
+    
+    def evict_idle_connections(self):
+        """Zamyka połączenia puli bezczynne zbyt długo lub należące do zakończonych wątków."""
+        evicted = get_pool(self.db_path).evict_idle()
+        with self._lock:
+            self._metrics['evicted_connections'] += evicted
+        return evicted
+    
+    def run_once(self):
+        """Wykonuje jeden cykl utrzymania bazy."""
+        self.checkpoint()
+        self.evict_idle_connections()
+        if time.monotonic() - self._last_optimize >= self.optimize_interval:
+            self.optimize()
+    
+    def _run(self):
+        """Pętla wątku w tle."""
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+    
+    def start(self):
+        """Uruchamia wątek harmonogramu."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-checkpoint", daemon=True)
+        self._thread.start()
+        logger.debug(f"Uruchomiono harmonogram checkpointów WAL co {self.interval} s")
+    
+    def stop(self):
+        """Zatrzymuje wątek i wykonuje końcowy checkpoint oraz optymalizację."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+        self.optimize()
+    
+    def metrics(self):
+        """Zwraca kopię zebranych metryk."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['wal_size'] = self.wal_size()
+        return metrics
\ No newline at end of file
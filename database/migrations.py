@@ -0,0 +1,562 @@
+# -*- coding: utf-8 -*-
+
+import time
+import sqlite3
+import logging
+from config import MIGRATION_BATCH_SIZE
+from database.db_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+class Migration:
+    """
+    Pojedyncza migracja schematu w przód.
+    
+    upgrade(conn) wykonuje się w jednej transakcji (DDL w SQLite jest transakcyjne)
+    razem z podbiciem numeru wersji (PRAGMA user_version), więc nie jest
+    powtarzany po przerwaniu. Opcjonalny backfill(conn) działa po niej - w partiach,
+    z commitem po każdej partii, żeby nie trzymać długo blokady zapisu. Przerwany
+    backfill jest dokańczany przy następnym uruchomieniu (znacznik w tabeli
+    PENDING_BACKFILLS_TABLE), dlatego musi być idempotentny (warunek w backfillu).
+    """
+    
+    def __init__(self, version, description, upgrade, backfill=None):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.backfill = backfill
+    
+    def __repr__(self):
+        return f"Migration({self.version}, {self.description!r})"
+
+MIGRATIONS = []
+
+# Wersje migracji, których backfill jeszcze się nie zakończył
+PENDING_BACKFILLS_TABLE = "schema_pending_backfills"
+
+def migration(version, description, backfill=None):
+    """Dekorator rejestrujący funkcję upgrade jako kolejną migrację."""
+    def register(upgrade):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migracje muszą mieć rosnące numery wersji: {version}")
+        MIGRATIONS.append(Migration(version, description, upgrade, backfill))
+        return upgrade
+    return register
+
+def get_schema_version(conn):
+    """Zwraca wersję schematu zapisaną w PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def add_column(conn, table, column, definition):
+    """Dodaje kolumnę, jeśli jeszcze nie istnieje (idempotentne ALTER TABLE)."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def backfill(conn, table, assignment, condition="1", params=(), key="id",
+             batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Wykonuje UPDATE {table} SET {assignment} WHERE {condition} w partiach po
+    batch_size wierszy (według klucza), zatwierdzając każdą partię osobno.
+    Zwraca liczbę zmienionych wierszy.
+    """
+    last_key = -2 ** 63
+    updated = 0
+    while True:
+        upper = conn.execute(
+            f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?)",
+            (last_key, batch_size)
+        ).fetchone()[0]
+        if upper is None:
+            break
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {assignment} WHERE {key} > ? AND {key} <= ? AND ({condition})",
+                (last_key, upper) + tuple(params)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        updated += cursor.rowcount
+        last_key = upper
+    return updated
+
+def _pending_backfills(conn):
+    """Zwraca wersje migracji z niedokończonym backfillem."""
+    try:
+        return {row[0] for row in conn.execute(f"SELECT version FROM {PENDING_BACKFILLS_TABLE}")}
+    except sqlite3.OperationalError:
+        # Tabela powstaje przy pierwszej migracji z backfillem
+        return set()
+
+def _finish_backfill(conn, migration):
+    """Wykonuje backfill migracji i usuwa jej znacznik."""
+    migration.backfill(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(f"DELETE FROM {PENDING_BACKFILLS_TABLE} WHERE version = ?", (migration.version,))
+    conn.commit()
+
+def _run_migration(conn, migration):
+    """
+    Wykonuje jedną migrację: upgrade, podbicie wersji schematu i (dla migracji
+    z backfillem) znacznik backfillu w jednej transakcji, potem backfill.
+    Zwraca czas trwania w sekundach.
+    """
+    start = time.perf_counter()
+    
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        migration.upgrade(conn)
+        if migration.backfill:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {PENDING_BACKFILLS_TABLE} (version INTEGER PRIMARY KEY)")
+            conn.execute(f"INSERT OR IGNORE INTO {PENDING_BACKFILLS_TABLE} (version) VALUES (?)",
+                         (migration.version,))
+        conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    if migration.backfill:
+        _finish_backfill(conn, migration)
+    return time.perf_counter() - start
+
+def _resume_backfills(conn, migrations):
+    """Dokańcza backfille przerwane przy poprzednim uruchomieniu. Zwraca ich liczbę."""
+    if not any(m.backfill for m in migrations):
+        return 0
+    pending = _pending_backfills(conn)
+    resumed = 0
+    for m in migrations:
+        if m.backfill and m.version in pending:
+            logger.info(f"Dokańczanie backfillu migracji {m.version} ({m.description})")
+            _finish_backfill(conn, m)
+            resumed += 1
+    return resumed
+
+def pending_migrations(conn, migrations=None):
+    """Zwraca migracje, które nie zostały jeszcze zastosowane do bazy."""
+    if migrations is None:
+        migrations = MIGRATIONS
+    version = get_schema_version(conn)
+    return [m for m in migrations if m.version > version]
+
+def apply_migrations(conn, migrations=None):
+    """
+    Stosuje wszystkie oczekujące migracje na podanym połączeniu.
+    Zwraca listę krotek (wersja, opis, czas w sekundach).
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+    _resume_backfills(conn, migrations)
+    report = []
+    for pending in pending_migrations(conn, migrations):
+        duration = _run_migration(conn, pending)
+        report.append((pending.version, pending.description, duration))
+        logger.info(f"Zastosowano migrację {pending.version} ({pending.description}) "
+                    f"w {duration * 1000:.1f} ms")
+    return report
+
+def migrate(db_path=None, dry_run=False, migrations=None):
+    """
+    Doprowadza schemat bazy do najnowszej wersji.
+    
+    Gdy schemat jest aktualny, kosztuje jeden odczyt PRAGMA user_version
+    na połączeniu z puli (i odczyt znaczników, jeśli któraś migracja ma
+    backfill). W trybie dry_run migracje są wykonywane na kopii bazy
+    w pamięci, a wynikiem jest raport czasów bez zmian w pliku.
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+    latest = migrations[-1].version if migrations else 0
+    
+    with DatabaseManager(db_path) as db:
+        if get_schema_version(db.connection) >= latest:
+            if not dry_run:
+                _resume_backfills(db.connection, migrations)
+            return []
+        
+        if not dry_run:
+            return apply_migrations(db.connection, migrations)
+        
+        copy = sqlite3.connect(":memory:")
+        try:
+            db.connection.backup(copy)
+            return apply_migrations(copy, migrations)
+        finally:
+            copy.close()
+
+@migration(1, "schemat bazowy")
+def create_base_schema(conn):
+    """Tworzy tabele aplikacji (bazy sprzed migracji mają je już utworzone)."""
+    cursor = conn.cursor()
+    
+    # Tabela użytkowników
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        salt TEXT NOT NULL,
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP,
+        is_admin BOOLEAN DEFAULT 0,
+        is_active BOOLEAN DEFAULT 1
+    )
+    ''')
+    
+    # Tabela języków
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS languages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT 1
+    )
+    ''')
+    
+    # Tabela kategorii lekcji
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lesson_categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        language_id INTEGER,
+        FOREIGN KEY (language_id) REFERENCES languages (id)
+    )
+    ''')
+    
+    # Tabela lekcji
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lessons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        category_id INTEGER,
+        language_id INTEGER,
+        difficulty INTEGER DEFAULT 1,
+        xp_reward INTEGER DEFAULT 10,
+        order_index INTEGER,
+        is_active BOOLEAN DEFAULT 1,
+        FOREIGN KEY (category_id) REFERENCES lesson_categories (id),
+        FOREIGN KEY (language_id) REFERENCES languages (id)
+    )
+    ''')
+    
+    # Tabela ćwiczeń
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exercises (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lesson_id INTEGER,
+        type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        options TEXT,
+        hint TEXT,
+        image_path TEXT,
+        audio_path TEXT,
+        xp_reward INTEGER DEFAULT 5,
+        order_index INTEGER,
+        FOREIGN KEY (lesson_id) REFERENCES lessons (id)
+    )
+    ''')
+    
+    # Tabela postępów użytkownika
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        lesson_id INTEGER,
+        completed BOOLEAN DEFAULT 0,
+        completion_date TIMESTAMP,
+        score INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (lesson_id) REFERENCES lessons (id)
+    )
+    ''')
+    
+    # Tabela odznak/osiągnięć
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS achievements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        image_path TEXT,
+        requirement TEXT NOT NULL,
+        xp_reward INTEGER DEFAULT 20
+    )
+    ''')
+    
+    # Tabela osiągnięć użytkownika
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_achievements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        achievement_id INTEGER,
+        earned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (achievement_id) REFERENCES achievements (id)
+    )
+    ''')
+    
+    # Tabela streaka (codziennej aktywności)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_streaks (
+        user_id INTEGER PRIMARY KEY,
+        current_streak INTEGER DEFAULT 0,
+        max_streak INTEGER DEFAULT 0,
+        last_activity_date TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    
+    # Tabela statystyk użytkownika
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_xp INTEGER DEFAULT 0,
+        lessons_completed INTEGER DEFAULT 0,
+        exercises_completed INTEGER DEFAULT 0,
+        correct_answers INTEGER DEFAULT 0,
+        incorrect_answers INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    
+    # Tabela ulubionych słówek użytkownika
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_favorites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        word TEXT NOT NULL,
+        translation TEXT NOT NULL,
+        language_id INTEGER,
+        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (language_id) REFERENCES languages (id)
+    )
+    ''')
+
+# Indeksy dopasowane do warunków WHERE i ORDER BY zapytań z database/models.py,
+# dzięki czemu wyszukiwania nie skanują całych tabel ani nie sortują w tymczasowym B-drzewie
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_languages_active ON languages (is_active)',
+    'CREATE INDEX IF NOT EXISTS idx_lessons_language ON lessons (language_id, is_active, order_index)',
+    'CREATE INDEX IF NOT EXISTS idx_lessons_category ON lessons (category_id, is_active, order_index)',
+    'CREATE INDEX IF NOT EXISTS idx_exercises_lesson ON exercises (lesson_id, order_index)',
+    'CREATE INDEX IF NOT EXISTS idx_user_progress_user_lesson ON user_progress (user_id, lesson_id, completed)',
+    'CREATE INDEX IF NOT EXISTS idx_user_achievements_user ON user_achievements (user_id, achievement_id)',
+    'CREATE INDEX IF NOT EXISTS idx_user_favorites_user_language ON user_favorites (user_id, language_id)',
+]
+
+@migration(2, "indeksy dla wyszukiwań modeli")
+def create_lookup_indexes(conn):
+    """Tworzy indeksy z listy INDEXES."""
+    for statement in INDEXES:
+        conn.execute(statement)
+
+# Tabele katalogu treści - każda zmiana podbija licznik content_version,
+# dzięki czemu cache katalogu wykrywa edycje także z innych procesów
+CONTENT_TABLES = ('languages', 'lesson_categories', 'lessons', 'exercises')
+
+@migration(3, "licznik wersji treści")
+def create_content_version(conn):
+    """Tworzy tabelę app_meta z licznikiem content_version i wyzwalacze go podbijające."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('content_version', 0)")
+    for table in CONTENT_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_content_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE app_meta SET value = value + 1 WHERE key = 'content_version';
+            END
+            ''')
+
+@migration(4, "sesje użytkowników")
+def create_sessions(conn):
+    """Tworzy tabelę sesji z indeksem po dacie wygaśnięcia (dla zbiorczego usuwania)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        client TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+
+@migration(5, "limity prób logowania")
+def create_login_attempts(conn):
+    """Tworzy tabelę z zapisanym stanem ogranicznika prób logowania."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS login_attempts (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+@migration(6, "indeks aktywnych streaków")
+def create_active_streaks_index(conn):
+    """
+    Częściowy indeks po dacie ostatniej aktywności, obejmujący tylko niezerowe
+    streaki - zbiorcze zerowanie wygasłych streaków nie skanuje całej tabeli.
+    """
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_streaks_active
+    ON user_streaks (last_activity_date) WHERE current_streak > 0
+    ''')
+
+@migration(7, "dziennik odpowiedzi")
+def create_answer_events(conn):
+    """
+    Tworzy tabelę answer_events - dziennik pojedynczych odpowiedzi, do którego
+    można tylko dopisywać (wyzwalacze blokują UPDATE i DELETE).
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS answer_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        answer TEXT,
+        correct BOOLEAN NOT NULL,
+        duration_ms INTEGER,
+        answered_at TIMESTAMP NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (exercise_id) REFERENCES exercises (id)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_answer_events_user ON answer_events (user_id, answered_at)')
+    for event in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_answer_events_no_{event.lower()}
+        BEFORE {event} ON answer_events
+        BEGIN
+            SELECT RAISE(ABORT, 'answer_events jest tylko do dopisywania');
+        END
+        ''')
+
+@migration(8, "stan powtórek (spaced repetition)")
+def create_review_items(conn):
+    """Tworzy tabelę stanu powtórek z indeksem (user_id, due_at) dla budowania sesji."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_items (
+        user_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        ease REAL NOT NULL DEFAULT 2.5,
+        interval_days REAL NOT NULL DEFAULT 0,
+        repetitions INTEGER NOT NULL DEFAULT 0,
+        lapses INTEGER NOT NULL DEFAULT 0,
+        due_at TIMESTAMP NOT NULL,
+        last_review TIMESTAMP,
+        PRIMARY KEY (user_id, exercise_id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (exercise_id) REFERENCES exercises (id)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_review_items_due ON review_items (user_id, due_at)')
+
+# Indeksy pełnotekstowe (FTS5): tabela indeksu -> (tabela źródłowa, kolumny).
+# Tokenizer zamienia wielkie litery na małe i usuwa znaki diakrytyczne;
+# litery, których nie rozkłada (np. ł, ß, ё), są zamieniane przez SEARCH_FOLDING
+# w wyzwalaczach, a przy wyszukiwaniu - w zapytaniu.
+SEARCH_INDEXES = {
+    'lessons_fts': ('lessons', ('title', 'description')),
+    'exercises_fts': ('exercises', ('content', 'correct_answer', 'hint')),
+    'favorites_fts': ('user_favorites', ('word', 'translation')),
+}
+SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+SEARCH_FOLDING = {
+    'ł': 'l', 'Ł': 'L',
+    'ß': 'ss', 'ẞ': 'SS',
+    'œ': 'oe', 'Œ': 'OE',
+    'æ': 'ae', 'Æ': 'AE',
+    'ё': 'е', 'Ё': 'Е',
+}
+
+# Klucz app_meta wyłączający wyzwalacze AFTER INSERT (indeks wyszukiwania, content_version)
+# - ustawiany i usuwany w tej samej transakcji importu, który indeksuje wiersze zbiorczo
+# i podbija content_version raz na porcję (wyzwalacz dla każdego wiersza jest kilkukrotnie wolniejszy)
+SEARCH_DEFERRED_KEY = 'search_deferred'
+
+def fold_sql(expression):
+    """Zwraca wyrażenie SQL zamieniające litery z SEARCH_FOLDING w podanym wyrażeniu."""
+    for source, target in SEARCH_FOLDING.items():
+        expression = f"replace({expression}, '{source}', '{target}')"
+    return expression
+
+def search_index_sql(index, condition="1", columns=None):
+    """
+    Zwraca INSERT ... SELECT indeksujący wiersze tabeli źródłowej spełniające
+    warunek. columns ogranicza kolumny czytane ze źródła (brakujące są indeksowane jako NULL).
+    """
+    table, indexed = SEARCH_INDEXES[index]
+    folded = ', '.join(fold_sql(column) if columns is None or column in columns else 'NULL'
+                       for column in indexed)
+    return f"INSERT INTO {index} (rowid, {', '.join(indexed)}) SELECT id, {folded} FROM {table} WHERE {condition}"
+
+@migration(9, "indeksy pełnotekstowe (FTS5)")
+def create_search_indexes(conn):
+    """
+    Tworzy bezzawartościowe tabele FTS5 (content='') dla lekcji, ćwiczeń
+    i ulubionych słów, wyzwalacze utrzymujące je w zgodzie z tabelami
+    źródłowymi oraz indeksuje istniejące wiersze.
+    """
+    for index, (table, columns) in SEARCH_INDEXES.items():
+        column_list = ', '.join(columns)
+        conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            {column_list}, content='', tokenize='{SEARCH_TOKENIZER}', prefix='2 3'
+        )
+        ''')
+        new_values = ', '.join(fold_sql(f"new.{column}") for column in columns)
+        old_values = ', '.join(fold_sql(f"old.{column}") for column in columns)
+        insert = f"INSERT INTO {index} (rowid, {column_list}) VALUES (new.id, {new_values});"
+        # Z tabeli bez zawartości usuwa się, podając wartości, które zostały zaindeksowane
+        delete = f"INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_insert AFTER INSERT ON {table}
+        WHEN NOT EXISTS (SELECT 1 FROM app_meta WHERE key = '{SEARCH_DEFERRED_KEY}')
+        BEGIN {insert} END
+        ''')
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{index}_delete AFTER DELETE ON {table} BEGIN {delete} END")
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_update AFTER UPDATE OF {column_list} ON {table}
+        BEGIN {delete} {insert} END
+        ''')
+        # Stare bazy mogą nie mieć wszystkich kolumn
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        conn.execute(search_index_sql(index, columns=existing))
+
+@migration(10, "licznik wersji treści pomijany przy imporcie")
+def defer_content_version_on_import(conn):
+    """
+    Odtwarza wyzwalacze AFTER INSERT podbijające content_version z warunkiem
+    na SEARCH_DEFERRED_KEY - import podbija licznik raz na porcję, a nie na wiersz.
+    """
+    for table in CONTENT_TABLES:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_insert_content_version")
+        conn.execute(f'''
+        CREATE TRIGGER trg_{table}_insert_content_version
+        AFTER INSERT ON {table}
+        WHEN NOT EXISTS (SELECT 1 FROM app_meta WHERE key = '{SEARCH_DEFERRED_KEY}')
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'content_version';
+        END
+        ''')
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
\ No newline at end of file
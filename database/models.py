@@ -1,37 +1,229 @@
 # -*- coding: utf-8 -*-
 
 from datetime import datetime
-from database.db_manager import DatabaseManager
+from config import DB_IN_CLAUSE_BATCH_SIZE
+from database.db_manager import DatabaseManager, compile_statement
+from database.cache import catalog_cache
+
+# (klasa modelu, nazwy kolumn zapytania, odraczanie) -> funkcja row_factory
+_row_factories = {}
+
+class Query:
+    """
+    Prosty builder zapytań SELECT dla modelu, z projekcją kolumn.
+    
+    Kolumny pominięte w only() są odroczone - obiekt pobierze je z bazy
+    jednym zapytaniem przy pierwszym odczycie którejkolwiek z nich.
+    Zapytania z Query nie przechodzą przez cache katalogu.
+    """
+    
+    def __init__(self, model):
+        self.model = model
+        self._columns = None
+        self._conditions = []
+        self._params = []
+        self._order_by = None
+        self._limit = None
+    
+    def only(self, *columns):
+        """Ogranicza pobierane kolumny (id jest dołączane zawsze)."""
+        unknown = [column for column in columns if column not in self.model.columns]
+        if unknown:
+            raise ValueError(f"Nieznane kolumny modelu {self.model.__name__}: {', '.join(unknown)}")
+        self._columns = ('id',) + tuple(column for column in columns if column != 'id')
+        return self
+    
+    def where(self, condition, *params):
+        """Dodaje warunek (łączony przez AND) z parametrami."""
+        self._conditions.append(condition)
+        self._params.extend(params)
+        return self
+    
+    def order_by(self, clause):
+        """Ustawia sortowanie wyników."""
+        self._order_by = clause
+        return self
+    
+    def limit(self, count):
+        """Ogranicza liczbę wyników."""
+        self._limit = count
+        return self
+    
+    def _condition(self):
+        """Zwraca połączone warunki WHERE lub None."""
+        return ' AND '.join(f"({condition})" for condition in self._conditions) or None
+    
+    def sql(self):
+        """Zwraca treść zapytania SELECT."""
+        query = compile_statement('select', self.model.table_name, self._columns or (), self._condition())
+        if self._order_by:
+            query += f" ORDER BY {self._order_by}"
+        if self._limit is not None:
+            query += f" LIMIT {int(self._limit)}"
+        return query
+    
+    def all(self):
+        """Zwraca listę obiektów modelu."""
+        with DatabaseManager() as db:
+            return db.fetch_models(self.model, self.sql(), tuple(self._params),
+                                   defer_missing=self._columns is not None)
+    
+    def first(self):
+        """Zwraca pierwszy obiekt lub None."""
+        self._limit = 1
+        results = self.all()
+        return results[0] if results else None
+    
+    def count(self):
+        """Zwraca liczbę pasujących wierszy."""
+        query = compile_statement('select', self.model.table_name, ('COUNT(*)',), self._condition())
+        with DatabaseManager() as db:
+            return db.fetch_scalar(query, tuple(self._params), default=0)
 
 class BaseModel:
-    """Bazowa klasa dla wszystkich modeli danych."""
+    """
+    Bazowa klasa dla wszystkich modeli danych.
     
+    Modele deklarują swoje kolumny w columns i trzymają je w __slots__,
+    więc obiekty nie mają słownika __dict__. Wiersze z bazy są zamieniane na obiekty bezpośrednio
+    z krotek kursora przez row_factory, bez pośredniego słownika na wiersz.
+    Modele z cached = True (katalog treści) są czytane przez catalog_cache.
+    Obiekty pobrane z projekcją (query().only(...)) mają nieustawione sloty
+    odroczonych kolumn - __getattr__ doczytuje je przy pierwszym dostępie.
+    """
+    
+    __slots__ = ()
+    columns = ()
     table_name = None
+    cached = False
     
     def __init__(self, data=None):
-        """Inicjalizuje model z opcjonalnymi danymi."""
+        """Inicjalizuje model z opcjonalnymi danymi (nieznane klucze są pomijane)."""
         if data:
+            columns = self.columns
             for key, value in data.items():
-                setattr(self, key, value)
+                if key in columns:
+                    setattr(self, key, value)
+    
+    def __getattr__(self, name):
+        """Doczytuje odroczone kolumny (wywoływane tylko dla nieustawionych slotów)."""
+        cls = type(self)
+        if name == 'id' or name not in cls.columns:
+            raise AttributeError(f"'{cls.__name__}' object has no attribute '{name}'")
+        
+        try:
+            id = cls.id.__get__(self)
+        except AttributeError:
+            id = None
+        if id is None:
+            raise AttributeError(f"'{cls.__name__}' object has no attribute '{name}'")
+        
+        self._load_deferred(id)
+        return getattr(cls, name).__get__(self)
+    
+    def _load_deferred(self, id):
+        """Pobiera jednym zapytaniem wszystkie nieustawione kolumny obiektu."""
+        cls = type(self)
+        missing = []
+        for name in cls.columns:
+            try:
+                getattr(cls, name).__get__(self)
+            except AttributeError:
+                missing.append(name)
+        
+        query = compile_statement('select', cls.table_name, tuple(missing), "id = ?")
+        with DatabaseManager() as db:
+            data = db.fetch_one(query, (id,))
+        if data is None:
+            data = cls().to_dict()
+        for name in missing:
+            setattr(self, name, data[name])
+    
+    @classmethod
+    def query(cls):
+        """Zwraca builder zapytań (Query) dla tego modelu."""
+        return Query(cls)
+    
+    @classmethod
+    def row_factory(cls, description, defer_missing=False):
+        """
+        Zwraca funkcję row_factory dla kursora, która tworzy obiekty modelu
+        z krotek wiersza. Mapowanie kolumn na sloty jest liczone raz dla
+        danego zestawu kolumn; brakujące kolumny dostają wartości domyślne,
+        a przy defer_missing=True pozostają odroczone do pierwszego odczytu.
+        """
+        names = tuple(column[0] for column in description)
+        factory = _row_factories.get((cls, names, defer_missing))
+        if factory is not None:
+            return factory
+        
+        columns = cls.columns
+        template = cls()
+        setters = [(index, getattr(cls, name).__set__)
+                   for index, name in enumerate(names) if name in columns]
+        defaults = [] if defer_missing else [
+            (getattr(cls, name).__set__, getattr(template, name))
+            for name in columns if name not in names
+        ]
+        new = cls.__new__
+        
+        def factory(cursor, row):
+            obj = new(cls)
+            for index, setter in setters:
+                setter(obj, row[index])
+            for setter, value in defaults:
+                setter(obj, value)
+            return obj
+        
+        _row_factories[(cls, names, defer_missing)] = factory
+        return factory
+    
+    def to_dict(self):
+        """Zwraca dane obiektu jako słownik."""
+        return {name: getattr(self, name) for name in self.columns}
+    
+    @classmethod
+    def _fetch_model(cls, query, params=None):
+        """Pobiera jeden obiekt modelu z bazy."""
+        with DatabaseManager() as db:
+            return db.fetch_model(cls, query, params)
+    
+    @classmethod
+    def _fetch_models(cls, query, params=None):
+        """Pobiera listę obiektów modelu z bazy."""
+        with DatabaseManager() as db:
+            return db.fetch_models(cls, query, params)
+    
+    @classmethod
+    def _load(cls, key, loader):
+        """Pobiera dane przez cache katalogu (dla modeli z cached = True) lub bezpośrednio."""
+        if cls.cached:
+            return catalog_cache.load((cls,) + key, loader)
+        return loader()
     
     @classmethod
     def get_by_id(cls, id):
         """Pobiera obiekt po jego ID."""
-        with DatabaseManager() as db:
-            data = db.fetch_one(f"SELECT * FROM {cls.table_name} WHERE id = ?", (id,))
-            return cls(data) if data else None
+        query = compile_statement('select', cls.table_name, condition="id = ?")
+        if cls.cached:
+            # Klucz (klasa, id) jest jednocześnie kluczem mapy tożsamości
+            return catalog_cache.load((cls, id), lambda: cls._fetch_model(query, (id,)))
+        return cls._fetch_model(query, (id,))
     
     @classmethod
     def get_all(cls):
         """Pobiera wszystkie obiekty danego typu."""
-        with DatabaseManager() as db:
-            data = db.fetch_all(f"SELECT * FROM {cls.table_name}")
-            return [cls(item) for item in data]
+        return cls._load(('all',), lambda: cls._fetch_models(compile_statement('select', cls.table_name)))
 
 class User(BaseModel):
     """Model reprezentujący użytkownika w systemie."""
     
     table_name = "users"
+    columns = ('id', 'username', 'email', 'password_hash', 'salt',
+               'registration_date', 'last_login', 'is_admin', 'is_active')
+    __slots__ = columns
+    # Kolumny profilu - bez hasha hasła i salt
+    profile_columns = ('username', 'email', 'registration_date', 'last_login', 'is_admin', 'is_active')
     
     def __init__(self, data=None):
         """Inicjalizuje użytkownika z danych z bazy."""
@@ -47,18 +239,27 @@ class User(BaseModel):
         super().__init__(data)
     
     @classmethod
-    def get_by_username(cls, username):
-        """Pobiera użytkownika po nazwie użytkownika."""
-        with DatabaseManager() as db:
-            data = db.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
-            return cls(data) if data else None
+    def get_by_username(cls, username, with_credentials=False):
+        """
+        Pobiera użytkownika po nazwie użytkownika. Hash hasła i salt są
+        pobierane tylko przy with_credentials=True (logowanie) - w pozostałych
+        przypadkach są odroczone do pierwszego odczytu.
+        """
+        query = cls.query().where("username = ?", username)
+        if not with_credentials:
+            query.only(*cls.profile_columns)
+        return query.first()
     
     @classmethod
-    def get_by_email(cls, email):
-        """Pobiera użytkownika po adresie email."""
-        with DatabaseManager() as db:
-            data = db.fetch_one("SELECT * FROM users WHERE email = ?", (email,))
-            return cls(data) if data else None
+    def get_by_email(cls, email, with_credentials=False):
+        """
+        Pobiera użytkownika po adresie email (hash hasła i salt - jak
+        w get_by_username - tylko przy with_credentials=True).
+        """
+        query = cls.query().where("email = ?", email)
+        if not with_credentials:
+            query.only(*cls.profile_columns)
+        return query.first()
     
     def save(self):
         """Zapisuje lub aktualizuje użytkownika w bazie danych."""
@@ -108,6 +309,9 @@ class Language(BaseModel):
     """Model reprezentujący język w systemie."""
     
     table_name = "languages"
+    cached = True
+    columns = ('id', 'code', 'name', 'is_active')
+    __slots__ = columns
     
     def __init__(self, data=None):
         """Inicjalizuje język z danych z bazy."""
@@ -120,16 +324,16 @@ class Language(BaseModel):
     @classmethod
     def get_by_code(cls, code):
         """Pobiera język po jego kodzie."""
-        with DatabaseManager() as db:
-            data = db.fetch_one("SELECT * FROM languages WHERE code = ?", (code,))
-            return cls(data) if data else None
+        return cls._load(('code', code), lambda: cls._fetch_model(
+            "SELECT * FROM languages WHERE code = ?", (code,)
+        ))
     
     @classmethod
     def get_active(cls):
         """Pobiera wszystkie aktywne języki."""
-        with DatabaseManager() as db:
-            data = db.fetch_all("SELECT * FROM languages WHERE is_active = 1")
-            return [cls(item) for item in data]
+        return cls._load(('active',), lambda: cls._fetch_models(
+            "SELECT * FROM languages WHERE is_active = 1"
+        ))
     
     def save(self):
         """Zapisuje lub aktualizuje język w bazie danych."""
@@ -141,6 +345,7 @@ class Language(BaseModel):
                     'is_active': self.is_active
                 }
                 db.update('languages', data, 'id = ?', (self.id,))
+                catalog_cache.invalidate()
                 return self.id
             else:
                 data = {
@@ -149,12 +354,20 @@ class Language(BaseModel):
                     'is_active': self.is_active
                 }
                 self.id = db.insert('languages', data)
+                catalog_cache.invalidate()
                 return self.id
 
 class Lesson(BaseModel):
     """Model reprezentujący lekcję w systemie."""
     
     table_name = "lessons"
+    cached = True
+    columns = ('id', 'title', 'description', 'category_id', 'language_id',
+               'difficulty', 'xp_reward', 'order_index', 'is_active')
+    # _exercises przechowuje ćwiczenia wczytane z wyprzedzeniem (prefetch_exercises)
+    __slots__ = columns + ('_exercises',)
+    # Kolumny wyświetlane na liście lekcji
+    list_columns = ('title', 'language_id', 'difficulty', 'xp_reward', 'order_index')
     
     def __init__(self, data=None):
         """Inicjalizuje lekcję z danych z bazy."""
@@ -170,27 +383,64 @@ class Lesson(BaseModel):
         super().__init__(data)
     
     @classmethod
-    def get_by_language(cls, language_id):
-        """Pobiera wszystkie lekcje dla danego języka."""
-        with DatabaseManager() as db:
-            data = db.fetch_all(
-                "SELECT * FROM lessons WHERE language_id = ? AND is_active = 1 ORDER BY order_index",
-                (language_id,)
-            )
-            return [cls(item) for item in data]
+    def get_by_language(cls, language_id, with_exercises=False):
+        """
+        Pobiera wszystkie lekcje dla danego języka.
+        Przy with_exercises=True od razu wczytuje ich ćwiczenia (prefetch_exercises).
+        """
+        lessons = cls._load(('language', language_id), lambda: cls._fetch_models(
+            "SELECT * FROM lessons WHERE language_id = ? AND is_active = 1 ORDER BY order_index",
+            (language_id,)
+        ))
+        if with_exercises:
+            cls.prefetch_exercises(lessons)
+        return lessons
+    
+    @classmethod
+    def get_list(cls, language_id):
+        """
+        Pobiera aktywne lekcje języka tylko z kolumnami wyświetlanymi na liście
+        lekcji (list_columns) - pozostałe są odroczone do pierwszego odczytu.
+        """
+        return (cls.query().only(*cls.list_columns)
+                .where("language_id = ? AND is_active = 1", language_id)
+                .order_by("order_index").all())
+    
+    @classmethod
+    def prefetch_exercises(cls, lessons):
+        """
+        Wczytuje ćwiczenia dla wielu lekcji zapytaniem WHERE lesson_id IN (...)
+        zamiast osobnego zapytania na każdą lekcję i przypisuje je lekcjom,
+        z których korzysta potem get_exercises().
+        """
+        pending = [lesson for lesson in lessons if not lesson.has_prefetched_exercises()]
+        if pending:
+            from database.models import Exercise
+            grouped = Exercise.get_by_lessons([lesson.id for lesson in pending])
+            for lesson in pending:
+                lesson._exercises = grouped.get(lesson.id, [])
+        return lessons
+    
+    def has_prefetched_exercises(self):
+        """Sprawdza czy ćwiczenia lekcji zostały już wczytane."""
+        try:
+            Lesson._exercises.__get__(self)
+            return True
+        except AttributeError:
+            return False
     
     @classmethod
     def get_by_category(cls, category_id):
         """Pobiera wszystkie lekcje dla danej kategorii."""
-        with DatabaseManager() as db:
-            data = db.fetch_all(
-                "SELECT * FROM lessons WHERE category_id = ? AND is_active = 1 ORDER BY order_index",
-                (category_id,)
-            )
-            return [cls(item) for item in data]
+        return cls._load(('category', category_id), lambda: cls._fetch_models(
+            "SELECT * FROM lessons WHERE category_id = ? AND is_active = 1 ORDER BY order_index",
+            (category_id,)
+        ))
     
     def get_exercises(self):
         """Pobiera wszystkie ćwiczenia dla tej lekcji."""
+        if self.has_prefetched_exercises():
+            return list(self._exercises)
         from database.models import Exercise
         return Exercise.get_by_lesson(self.id)
     
@@ -209,6 +459,7 @@ class Lesson(BaseModel):
                     'is_active': self.is_active
                 }
                 db.update('lessons', data, 'id = ?', (self.id,))
+                catalog_cache.invalidate()
                 return self.id
             else:
                 data = {
@@ -222,12 +473,17 @@ class Lesson(BaseModel):
                     'is_active': self.is_active
                 }
                 self.id = db.insert('lessons', data)
+                catalog_cache.invalidate()
                 return self.id
 
 class Exercise(BaseModel):
     """Model reprezentujący ćwiczenie w systemie."""
     
     table_name = "exercises"
+    cached = True
+    columns = ('id', 'lesson_id', 'type', 'content', 'correct_answer', 'options',
+               'hint', 'image_path', 'audio_path', 'xp_reward', 'order_index')
+    __slots__ = columns
     
     def __init__(self, data=None):
         """Inicjalizuje ćwiczenie z danych z bazy."""
@@ -247,12 +503,68 @@ class Exercise(BaseModel):
     @classmethod
     def get_by_lesson(cls, lesson_id):
         """Pobiera wszystkie ćwiczenia dla danej lekcji."""
+        return cls._load(('lesson', lesson_id), lambda: cls._fetch_models(
+            "SELECT * FROM exercises WHERE lesson_id = ? ORDER BY order_index",
+            (lesson_id,)
+        ))
+    
+    @classmethod
+    def get_outline(cls, lesson_id):
+        """
+        Pobiera ćwiczenia lekcji tylko z typem i kolejnością (podgląd lekcji) -
+        treść, odpowiedzi, podpowiedzi i ścieżki mediów są odroczone.
+        """
+        return (cls.query().only('lesson_id', 'type', 'order_index')
+                .where("lesson_id = ?", lesson_id).order_by("order_index").all())
+    
+    @classmethod
+    def count_by_lessons(cls, lesson_ids):
+        """
+        Zwraca słownik lesson_id -> liczba ćwiczeń. Liczenie korzysta tylko
+        z indeksu (lesson_id, order_index), po DB_IN_CLAUSE_BATCH_SIZE lekcji.
+        """
+        lesson_ids = list(dict.fromkeys(lesson_ids))
+        counts = dict.fromkeys(lesson_ids, 0)
         with DatabaseManager() as db:
-            data = db.fetch_all(
-                "SELECT * FROM exercises WHERE lesson_id = ? ORDER BY order_index",
-                (lesson_id,)
-            )
-            return [cls(item) for item in data]
+            for start in range(0, len(lesson_ids), DB_IN_CLAUSE_BATCH_SIZE):
+                batch = lesson_ids[start:start + DB_IN_CLAUSE_BATCH_SIZE]
+                placeholders = ', '.join(['?' for _ in batch])
+                for row in db.fetch_all(
+                    f"SELECT lesson_id, COUNT(*) AS n FROM exercises WHERE lesson_id IN ({placeholders}) "
+                    "GROUP BY lesson_id",
+                    tuple(batch)
+                ):
+                    counts[row['lesson_id']] = row['n']
+        return counts
+    
+    @classmethod
+    def get_by_lessons(cls, lesson_ids):
+        """
+        Pobiera ćwiczenia wielu lekcji naraz i zwraca słownik lesson_id -> lista ćwiczeń.
+        Lekcje obecne w cache nie są odpytywane; pozostałe są wczytywane
+        zapytaniami IN (...) po DB_IN_CLAUSE_BATCH_SIZE identyfikatorów.
+        """
+        grouped = {}
+        missing = []
+        for lesson_id in dict.fromkeys(lesson_ids):
+            exercises = catalog_cache.get((cls, 'lesson', lesson_id))
+            if exercises is None:
+                missing.append(lesson_id)
+            else:
+                grouped[lesson_id] = list(exercises)
+        
+        for start in range(0, len(missing), DB_IN_CLAUSE_BATCH_SIZE):
+            batch = missing[start:start + DB_IN_CLAUSE_BATCH_SIZE]
+            placeholders = ', '.join(['?' for _ in batch])
+            fetched = {lesson_id: [] for lesson_id in batch}
+            for exercise in cls._fetch_models(
+                f"SELECT * FROM exercises WHERE lesson_id IN ({placeholders}) ORDER BY lesson_id, order_index",
+                tuple(batch)
+            ):
+                fetched[exercise.lesson_id].append(exercise)
+            for lesson_id, exercises in fetched.items():
+                grouped[lesson_id] = catalog_cache.store((cls, 'lesson', lesson_id), exercises)
+        return grouped
     
     def save(self):
         """Zapisuje lub aktualizuje ćwiczenie w bazie danych."""
@@ -271,6 +583,7 @@ class Exercise(BaseModel):
                     'order_index': self.order_index
                 }
                 db.update('exercises', data, 'id = ?', (self.id,))
+                catalog_cache.invalidate()
                 return self.id
             else:
                 data = {
@@ -286,4 +599,5 @@ class Exercise(BaseModel):
                     'order_index': self.order_index
                 }
                 self.id = db.insert('exercises', data)
+                catalog_cache.invalidate()
                 return self.id
\ No newline at end of file
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from config import DB_QUERY_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class QueryExecutor:
+    """
+    Pula wątków wykonująca zapytania do bazy (i inne kosztowne operacje)
+    poza wątkiem interfejsu.
+    
+    Każde wywołanie submit() zwraca osobny obiekt Future. Identyczne
+    zapytania (ten sam key) wykonywane w tym samym czasie są łączone
+    w jedno zadanie, którego wynik trafia do wszystkich oczekujących.
+    Zadania można grupować (np. per zakładka) i anulować całą grupą -
+    anulowany Future nie dostaje wyniku, a zadanie, na które nikt już nie
+    czeka, jest usuwane z kolejki, jeśli jeszcze się nie rozpoczęło.
+    """
+    
+    def __init__(self, max_workers=DB_QUERY_WORKERS):
+        """Inicjalizacja puli wątków."""
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-query")
+        self._lock = threading.Lock()
+        # klucz -> (klucz, zadanie, lista Future oczekujących na wynik)
+        self._inflight = {}
+        # grupa -> zbiór Future należących do grupy
+        self._groups = {}
+        self._stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'cancelled': 0,
+            'completed': 0,
+            'failed': 0,
+        }
+    
+    def submit(self, fn, *args, key=None, group=None, **kwargs):
+        """
+        Zleca wykonanie fn(*args, **kwargs) w puli i zwraca Future z wynikiem.
+        Zadania o tym samym kluczu, które jeszcze trwają, są współdzielone.
+        """
+        handle = Future()
+        with self._lock:
+            self._stats['submitted'] += 1
+            entry = self._inflight.get(key) if key is not None else None
+            is_new = entry is None
+            if is_new:
+                job = self._executor.submit(fn, *args, **kwargs)
+                entry = (key, job, [handle])
+                if key is not None:
+                    self._inflight[key] = entry
+            else:
+                self._stats['coalesced'] += 1
+                entry[2].append(handle)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(handle)
+        
+        if is_new:
+            entry[1].add_done_callback(lambda finished: self._deliver(entry, finished))
+        handle.add_done_callback(lambda done: self._handle_done(done, entry, group))
+        return handle
+    
+    def _forget(self, entry):
+        """Usuwa zadanie z mapy zadań w toku (wywoływane pod blokadą)."""
+        key = entry[0]
+        if key is not None and self._inflight.get(key) is entry:
+            del self._inflight[key]
+    
+    def _deliver(self, entry, job):
+        """Przekazuje wynik zadania do wszystkich oczekujących Future."""
+        with self._lock:
+            self._forget(entry)
+            handles = list(entry[2])
+        
+        if job.cancelled():
+            for handle in handles:
+                handle.cancel()
+            return
+        
+        error = job.exception()
+        with self._lock:
+            self._stats['failed' if error else 'completed'] += 1
+        if error:
+            logger.error(f"Błąd zadania w tle: {error}")
+        for handle in handles:
+            try:
+                if error:
+                    handle.set_exception(error)
+                else:
+                    handle.set_result(job.result())
+            except InvalidStateError:
+                # Oczekujący zdążył anulować swoje żądanie
+                pass
+    
+    def _handle_done(self, handle, entry, group):
+        """Porządkuje grupy i anuluje zadanie, na które nikt już nie czeka."""
+        with self._lock:
+            if group is not None:
+                members = self._groups.get(group)
+                if members is not None:
+                    members.discard(handle)
+                    if not members:
+                        del self._groups[group]
+            if not handle.cancelled():
+                return
+            self._stats['cancelled'] += 1
+            abandoned = all(h.cancelled() for h in entry[2])
+            if abandoned:
+                # Nowe żądania o tym kluczu nie mogą dołączyć do porzuconego zadania
+                self._forget(entry)
+        if abandoned:
+            entry[1].cancel()
+    
+    def cancel_group(self, group):
+        """Anuluje wszystkie oczekujące żądania z grupy. Zwraca liczbę anulowanych."""
+        with self._lock:
+            handles = list(self._groups.get(group, ()))
+        return sum(1 for handle in handles if handle.cancel())
+    
+    def stats(self):
+        """Zwraca liczniki wykonawcy."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+        return stats
+    
+    def shutdown(self, wait=True):
+        """Zatrzymuje pulę wątków, anulując zadania oczekujące w kolejce."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+query_executor = QueryExecutor()
@@ -8,7 +8,16 @@ from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt
 
 from ui.login_window import LoginWindow
-from database.db_setup import ensure_db_exists
+from database.db_setup import ensure_db_exists, CheckpointScheduler
+from database.db_manager import close_all_pools
+from database.query_executor import query_executor
+from auth.login_throttle import login_throttle
+from auth.password_utils import start_calibration
+from content.lesson_manager import lesson_manager
+from progress.user_stats import stats_engine
+from progress.achievements import achievement_engine
+from progress.streak_manager import streak_manager
+from progress.spaced_repetition import review_scheduler
 from utils.logger import setup_logger
 from config import APP_NAME, APP_VERSION, LOGO_PATH
 
@@ -25,6 +34,27 @@ def main():
         logging.critical(f"Błąd podczas inicjalizacji bazy danych: {e}")
         sys.exit(1)
     
+    # Przywrócenie limitów prób logowania z poprzedniego uruchomienia
+    login_throttle.load()
+    
+    # Dobranie kosztu haszowania haseł do tej maszyny (w tle, okno logowania nie czeka)
+    start_calibration()
+    
+    # Okresowy checkpoint WAL i optymalizacja bazy w tle
+    checkpoint_scheduler = CheckpointScheduler()
+    checkpoint_scheduler.start()
+    
+    # Zapis statystyk postępu w tle (bufor write-behind) i przyznawanie osiągnięć po zapisie
+    stats_engine.add_listener(achievement_engine.on_stats_change)
+    stats_engine.start()
+    
+    # Zerowanie wygasłych streaków przy starcie i raz na dobę
+    streak_manager.add_listener(achievement_engine.on_stats_change)
+    streak_manager.start()
+    
+    # Rozkładanie zaległych powtórek na kolejne dni przy starcie i raz na dobę
+    review_scheduler.start()
+    
     # Inicjalizacja aplikacji Qt
     app = QApplication(sys.argv)
     app.setApplicationName(APP_NAME)
@@ -39,7 +69,18 @@ def main():
     login_window.show()
     
     # Uruchomienie pętli zdarzeń aplikacji
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    
+    # Zatrzymanie zadań w tle i zamknięcie połączeń z bazą danych
+    query_executor.shutdown()
+    login_throttle.persist()
+    stats_engine.stop()
+    streak_manager.stop()
+    review_scheduler.stop()
+    lesson_manager.close()
+    checkpoint_scheduler.stop()
+    close_all_pools()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+import re
+import logging
+import operator
+import threading
+from database.db_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Metryki dostępne w warunkach osiągnięć i ich wyrażenia SQL
+# (u - users, s - user_stats, k - user_streaks)
+METRICS = {
+    'total_xp': 'COALESCE(s.total_xp, 0)',
+    'lessons_completed': 'COALESCE(s.lessons_completed, 0)',
+    'exercises_completed': 'COALESCE(s.exercises_completed, 0)',
+    'correct_answers': 'COALESCE(s.correct_answers, 0)',
+    'incorrect_answers': 'COALESCE(s.incorrect_answers, 0)',
+    'current_streak': 'COALESCE(k.current_streak, 0)',
+    'max_streak': 'COALESCE(k.max_streak, 0)',
+    'languages_started': '''(SELECT COUNT(DISTINCT l.language_id)
+                             FROM user_progress p JOIN lessons l ON l.id = p.lesson_id
+                             WHERE p.user_id = u.id)''',
+}
+
+METRICS_FROM = '''users u
+    LEFT JOIN user_stats s ON s.user_id = u.id
+    LEFT JOIN user_streaks k ON k.user_id = u.id'''
+
+OPERATORS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+_TOKEN = re.compile(r'\s*(?:(?P<number>\d+)|(?P<name>[a-z_]+)|(?P<op>>=|<=|==|!=|>|<|=))', re.IGNORECASE)
+
+class RuleError(ValueError):
+    """Niepoprawny warunek osiągnięcia."""
+
+class Comparison:
+    """Porównanie metryki ze stałą, np. lessons_completed >= 1."""
+    
+    __slots__ = ('metric', 'op', 'symbol', 'value')
+    
+    def __init__(self, metric, symbol, value):
+        """Inicjalizacja porównania."""
+        self.metric = metric
+        self.symbol = '=' if symbol == '==' else symbol
+        self.op = OPERATORS[symbol]
+        self.value = value
+    
+    def __call__(self, metrics):
+        """Sprawdza porównanie dla słownika metryk."""
+        return self.op(metrics[self.metric], self.value)
+    
+    def sql(self):
+        """Zwraca porównanie jako wyrażenie SQL."""
+        return f"{METRICS[self.metric]} {self.symbol} {self.value}"
+
+class Rule:
+    """
+    Skompilowany warunek osiągnięcia: alternatywa (or) koniunkcji (and) porównań.
+    Obiekt jest wywoływalny - przyjmuje słownik metryk użytkownika.
+    """
+    
+    __slots__ = ('achievement_id', 'requirement', 'bit', 'clauses', 'metrics')
+    
+    def __init__(self, achievement_id, requirement, bit, clauses):
+        """Inicjalizacja reguły."""
+        self.achievement_id = achievement_id
+        self.requirement = requirement
+        self.bit = bit
+        self.clauses = clauses
+        self.metrics = frozenset(c.metric for clause in clauses for c in clause)
+    
+    def __call__(self, metrics):
+        """Sprawdza, czy metryki użytkownika spełniają warunek."""
+        return any(all(comparison(metrics) for comparison in clause) for clause in self.clauses)
+    
+    def sql(self):
+        """Zwraca warunek jako wyrażenie SQL (do przyznawania zbiorczego)."""
+        return ' OR '.join('(' + ' AND '.join(c.sql() for c in clause) + ')' for clause in self.clauses)
+
+def parse_requirement(requirement):
+    """
+    Parsuje warunek w postaci 'metryka operator liczba', łączonych przez
+    'and' / 'or' (and wiąże silniej). Dozwolone są tylko metryki z METRICS
+    i liczby całkowite - tekst nigdy nie jest wykonywany jako kod.
+    Zwraca listę koniunkcji (list obiektów Comparison) albo zgłasza RuleError.
+    """
+    tokens = []
+    position = 0
+    text = requirement.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise RuleError(f"Nieoczekiwany znak w warunku '{requirement}' (pozycja {position})")
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind).lower() if kind == 'name' else match.group(kind)))
+    
+    clauses = [[]]
+    index = 0
+    while True:
+        if index + 3 > len(tokens):
+            raise RuleError(f"Niepełny warunek '{requirement}'")
+        (kind_metric, metric), (kind_op, symbol), (kind_value, value) = tokens[index:index + 3]
+        if kind_metric != 'name' or metric not in METRICS:
+            raise RuleError(f"Nieznana metryka '{metric}' w warunku '{requirement}'")
+        if kind_op != 'op' or kind_value != 'number':
+            raise RuleError(f"Oczekiwano 'metryka operator liczba' w warunku '{requirement}'")
+        clauses[-1].append(Comparison(metric, symbol, int(value)))
+        index += 3
+        
+        if index == len(tokens):
+            return clauses
+        kind, word = tokens[index]
+        if kind != 'name' or word not in ('and', 'or'):
+            raise RuleError(f"Oczekiwano 'and' lub 'or' w warunku '{requirement}'")
+        if word == 'or':
+            clauses.append([])
+        index += 1
+
+class AchievementEngine:
+    """
+    Przyznawanie osiągnięć na podstawie skompilowanych warunków.
+    
+    Warunki z tabeli achievements są parsowane raz i indeksowane po metrykach,
+    od których zależą. Po zmianie statystyk użytkownika sprawdzane są tylko
+    warunki zależne od zmienionych metryk, a już zdobyte osiągnięcia są
+    pomijane na podstawie maski bitowej użytkownika (bit = numer reguły).
+    award_all() przyznaje osiągnięcia wszystkim użytkownikom zapytaniami
+    INSERT ... SELECT - jednym na regułę, w jednej transakcji.
+    """
+    
+    def __init__(self):
+        """Inicjalizacja silnika (reguły są wczytywane przy pierwszym użyciu)."""
+        self._rules = None
+        self._by_id = {}
+        self._by_metric = {}
+        self._earned = {}
+        self._lock = threading.RLock()
+    
+    def load(self, rows=None):
+        """
+        Kompiluje reguły z wierszy (achievement_id, requirement) - domyślnie
+        z tabeli achievements. Niepoprawne warunki są pomijane z ostrzeżeniem.
+        Zwraca liczbę skompilowanych reguł.
+        """
+        if rows is None:
+            with DatabaseManager() as db:
+                rows = [(row['id'], row['requirement'])
+                        for row in db.fetch_all("SELECT id, requirement FROM achievements ORDER BY id")]
+        
+        rules = []
+        for achievement_id, requirement in rows:
+            try:
+                clauses = parse_requirement(requirement)
+            except RuleError as e:
+                logger.warning(f"Pominięto osiągnięcie {achievement_id}: {e}")
+                continue
+            rules.append(Rule(achievement_id, requirement, len(rules), clauses))
+        
+        by_metric = {}
+        for rule in rules:
+            for metric in rule.metrics:
+                by_metric.setdefault(metric, []).append(rule)
+        
+        with self._lock:
+            self._rules = rules
+            self._by_id = {rule.achievement_id: rule for rule in rules}
+            self._by_metric = by_metric
+            self._earned.clear()
+        logger.debug(f"Skompilowano {len(rules)} reguł osiągnięć")
+        return len(rules)
+    
+    def rules(self):
+        """Zwraca listę skompilowanych reguł."""
+        if self._rules is None:
+            self.load()
+        return list(self._rules)
+    
+    def user_metrics(self, user_id):
+        """Pobiera wszystkie metryki użytkownika jednym zapytaniem."""
+        columns = ', '.join(f"{expression} AS {name}" for name, expression in METRICS.items())
+        with DatabaseManager() as db:
+            row = db.fetch_one(f"SELECT {columns} FROM {METRICS_FROM} WHERE u.id = ?", (user_id,))
+        return dict(row) if row else None
+    
+    def _earned_mask(self, user_id):
+        """Zwraca maskę bitową zdobytych osiągnięć (wczytywaną raz na użytkownika)."""
+        with self._lock:
+            mask = self._earned.get(user_id)
+        if mask is not None:
+            return mask
+        
+        with DatabaseManager() as db:
+            earned = db.fetch_column("SELECT achievement_id FROM user_achievements WHERE user_id = ?", (user_id,))
+        mask = 0
+        for achievement_id in earned:
+            rule = self._by_id.get(achievement_id)
+            if rule is not None:
+                mask |= 1 << rule.bit
+        with self._lock:
+            self._earned[user_id] = mask
+        return mask
+    
+    def on_stats_change(self, user_id, changed):
+        """
+        Sprawdza reguły zależne od zmienionych metryk (changed) i przyznaje
+        spełnione osiągnięcia. Zwraca listę ID nowo zdobytych osiągnięć.
+        """
+        if self._rules is None:
+            self.load()
+        
+        mask = self._earned_mask(user_id)
+        candidates = {}
+        for metric in changed:
+            for rule in self._by_metric.get(metric, ()):
+                if not mask >> rule.bit & 1:
+                    candidates[rule.bit] = rule
+        if not candidates:
+            return []
+        
+        metrics = self.user_metrics(user_id)
+        if metrics is None:
+            return []
+        earned = [rule for rule in candidates.values() if rule(metrics)]
+        if not earned:
+            return []
+        
+        try:
+            with DatabaseManager() as db:
+                with db.transaction():
+                    db.cursor.executemany('''
+                        INSERT INTO user_achievements (user_id, achievement_id)
+                        SELECT ?, ? WHERE NOT EXISTS (
+                            SELECT 1 FROM user_achievements WHERE user_id = ? AND achievement_id = ?
+                        )
+                    ''', [(user_id, rule.achievement_id, user_id, rule.achievement_id) for rule in earned])
+        except Exception as e:
+            logger.error(f"Błąd podczas przyznawania osiągnięć użytkownikowi {user_id}: {e}")
+            return []
+        
+        with self._lock:
+            for rule in earned:
+                self._earned[user_id] = self._earned.get(user_id, 0) | 1 << rule.bit
+        logger.info(f"Użytkownik {user_id} zdobył osiągnięcia: {[rule.achievement_id for rule in earned]}")
+        return [rule.achievement_id for rule in earned]
+    
+    def award_all(self):
+        """
+        Przyznaje osiągnięcia wszystkim użytkownikom spełniającym warunki
+        (jedno INSERT ... SELECT na regułę, całość w jednej transakcji).
+        Zwraca liczbę przyznanych osiągnięć.
+        """
+        awarded = 0
+        with DatabaseManager() as db:
+            with db.transaction():
+                for rule in self.rules():
+                    db.cursor.execute(f'''
+                        INSERT INTO user_achievements (user_id, achievement_id)
+                        SELECT u.id, ? FROM {METRICS_FROM}
+                        WHERE ({rule.sql()})
+                          AND NOT EXISTS (
+                              SELECT 1 FROM user_achievements ua
+                              WHERE ua.user_id = u.id AND ua.achievement_id = ?
+                          )
+                    ''', (rule.achievement_id, rule.achievement_id))
+                    awarded += db.cursor.rowcount
+        
+        with self._lock:
+            self._earned.clear()
+        logger.info(f"Przyznano zbiorczo {awarded} osiągnięć")
+        return awarded
+    
+    def forget(self, user_id):
+        """Usuwa maskę zdobytych osiągnięć użytkownika z pamięci (np. po wylogowaniu)."""
+        with self._lock:
+            self._earned.pop(user_id, None)
+
+achievement_engine = AchievementEngine()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from database.db_manager import DatabaseManager
+from config import (REVIEW_SESSION_SIZE, REVIEW_HEAP_SIZE, REVIEW_PRELOAD_HOURS,
+                    REVIEW_FLUSH_SIZE, REVIEW_DAILY_LIMIT, REVIEW_RESCHEDULE_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+# Terminy powtórek są zapisywane jako tekst UTC - porządek tekstowy jest porządkiem czasowym
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+def _to_db(moment):
+    """Zamienia datę ze strefą czasową na tekst UTC zapisywany w bazie."""
+    return moment.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+def _from_db(value):
+    """Zamienia tekst UTC z bazy na datę ze strefą czasową."""
+    if not value:
+        return None
+    return datetime.strptime(value[:19], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+class ReviewState:
+    """Stan powtórek jednego ćwiczenia użytkownika (parametry SM-2)."""
+    
+    __slots__ = ('ease', 'interval', 'repetitions', 'lapses', 'due_at', 'last_review')
+    
+    def __init__(self, ease=INITIAL_EASE, interval=0.0, repetitions=0, lapses=0, due_at=None, last_review=None):
+        """Inicjalizacja stanu (nowy element jest do powtórki od razu)."""
+        self.ease = ease
+        self.interval = interval
+        self.repetitions = repetitions
+        self.lapses = lapses
+        self.due_at = due_at
+        self.last_review = last_review
+
+def sm2(state, quality, now):
+    """
+    Wylicza nowy stan elementu algorytmem SM-2 dla oceny quality (0-5).
+    Ocena poniżej 3 oznacza pomyłkę - powtórki zaczynają się od nowa.
+    """
+    quality = max(0, min(5, quality))
+    if quality < 3:
+        repetitions = 0
+        interval = 1.0
+        lapses = state.lapses + 1
+    else:
+        repetitions = state.repetitions + 1
+        lapses = state.lapses
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = round(state.interval * state.ease, 2)
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ReviewState(ease, interval, repetitions, lapses, now + timedelta(days=interval), now)
+
+def quality_from_answer(correct, duration_ms=None):
+    """Przybliżona ocena SM-2 na podstawie poprawności i czasu odpowiedzi."""
+    if not correct:
+        return 2
+    if duration_ms is None:
+        return 4
+    if duration_ms < 5000:
+        return 5
+    return 4 if duration_ms < 15000 else 3
+
+class ReviewScheduler:
+    """
+    Harmonogram powtórek (spaced repetition, SM-2).
+    
+    Stan każdego ćwiczenia użytkownika jest zapisany w tabeli review_items
+    z indeksem (user_id, due_at). Dla aktywnego użytkownika w pamięci trzymany
+    jest kopiec (min-heap) najbliższych terminów, wczytywany jednym odczytem
+    zakresu indeksu (do REVIEW_HEAP_SIZE elementów z terminem w ciągu
+    REVIEW_PRELOAD_HOURS godzin). Sesja powtórek jest budowana z kopca,
+    a oceny aktualizują go na bieżąco; zmienione stany są zapisywane porcjami.
+    Wątek w tle co REVIEW_RESCHEDULE_INTERVAL sekund rozkłada zaległe powtórki
+    na kolejne dni (reschedule_overdue).
+    """
+    
+    def __init__(self, heap_size=REVIEW_HEAP_SIZE, preload_hours=REVIEW_PRELOAD_HOURS,
+                 flush_size=REVIEW_FLUSH_SIZE, reschedule_interval=REVIEW_RESCHEDULE_INTERVAL):
+        """Inicjalizacja harmonogramu."""
+        self.heap_size = heap_size
+        self.preload = timedelta(hours=preload_hours)
+        self.flush_size = flush_size
+        self.reschedule_interval = reschedule_interval
+        # user_id -> {'states': {exercise_id: ReviewState}, 'heap': [(due_at, exercise_id)],
+        #             'horizon': data, do której wczytano terminy, 'complete': czy wczytano wszystkie}
+        self._users = {}
+        self._dirty = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def _now(self, now=None):
+        """Bieżący (lub podany) czas ze strefą czasową - daty bez strefy są traktowane jako lokalne."""
+        if now is None:
+            return datetime.now(timezone.utc)
+        return now if now.tzinfo is not None else now.astimezone()
+    
+    def _user(self, user_id):
+        """Zwraca stan użytkownika w pamięci (tworząc pusty)."""
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = {'states': {}, 'heap': [], 'horizon': None, 'complete': False}
+        return user
+    
+    def _load(self, user_id, now, limit=0):
+        """
+        Wczytuje najbliższe terminy użytkownika odczytem zakresu indeksu (user_id, due_at)
+        - do heap_size elementów, chyba że sesja (limit) wymaga więcej.
+        Blokada obejmuje odczyt i scalenie - ocena zapisana w międzyczasie
+        nie zostanie nadpisana starszym stanem z bazy.
+        """
+        horizon = now + self.preload
+        size = max(self.heap_size, limit)
+        with self._lock:
+            with DatabaseManager() as db:
+                rows = db.fetch_all('''
+                    SELECT exercise_id, ease, interval_days, repetitions, lapses, due_at, last_review
+                    FROM review_items
+                    WHERE user_id = ? AND due_at <= ?
+                    ORDER BY due_at
+                    LIMIT ?
+                ''', (user_id, _to_db(horizon), size))
+            
+            previous = self._users.get(user_id)
+            # Niezapisane zmiany w pamięci są nowsze niż stan w bazie
+            states = {exercise_id: previous['states'][exercise_id]
+                      for exercise_id in self._dirty.get(user_id, ())} if previous else {}
+            for row in rows:
+                if row['exercise_id'] not in states:
+                    states[row['exercise_id']] = ReviewState(
+                        row['ease'], row['interval_days'], row['repetitions'], row['lapses'],
+                        _from_db(row['due_at']), _from_db(row['last_review'])
+                    )
+            heap = [(state.due_at, exercise_id) for exercise_id, state in states.items()
+                    if state.due_at <= horizon]
+            heapq.heapify(heap)
+            self._users[user_id] = {
+                'states': states,
+                'heap': heap,
+                'horizon': horizon,
+                'complete': len(rows) < size,
+            }
+    
+    def _state(self, user_id, exercise_id):
+        """Zwraca stan elementu z pamięci albo z bazy (odczyt po kluczu głównym)."""
+        with self._lock:
+            state = self._user(user_id)['states'].get(exercise_id)
+        if state is not None:
+            return state
+        
+        with DatabaseManager() as db:
+            row = db.fetch_one('''
+                SELECT ease, interval_days, repetitions, lapses, due_at, last_review
+                FROM review_items WHERE user_id = ? AND exercise_id = ?
+            ''', (user_id, exercise_id))
+        if not row:
+            return ReviewState()
+        return ReviewState(row['ease'], row['interval_days'], row['repetitions'], row['lapses'],
+                           _from_db(row['due_at']), _from_db(row['last_review']))
+    
+    def enroll(self, user_id, exercise_ids, now=None):
+        """Dodaje ćwiczenia do powtórek użytkownika (do powtórki od razu). Zwraca liczbę nowych."""
+        now = self._now(now)
+        # Blokada od zapisu zmian do usunięcia stanu z pamięci - ocena zapisana
+        # w międzyczasie nie zostanie porzucona razem z nim
+        with self._lock:
+            self.flush(user_id)
+            with DatabaseManager() as db:
+                with db.transaction():
+                    db.cursor.executemany(
+                        "INSERT OR IGNORE INTO review_items (user_id, exercise_id, due_at) VALUES (?, ?, ?)",
+                        [(user_id, exercise_id, _to_db(now)) for exercise_id in exercise_ids]
+                    )
+                    added = db.cursor.rowcount
+            # Nowe terminy mogą wypaść przed już wczytanymi - przy następnej sesji wczytujemy od nowa
+            self._discard(user_id)
+        return added
+    
+    def due_items(self, user_id, limit=REVIEW_SESSION_SIZE, now=None):
+        """
+        Zwraca do limit ID ćwiczeń, których termin powtórki minął
+        (najdawniej zaległe pierwsze).
+        """
+        now = self._now(now)
+        with self._lock:
+            user = self._users.get(user_id)
+            reload = user is None or user['horizon'] is None or now > user['horizon']
+        if reload:
+            self._load(user_id, now, limit)
+        
+        with self._lock:
+            user = self._user(user_id)
+            due = self._pop_due(user, limit, now)
+            exhausted = len(due) < limit and not user['complete']
+        if exhausted:
+            # Kopiec wyczerpany, a w bazie mogą być kolejne zaległe elementy
+            self.flush(user_id)
+            self._load(user_id, now, limit)
+            with self._lock:
+                due = self._pop_due(self._user(user_id), limit, now)
+        return due
+    
+    def _pop_due(self, user, limit, now):
+        """
+        Wybiera z kopca do limit elementów z minionym terminem. Wpisy nieaktualne
+        (po ponownej ocenie elementu) są usuwane, a wybrane wracają do kopca -
+        pozostają zaległe aż do oceny.
+        """
+        heap = user['heap']
+        states = user['states']
+        due = []
+        taken = []
+        while heap and len(due) < limit and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            state = states.get(entry[1])
+            if state is None or state.due_at != entry[0] or entry[1] in due:
+                continue
+            due.append(entry[1])
+            taken.append(entry)
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return due
+    
+    def review(self, user_id, exercise_id, quality, now=None):
+        """
+        Zapisuje ocenę powtórki (0-5) i zwraca nowy termin.
+        Zmiana trafia do kopca od razu, a do bazy przy zapisie porcji.
+        """
+        now = self._now(now)
+        state = sm2(self._state(user_id, exercise_id), quality, now)
+        with self._lock:
+            user = self._user(user_id)
+            user['states'][exercise_id] = state
+            if user['horizon'] is not None and state.due_at <= user['horizon']:
+                heapq.heappush(user['heap'], (state.due_at, exercise_id))
+            dirty = self._dirty.setdefault(user_id, set())
+            dirty.add(exercise_id)
+            full = sum(len(items) for items in self._dirty.values()) >= self.flush_size
+        if full:
+            self.flush()
+        return state.due_at
+    
+    def record_answer(self, user_id, exercise_id, correct, duration_ms=None, now=None):
+        """Ocenia powtórkę na podstawie odpowiedzi na ćwiczenie."""
+        return self.review(user_id, exercise_id, quality_from_answer(correct, duration_ms), now)
+    
+    def flush(self, user_id=None):
+        """Zapisuje zmienione stany (wszystkich lub jednego użytkownika) w jednej transakcji."""
+        with self._lock:
+            user_ids = list(self._dirty) if user_id is None else [user_id]
+            rows = []
+            for uid in user_ids:
+                states = self._user(uid)['states']
+                for exercise_id in self._dirty.pop(uid, ()):
+                    state = states[exercise_id]
+                    rows.append((uid, exercise_id, state.ease, state.interval, state.repetitions,
+                                 state.lapses, _to_db(state.due_at), _to_db(state.last_review)))
+        if not rows:
+            return 0
+        
+        try:
+            with DatabaseManager() as db:
+                with db.transaction():
+                    db.cursor.executemany('''
+                        INSERT INTO review_items (user_id, exercise_id, ease, interval_days, repetitions,
+                                                  lapses, due_at, last_review)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (user_id, exercise_id) DO UPDATE SET
+                            ease = excluded.ease,
+                            interval_days = excluded.interval_days,
+                            repetitions = excluded.repetitions,
+                            lapses = excluded.lapses,
+                            due_at = excluded.due_at,
+                            last_review = excluded.last_review
+                    ''', rows)
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisywania stanu powtórek: {e}")
+            with self._lock:
+                for row in rows:
+                    self._dirty.setdefault(row[0], set()).add(row[1])
+            return 0
+        return len(rows)
+    
+    def reschedule_overdue(self, now=None, daily_limit=REVIEW_DAILY_LIMIT):
+        """
+        Rozkłada zaległe powtórki wszystkich użytkowników na kolejne dni: pierwsze
+        daily_limit zaległych (najstarsze) zostają na dziś, kolejne są przesuwane
+        o jeden dzień na każde daily_limit elementów. Jedno zapytanie UPDATE
+        z numerowaniem wierszy w obrębie użytkownika. Zwraca liczbę przesuniętych.
+        """
+        now = self._now(now)
+        # Blokada od zapisu zmian do wyczyszczenia pamięci - oceny z innych wątków
+        # czekają i trafiają już do nowo wczytanych terminów
+        with self._lock:
+            self.flush()
+            with DatabaseManager() as db:
+                with db.transaction():
+                    db.cursor.execute('''
+                        UPDATE review_items
+                        SET due_at = datetime(?, '+' || (ranked.position / ?) || ' days')
+                        FROM (
+                            SELECT user_id, exercise_id,
+                                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY due_at) - 1 AS position
+                            FROM review_items
+                            WHERE due_at <= ?
+                        ) AS ranked
+                        WHERE review_items.user_id = ranked.user_id
+                          AND review_items.exercise_id = ranked.exercise_id
+                          AND ranked.position >= ?
+                    ''', (_to_db(now), daily_limit, _to_db(now), daily_limit))
+                    moved = db.cursor.rowcount
+            for uid in list(self._users):
+                self._discard(uid)
+        logger.info(f"Przesunięto {moved} zaległych powtórek")
+        return moved
+    
+    def forget(self, user_id):
+        """Zapisuje zmiany i usuwa stan użytkownika z pamięci (np. po wylogowaniu)."""
+        with self._lock:
+            self.flush(user_id)
+            self._discard(user_id)
+    
+    def _run(self):
+        """Pętla wątku w tle - pierwsze rozłożenie od razu, kolejne co reschedule_interval sekund."""
+        self.reschedule_overdue()
+        while not self._stop_event.wait(self.reschedule_interval):
+            self.reschedule_overdue()
+    
+    def start(self):
+        """Uruchamia wątek rozkładający zaległe powtórki (start aplikacji na niego nie czeka)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="review-reschedule", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Zatrzymuje wątek i zapisuje zmiany z pamięci."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def _discard(self, user_id):
+        """
+        Usuwa z pamięci wczytane terminy użytkownika. Zmiany, których nie udało
+        się zapisać, zostają - są nowsze niż stan w bazie.
+        """
+        user = self._users.pop(user_id, None)
+        dirty = self._dirty.get(user_id)
+        if user is not None and dirty:
+            self._users[user_id] = {'states': {exercise_id: user['states'][exercise_id] for exercise_id in dirty},
+                                    'heap': [], 'horizon': None, 'complete': False}
+
+review_scheduler = ReviewScheduler()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from database.db_manager import DatabaseManager
+from config import STREAK_RESET_HOURS, STREAK_TIMEZONE, STREAK_ROLLOVER_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Daty aktywności są zapisywane w UTC, dzięki czemu porównania w SQL
+# (zwykłe porównanie tekstu) nie zależą od strefy czasowej ani zmiany czasu
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _to_db(moment):
+    """Zamienia datę ze strefą czasową na tekst UTC zapisywany w bazie."""
+    return moment.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+def _from_db(value):
+    """Zamienia tekst UTC z bazy na datę ze strefą czasową (None dla pustej wartości)."""
+    if not value:
+        return None
+    return datetime.strptime(value[:19], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+class StreakManager:
+    """
+    Streaki codziennej aktywności (tabela user_streaks).
+    
+    Stan aktywnych użytkowników (ostatnia aktywność, bieżący i najdłuższy
+    streak) jest trzymany w pamięci, więc record_activity() to O(1):
+    kolejna aktywność tego samego dnia tylko przesuwa znacznik czasu w pamięci,
+    a zapis do bazy następuje przy zmianie streaka (nowy dzień) lub w flush().
+    Streak rośnie przy aktywności w kolejnym dniu (w strefie STREAK_TIMEZONE)
+    i jest zerowany, gdy od ostatniej aktywności minęło więcej niż
+    STREAK_RESET_HOURS godzin. rollover() zeruje wygasłe streaki wszystkich
+    użytkowników jednym UPDATE korzystającym z częściowego indeksu
+    idx_user_streaks_active (tylko wiersze z current_streak > 0).
+    """
+    
+    def __init__(self, reset_hours=STREAK_RESET_HOURS, tz=STREAK_TIMEZONE,
+                 rollover_interval=STREAK_ROLLOVER_INTERVAL):
+        """Inicjalizacja managera streaków (tz=None oznacza strefę systemową)."""
+        self.reset_after = timedelta(hours=reset_hours)
+        self.tz = tz
+        self.rollover_interval = rollover_interval
+        # user_id -> [ostatnia aktywność (UTC), bieżący streak, najdłuższy streak, niezapisana zmiana]
+        self._cache = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def _now(self, now=None):
+        """Bieżący (lub podany) czas ze strefą czasową - daty bez strefy są traktowane jako lokalne."""
+        if now is None:
+            return datetime.now(timezone.utc)
+        return now if now.tzinfo is not None else now.astimezone()
+    
+    def _local_date(self, moment):
+        """Data kalendarzowa w strefie streaków."""
+        return moment.astimezone(self.tz).date()
+    
+    def add_listener(self, callback):
+        """Rejestruje funkcję callback(user_id, changed) wywoływaną po zmianie streaka."""
+        self._listeners.append(callback)
+    
+    def _entry(self, user_id):
+        """Zwraca wpis użytkownika z pamięci, wczytując go z bazy przy pierwszym użyciu."""
+        with self._lock:
+            entry = self._cache.get(user_id)
+        if entry is not None:
+            return entry
+        
+        with DatabaseManager() as db:
+            row = db.fetch_one(
+                "SELECT current_streak, max_streak, last_activity_date FROM user_streaks WHERE user_id = ?",
+                (user_id,)
+            )
+        if row:
+            entry = [_from_db(row['last_activity_date']), row['current_streak'] or 0, row['max_streak'] or 0, False]
+        else:
+            entry = [None, 0, 0, False]
+        with self._lock:
+            return self._cache.setdefault(user_id, entry)
+    
+    def _save(self, rows):
+        """Zapisuje wiersze (user_id, current, max, last_activity) jednym executemany."""
+        with DatabaseManager() as db:
+            with db.transaction():
+                db.cursor.executemany('''
+                    INSERT INTO user_streaks (user_id, current_streak, max_streak, last_activity_date)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        current_streak = excluded.current_streak,
+                        max_streak = excluded.max_streak,
+                        last_activity_date = excluded.last_activity_date
+                ''', rows)
+    
+    def record_activity(self, user_id, now=None):
+        """
+        Rejestruje aktywność użytkownika i zwraca jego bieżący streak.
+        Aktywność tego samego dnia nie wykonuje żadnego zapytania do bazy.
+        """
+        now = self._now(now)
+        entry = self._entry(user_id)
+        
+        with self._lock:
+            last, current, longest, _ = entry
+            if last is not None and now - last <= self.reset_after:
+                if self._local_date(now) <= self._local_date(last):
+                    entry[0] = max(last, now)
+                    entry[3] = True
+                    return current
+                current += 1
+            else:
+                current = 1
+            longest = max(longest, current)
+            entry[:] = [now, current, longest, False]
+        
+        try:
+            self._save([(user_id, current, longest, _to_db(now))])
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisywania streaka użytkownika {user_id}: {e}")
+            with self._lock:
+                entry[3] = True
+        for callback in self._listeners:
+            try:
+                callback(user_id, {'current_streak', 'max_streak'})
+            except Exception as e:
+                logger.error(f"Błąd w obsłudze zmiany streaka użytkownika {user_id}: {e}")
+        return current
+    
+    def get_streak(self, user_id, now=None):
+        """
+        Zwraca słownik z bieżącym i najdłuższym streakiem oraz ostatnią aktywnością.
+        Streak, który wygasł, a nie został jeszcze wyzerowany przez rollover(), jest zwracany jako 0.
+        """
+        now = self._now(now)
+        last, current, longest, _ = self._entry(user_id)
+        if last is None or now - last > self.reset_after:
+            current = 0
+        return {
+            'current_streak': current,
+            'max_streak': longest,
+            'last_activity_date': last,
+        }
+    
+    def flush(self):
+        """Zapisuje w bazie zmiany trzymane tylko w pamięci. Zwraca liczbę zapisanych wierszy."""
+        with self._lock:
+            rows = [(user_id, entry[1], entry[2], _to_db(entry[0]))
+                    for user_id, entry in self._cache.items() if entry[3]]
+            for entry in self._cache.values():
+                entry[3] = False
+        if not rows:
+            return 0
+        
+        try:
+            self._save(rows)
+        except Exception as e:
+            logger.error(f"Błąd podczas zapisywania streaków: {e}")
+            with self._lock:
+                for user_id, *_ in rows:
+                    if user_id in self._cache:
+                        self._cache[user_id][3] = True
+            return 0
+        return len(rows)
+    
+    def rollover(self, now=None):
+        """
+        Zeruje streaki wszystkich użytkowników nieaktywnych dłużej niż
+        STREAK_RESET_HOURS - jednym UPDATE po częściowym indeksie.
+        Zwraca liczbę wyzerowanych streaków.
+        """
+        now = self._now(now)
+        cutoff = now - self.reset_after
+        self.flush()
+        
+        with DatabaseManager() as db:
+            with db.transaction():
+                db.cursor.execute(
+                    "UPDATE user_streaks SET current_streak = 0 "
+                    "WHERE current_streak > 0 AND last_activity_date < ?",
+                    (_to_db(cutoff),)
+                )
+                reset = db.cursor.rowcount
+        
+        with self._lock:
+            for entry in self._cache.values():
+                if entry[0] is not None and entry[0] < cutoff:
+                    entry[1] = 0
+        logger.info(f"Wyzerowano {reset} wygasłych streaków")
+        return reset
+    
+    def forget(self, user_id):
+        """Zapisuje i usuwa stan użytkownika z pamięci (np. po wylogowaniu)."""
+        self.flush()
+        with self._lock:
+            self._cache.pop(user_id, None)
+    
+    def _run(self):
+        """Pętla wątku w tle - pierwszy rollover od razu, kolejne co rollover_interval sekund."""
+        self.rollover()
+        while not self._stop_event.wait(self.rollover_interval):
+            self.rollover()
+    
+    def start(self):
+        """
+        Uruchamia wątek wykonujący rollover od razu i potem co rollover_interval
+        sekund - start aplikacji nie czeka na przejście tabeli streaków.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="streak-rollover", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Zatrzymuje wątek i zapisuje zmiany z pamięci."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+streak_manager = StreakManager()
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from datetime import datetime
+from database.db_manager import DatabaseManager
+from config import STATS_FLUSH_SIZE, STATS_FLUSH_INTERVAL, DB_IN_CLAUSE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Kolumny user_stats utrzymywane przez silnik (kolejność zgodna z wektorem zmian)
+STAT_COLUMNS = ('total_xp', 'lessons_completed', 'exercises_completed',
+                'correct_answers', 'incorrect_answers')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class StatsEngine:
+    """
+    Silnik statystyk użytkowników (tabela user_stats).
+    
+    Odpowiedzi (wiersze answer_events) i ukończone lekcje (wiersze
+    user_progress) trafiają najpierw do bufora w pamięci razem ze zmianami
+    liczników (write-behind) - zapisanie odpowiedzi nie czeka na zapis na dysk.
+    Bufor jest zapisywany w jednej transakcji po przekroczeniu STATS_FLUSH_SIZE
+    zdarzeń (przez wątek w tle, jeśli działa), co STATS_FLUSH_INTERVAL sekund
+    oraz przy wylogowaniu i zamknięciu aplikacji.
+    
+    Gwarancje trwałości:
+    - zdarzenia z bufora, który nie został zapisany (awaria procesu), są
+      tracone - najwyżej STATS_FLUSH_SIZE zdarzeń lub STATS_FLUSH_INTERVAL sekund;
+    - zapis bufora jest atomowy: odpowiedzi, postęp i liczniki user_stats
+      trafiają do bazy razem albo wcale, więc statystyki nigdy nie rozjeżdżają
+      się ze zdarzeniami; nieudany zapis wraca do bufora;
+    - zatwierdzony zapis przetrwa awarię procesu; przy synchronous=NORMAL
+      w trybie WAL utrata zasilania może cofnąć ostatnie zatwierdzone
+      transakcje (baza pozostaje spójna).
+    
+    XP za lekcję to wynik (score) zapisany w user_progress, a liczniki
+    odpowiedzi wynikają z answer_events, dzięki czemu user_stats można
+    w każdej chwili przeliczyć od nowa (rebuild) i sprawdzić (check_consistency).
+    """
+    
+    def __init__(self, flush_size=STATS_FLUSH_SIZE, flush_interval=STATS_FLUSH_INTERVAL):
+        """Inicjalizacja silnika statystyk."""
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        # user_id -> [xp, 0, exercises, correct, incorrect]; lessons_completed
+        # jest wyliczane przy zapisie, bo zależy od wcześniejszego postępu w bazie
+        self._deltas = {}
+        self._progress = []
+        self._answers = []
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self._stats = {
+            'flushes': 0,
+            'flushed_events': 0,
+            'failed_flushes': 0,
+        }
+    
+    def _delta(self, user_id):
+        """Zwraca wektor zmian użytkownika (wywoływane z założoną blokadą)."""
+        delta = self._deltas.get(user_id)
+        if delta is None:
+            delta = self._deltas[user_id] = [0] * len(STAT_COLUMNS)
+        return delta
+    
+    def _request_flush(self):
+        """Zleca zapis bufora wątkowi w tle albo - gdy nie działa - zapisuje od razu."""
+        if self._thread and self._thread.is_alive():
+            self._wake.set()
+        else:
+            self.flush()
+    
+    def record_answer(self, user_id, exercise_id, correct, answer=None, duration_ms=None):
+        """Rejestruje odpowiedź na ćwiczenie (zdarzenie answer_events)."""
+        answered_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            delta = self._delta(user_id)
+            delta[2] += 1
+            delta[3 if correct else 4] += 1
+            self._answers.append((user_id, exercise_id, answer, 1 if correct else 0, duration_ms, answered_at))
+            self._events += 1
+            full = self._events >= self.flush_size
+        if full:
+            self._request_flush()
+    
+    def record_lesson_completion(self, user_id, lesson_id, score):
+        """
+        Rejestruje ukończenie lekcji z wynikiem score (zdobyte XP).
+        Lekcja liczy się do lessons_completed tylko przy pierwszym ukończeniu.
+        """
+        completion_date = datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            self._delta(user_id)[0] += score
+            self._progress.append((user_id, lesson_id, completion_date, score))
+            self._events += 1
+            full = self._events >= self.flush_size
+        if full:
+            self._request_flush()
+    
+    def add_listener(self, callback):
+        """
+        Rejestruje funkcję callback(user_id, changed) wywoływaną po każdym
+        zapisie bufora, gdzie changed to zbiór zmienionych metryk użytkownika.
+        """
+        self._listeners.append(callback)
+    
+    def _notify(self, deltas, progress):
+        """Powiadamia słuchaczy o zmienionych metrykach zapisanych użytkowników."""
+        if not self._listeners:
+            return
+        with_progress = {user_id for user_id, _, _, _ in progress}
+        for user_id, delta in deltas.items():
+            changed = {column for column, value in zip(STAT_COLUMNS, delta) if value}
+            if user_id in with_progress:
+                changed.add('languages_started')
+            for callback in self._listeners:
+                try:
+                    callback(user_id, changed)
+                except Exception as e:
+                    logger.error(f"Błąd w obsłudze zmiany statystyk użytkownika {user_id}: {e}")
+    
+    def pending(self, user_id):
+        """Zwraca niezapisane jeszcze zmiany użytkownika jako słownik."""
+        with self._lock:
+            delta = list(self._deltas.get(user_id, [0] * len(STAT_COLUMNS)))
+            lessons = {lesson_id for uid, lesson_id, _, _ in self._progress if uid == user_id}
+            answers = sum(1 for event in self._answers if event[0] == user_id)
+        pending = dict(zip(STAT_COLUMNS, delta))
+        pending['pending_lessons'] = len(lessons)
+        pending['pending_answers'] = answers
+        return pending
+    
+    def get_stats(self, user_id):
+        """Zwraca statystyki użytkownika z bazy (po zapisaniu zaległych zmian)."""
+        self.flush()
+        with DatabaseManager() as db:
+            return db.fetch_one("SELECT * FROM user_stats WHERE user_id = ?", (user_id,))
+    
+    def flush(self):
+        """
+        Zapisuje bufor w jednej transakcji: nowe wiersze answer_events
+        i user_progress oraz zsumowane zmiany user_stats. Zwraca liczbę zapisanych zdarzeń.
+        W razie błędu zmiany wracają do bufora.
+        """
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+                progress, self._progress = self._progress, []
+                answers, self._answers = self._answers, []
+                events, self._events = self._events, 0
+            if not events:
+                return 0
+            
+            try:
+                with DatabaseManager() as db:
+                    with db.transaction():
+                        self._write(db, deltas, progress, answers)
+            except Exception as e:
+                logger.error(f"Błąd podczas zapisywania statystyk: {e}")
+                self._restore(deltas, progress, answers, events)
+                with self._lock:
+                    self._stats['failed_flushes'] += 1
+                return 0
+            
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed_events'] += events
+            logger.debug(f"Zapisano {events} zdarzeń statystyk dla {len(deltas)} użytkowników")
+        self._notify(deltas, progress)
+        return events
+    
+    def _write(self, db, deltas, progress, answers):
+        """Zapis bufora w otwartej transakcji."""
+        cursor = db.cursor
+        seen = set()
+        for user_id, lesson_id, _, _ in progress:
+            if (user_id, lesson_id) in seen:
+                continue
+            seen.add((user_id, lesson_id))
+            completed_before = cursor.execute(
+                "SELECT 1 FROM user_progress WHERE user_id = ? AND lesson_id = ? AND completed = 1 LIMIT 1",
+                (user_id, lesson_id)
+            ).fetchone()
+            if not completed_before:
+                deltas[user_id][1] += 1
+        
+        cursor.executemany(
+            "INSERT INTO answer_events (user_id, exercise_id, answer, correct, duration_ms, answered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            answers
+        )
+        cursor.executemany(
+            "INSERT INTO user_progress (user_id, lesson_id, completed, completion_date, score) "
+            "VALUES (?, ?, 1, ?, ?)",
+            progress
+        )
+        cursor.executemany("INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)",
+                           [(user_id,) for user_id in deltas])
+        assignments = ', '.join(f"{column} = {column} + ?" for column in STAT_COLUMNS)
+        cursor.executemany(
+            f"UPDATE user_stats SET {assignments} WHERE user_id = ?",
+            [(*delta, user_id) for user_id, delta in deltas.items()]
+        )
+    
+    def _restore(self, deltas, progress, answers, events):
+        """Przywraca niezapisane zmiany do bufora (przed nowszymi zdarzeniami)."""
+        with self._lock:
+            for user_id, delta in deltas.items():
+                current = self._delta(user_id)
+                # lessons_completed jest wyliczane przy każdym zapisie od nowa
+                delta[1] = 0
+                for index, value in enumerate(delta):
+                    current[index] += value
+            self._progress[:0] = progress
+            self._answers[:0] = answers
+            self._events += events
+    
+    def _aggregate(self, db, user_ids):
+        """
+        Przelicza kolumny STAT_COLUMNS dla porcji użytkowników: jedno zapytanie
+        agregujące po user_progress i jedno po answer_events.
+        """
+        placeholders = ', '.join('?' for _ in user_ids)
+        expected = {user_id: dict.fromkeys(STAT_COLUMNS, 0) for user_id in user_ids}
+        for row in db.fetch_all(f'''
+            SELECT user_id,
+                   COALESCE(SUM(score), 0) AS total_xp,
+                   COUNT(DISTINCT lesson_id) AS lessons_completed
+            FROM user_progress
+            WHERE completed = 1 AND user_id IN ({placeholders})
+            GROUP BY user_id
+        ''', tuple(user_ids)):
+            expected[row['user_id']].update(total_xp=row['total_xp'], lessons_completed=row['lessons_completed'])
+        for row in db.fetch_all(f'''
+            SELECT user_id,
+                   COUNT(*) AS exercises_completed,
+                   SUM(correct) AS correct_answers
+            FROM answer_events
+            WHERE user_id IN ({placeholders})
+            GROUP BY user_id
+        ''', tuple(user_ids)):
+            expected[row['user_id']].update(
+                exercises_completed=row['exercises_completed'],
+                correct_answers=row['correct_answers'],
+                incorrect_answers=row['exercises_completed'] - row['correct_answers']
+            )
+        return expected
+    
+    def _user_batches(self, db, user_ids, batch_size):
+        """Dzieli listę użytkowników (domyślnie wszystkich) na porcje."""
+        if user_ids is None:
+            user_ids = db.fetch_column("SELECT id FROM users ORDER BY id")
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            yield user_ids[start:start + batch_size]
+    
+    def rebuild(self, user_ids=None, batch_size=DB_IN_CLAUSE_BATCH_SIZE):
+        """
+        Przelicza user_stats z user_progress i answer_events - zapytania
+        agregujące i zapis w jednej transakcji na porcję batch_size użytkowników.
+        Zwraca liczbę przeliczonych użytkowników.
+        """
+        self.flush()
+        rebuilt = 0
+        with DatabaseManager() as db:
+            for batch in self._user_batches(db, user_ids, batch_size):
+                # Odczyt agregatów w tej samej transakcji (BEGIN IMMEDIATE) co zapis -
+                # zrzut bufora z innego wątku nie wejdzie między nie
+                with db.transaction():
+                    expected = self._aggregate(db, batch)
+                    db.cursor.executemany("INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)",
+                                          [(user_id,) for user_id in batch])
+                    db.update_many('user_stats', [
+                        {**values, 'user_id': user_id} for user_id, values in expected.items()
+                    ], key_columns=('user_id',))
+                rebuilt += len(batch)
+        logger.info(f"Przeliczono statystyki {rebuilt} użytkowników")
+        return rebuilt
+    
+    def check_consistency(self, user_ids=None, batch_size=DB_IN_CLAUSE_BATCH_SIZE):
+        """
+        Porównuje user_stats z wartościami wyliczonymi z user_progress
+        i answer_events.
+        Zwraca listę krotek (user_id, kolumna, zapisana wartość, oczekiwana wartość).
+        """
+        self.flush()
+        mismatches = []
+        with DatabaseManager() as db:
+            for batch in self._user_batches(db, user_ids, batch_size):
+                expected = self._aggregate(db, batch)
+                placeholders = ', '.join('?' for _ in batch)
+                stored = {row['user_id']: row for row in db.fetch_all(
+                    f"SELECT * FROM user_stats WHERE user_id IN ({placeholders})", tuple(batch)
+                )}
+                for user_id in batch:
+                    row = stored.get(user_id)
+                    if row is None:
+                        mismatches.append((user_id, 'user_stats', None, 'wiersz'))
+                        continue
+                    for column, value in expected[user_id].items():
+                        if row[column] != value:
+                            mismatches.append((user_id, column, row[column], value))
+        if mismatches:
+            logger.warning(f"Wykryto {len(mismatches)} niezgodności statystyk użytkowników")
+        return mismatches
+    
+    def _run(self):
+        """Pętla wątku w tle."""
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+    
+    def start(self):
+        """Uruchamia wątek zapisujący bufor (co flush_interval sekund lub po jego zapełnieniu)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-flush", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Zatrzymuje wątek i zapisuje pozostałe zmiany."""
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def stats(self):
+        """Zwraca liczniki silnika."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered_events'] = self._events
+        return stats
+
+stats_engine = StatsEngine()
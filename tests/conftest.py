@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import database.db_manager
+from database.db_manager import close_all_pools
+from database.db_setup import create_database
+
+@pytest.fixture
+def app_db(tmp_path):
+    """Ścieżka do pełnej bazy aplikacji utworzonej przez create_database."""
+    path = str(tmp_path / "lingualeap.db")
+    create_database(path)
+    yield path
+    close_all_pools()
+
+@pytest.fixture
+def default_db(app_db, monkeypatch):
+    """Kieruje modele (DatabaseManager() bez argumentów) do testowej bazy."""
+    monkeypatch.setattr(database.db_manager, 'DATABASE_PATH', app_db)
+    return app_db
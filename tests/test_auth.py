@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from auth import password_utils
+from auth.password_utils import (LegacySHA256Hasher, PasswordHasher, PBKDF2Hasher, ScryptHasher,
+                                 calibrate_hasher, hash_password, needs_rehash, verify_password)
+from auth import user_manager
+from auth.login_manager import LoginManager
+from auth.login_throttle import LoginThrottle
+from auth import session_manager as session_manager_module
+from auth.session_manager import SessionManager, load_session_key, session_manager
+from auth.user_manager import UserManager
+from config import PASSWORD_HASH_WORKERS
+from database.db_manager import DatabaseManager, trace_statements
+from database.models import User
+
+@pytest.fixture(autouse=True)
+def fast_hasher(monkeypatch):
+    """Tani koszt haszowania, żeby testy nie trwały długo."""
+    monkeypatch.setattr(password_utils, '_default_hasher', ScryptHasher(n=2 ** 10))
+
+@pytest.fixture(autouse=True)
+def throttle(monkeypatch):
+    """Osobny ogranicznik prób logowania dla każdego testu."""
+    limiter = LoginThrottle(max_attempts=3, window=60, client_max_attempts=5)
+    monkeypatch.setattr(user_manager, 'login_throttle', limiter)
+    return limiter
+
+@pytest.mark.parametrize('hasher', [ScryptHasher(n=2 ** 10), PBKDF2Hasher(iterations=1000)])
+def test_hashers_round_trip(hasher, monkeypatch):
+    monkeypatch.setattr(password_utils, '_default_hasher', hasher)
+    password_hash, salt = hash_password('Sekret123')
+
+    assert password_hash.startswith(hasher.algorithm + '$')
+    assert verify_password('Sekret123', password_hash, salt)
+    assert not verify_password('sekret123', password_hash, salt)
+    assert not needs_rehash(password_hash)
+
+def test_legacy_sha256_hash_is_verified_and_flagged_for_rehash():
+    salt = 'abc'
+    legacy_hash = hashlib.sha256(b'Sekret123abc').hexdigest()
+
+    assert LegacySHA256Hasher().verify('Sekret123', legacy_hash, salt)
+    assert verify_password('Sekret123', legacy_hash, salt)
+    assert needs_rehash(legacy_hash)
+
+def test_hashers_implement_full_interface():
+    with pytest.raises(TypeError):
+        PasswordHasher()
+
+    legacy = LegacySHA256Hasher()
+    assert legacy.cost == 1
+    assert calibrate_hasher(legacy, target_time=1, max_doublings=3) is legacy
+
+def test_weaker_cost_needs_rehash():
+    assert needs_rehash(ScryptHasher(n=2 ** 8).encode('x', 'salt'))
+    assert needs_rehash(PBKDF2Hasher(iterations=1000).encode('x', 'salt'))
+
+def test_unknown_hash_format_is_rejected():
+    assert not verify_password('x', 'md5$abc$def', 'salt')
+
+def test_calibration_increases_cost_until_target():
+    calibrated = calibrate_hasher(PBKDF2Hasher(iterations=1000), target_time=0.005)
+    assert calibrated.iterations >= 1000
+    assert calibrate_hasher(PBKDF2Hasher(iterations=1000), target_time=0).iterations == 1000
+    assert calibrate_hasher(PBKDF2Hasher(iterations=1000), max_doublings=0).iterations == 1000
+
+def test_concurrent_verifications_are_bounded(monkeypatch):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    class SlowHasher(PBKDF2Hasher):
+        def verify(self, password, encoded, salt):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.pop()
+            return True
+
+    monkeypatch.setattr(password_utils, '_default_hasher', SlowHasher(iterations=1000))
+    encoded = PBKDF2Hasher(iterations=1000).encode('x', 'salt')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(lambda _: verify_password('x', encoded, 'salt'), range(16)))
+    assert max(peak) <= PASSWORD_HASH_WORKERS
+
+def test_default_hasher_calibration_is_applied(monkeypatch):
+    monkeypatch.setattr(password_utils, '_default_hasher', PBKDF2Hasher(iterations=1000))
+    monkeypatch.setattr(password_utils, 'calibrate_hasher',
+                        lambda hasher: hasher.with_cost(hasher.cost * 4))
+    assert password_utils.start_calibration().result().iterations == 4000
+    assert password_utils.get_hasher().iterations == 4000
+    assert needs_rehash(PBKDF2Hasher(iterations=1000).encode('x', 'salt'))
+
+    monkeypatch.setattr(password_utils, 'PASSWORD_HASH_CALIBRATE', False)
+    assert password_utils.calibrate_default_hasher().iterations == 4000
+
+def test_login_upgrades_legacy_hash(default_db):
+    user = User.get_by_username('admin')
+    user.salt = 'legacy-salt'
+    user.password_hash = hashlib.sha256(b'admin123legacy-salt').hexdigest()
+    user.save()
+
+    logged_in, error = UserManager.authenticate_user('admin', 'admin123')
+
+    assert error is None and logged_in.username == 'admin'
+    stored = User.get_by_username('admin')
+    assert stored.password_hash.startswith('scrypt$')
+    assert verify_password('admin123', stored.password_hash, stored.salt)
+
+def test_login_rejects_wrong_password(default_db):
+    user, error = UserManager.authenticate_user('admin', 'wrong')
+    assert user is None and error == "Nieprawidłowa nazwa użytkownika lub hasło."
+
+def test_register_user_writes_account_in_one_transaction(default_db):
+    with trace_statements(default_db) as statements:
+        user, error = UserManager.register_user('nowy', 'nowy@example.com', 'Sekret123')
+
+    assert error is None and user.id
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+    assert sum(1 for sql in statements if sql.strip().upper() in ('COMMIT', 'BEGIN IMMEDIATE')) <= 2
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_stats WHERE user_id = ?", (user.id,)) == 1
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_streaks WHERE user_id = ?", (user.id,)) == 1
+
+def test_register_user_maps_unique_violations(default_db):
+    user, error = UserManager.register_user('admin', 'inny@example.com', 'Sekret123')
+    assert user is None and error == "Użytkownik o takiej nazwie już istnieje."
+
+    user, error = UserManager.register_user('inny', 'admin@lingualeap.com', 'Sekret123')
+    assert user is None and error == "Ten adres email jest już używany."
+
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM users") == 1
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_stats") == 1
+
+def test_register_users_bulk(default_db):
+    accounts = [(f'uczen{i}', f'uczen{i}@example.com', 'Sekret123') for i in range(25)]
+    accounts.append(('uczen3', 'duplikat@example.com', 'Sekret123'))
+    accounts.append(('slabe', 'slabe@example.com', 'abc'))
+
+    results = UserManager.register_users(accounts, batch_size=10)
+
+    assert [username for username, _, _ in results] == [account[0] for account in accounts]
+    assert all(user_id and error is None for _, user_id, error in results[:25])
+    assert results[25][1:] == (None, "Użytkownik o takiej nazwie już istnieje.")
+    assert results[26][1:] == (None, "Hasło nie spełnia wymagań bezpieczeństwa.")
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_streaks") == 26
+    assert UserManager.authenticate_user('uczen7', 'Sekret123')[1] is None
+
+def test_register_batch_hashes_before_taking_write_lock(default_db, monkeypatch):
+    class Hashed:
+        def __init__(self, password):
+            self.password = password
+        def result(self):
+            statements.append('hash')
+            return hash_password(self.password)
+    monkeypatch.setattr(user_manager, 'hash_password_async', Hashed)
+
+    with trace_statements(default_db) as statements:
+        UserManager.register_users([(f'uczen{i}', f'uczen{i}@example.com', 'Sekret123') for i in range(3)])
+    last_hash = max(index for index, sql in enumerate(statements) if sql == 'hash')
+    assert statements.index('BEGIN IMMEDIATE') > last_hash
+
+@pytest.fixture
+def sessions(default_db):
+    return SessionManager(secret=b'k' * 32)
+
+def test_session_token_is_validated_from_cache(default_db, sessions):
+    admin = User.get_by_username('admin')
+    token = sessions.create(admin, client='kiosk')
+
+    with trace_statements(default_db) as statements:
+        assert sessions.validate(token) is admin
+        assert sessions.validate(token[:-2] + 'xx') is None
+        assert sessions.validate('bez-podpisu') is None
+    assert statements == []
+
+    # Po wyczyszczeniu pamięci sesja jest odtwarzana z tabeli sessions
+    sessions.clear()
+    assert sessions.validate(token).username == 'admin'
+    assert sessions.stats()['rejected'] == 2
+
+def test_many_sessions_and_revocation(default_db, sessions):
+    admin = User.get_by_username('admin')
+    tokens = [sessions.create(admin) for _ in range(20)]
+
+    assert len(set(tokens)) == 20
+    assert all(sessions.validate(token) is admin for token in tokens)
+
+    assert sessions.revoke(tokens[0])
+    assert sessions.validate(tokens[0]) is None
+    assert sessions.refresh(tokens[1])
+
+    assert sessions.revoke_user(admin.id) == 19
+    assert all(sessions.validate(token) is None for token in tokens)
+
+def test_expired_sessions_are_swept_in_batches(default_db):
+    expired = SessionManager(secret=b'k' * 32, expiry_days=-1)
+    admin = User.get_by_username('admin')
+    tokens = [expired.create(admin) for _ in range(5)]
+    live = SessionManager(secret=b'k' * 32).create(admin)
+
+    assert expired.validate(tokens[0]) is None
+    assert expired.sweep_expired(batch_size=2) == 5
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM sessions") == 1
+    assert expired.validate(live) is not None
+
+def test_revalidation_reads_account_state_from_database(default_db):
+    sessions = SessionManager(secret=b'k' * 32, revalidate_interval=0)
+    admin = User.get_by_username('admin')
+    token = sessions.create(admin)
+
+    with DatabaseManager() as db:
+        db.update('users', {'is_active': 0}, 'id = ?', (admin.id,))
+    assert sessions.validate(token) is None
+
+def test_session_key_is_created_once_under_concurrency(tmp_path, monkeypatch):
+    path = str(tmp_path / 'session.key')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        keys = set(pool.map(lambda _: load_session_key(path), range(32)))
+
+    with open(path, 'rb') as key_file:
+        assert keys == {key_file.read()}
+    assert os.listdir(tmp_path) == ['session.key']
+
+    loads = []
+    def load_once():
+        loads.append(1)
+        time.sleep(0.01)
+        return load_session_key(path)
+    monkeypatch.setattr(session_manager_module, 'load_session_key', load_once)
+
+    manager = SessionManager()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        signatures = set(pool.map(lambda _: manager._sign('sesja'), range(16)))
+    assert len(loads) == 1 and len(signatures) == 1
+
+def test_login_manager_uses_sessions(default_db, monkeypatch):
+    monkeypatch.setattr(session_manager, '_secret', b'k' * 32)
+    session_manager.clear()
+    admin = User.get_by_username('admin')
+
+    token = LoginManager.login(admin)
+    assert LoginManager.get_token() == token
+    assert LoginManager.get_current_user() is admin and LoginManager.is_admin()
+
+    LoginManager.logout()
+    assert not LoginManager.is_authenticated()
+    assert session_manager.validate(token) is None
+
+def test_throttle_rejects_before_touching_database_or_hasher(default_db, throttle, monkeypatch):
+    for _ in range(3):
+        assert UserManager.authenticate_user('admin', 'zle', client='kiosk-1')[0] is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("hasher nie powinien być wywołany")
+    monkeypatch.setattr(user_manager, 'verify_password', fail)
+
+    with trace_statements(default_db) as statements:
+        user, error = UserManager.authenticate_user('admin', 'admin123', client='kiosk-1')
+    assert user is None and error.startswith("Zbyt wiele nieudanych prób")
+    assert statements == []
+    assert throttle.retry_after('admin') > 0
+
+def _fail(limiter, username, client=None):
+    """Nieudana próba logowania z punktu widzenia ogranicznika."""
+    assert limiter.allow(username, client)
+    limiter.record_failure(username, client)
+
+def test_throttle_limits_client_across_usernames(throttle):
+    for i in range(5):
+        _fail(throttle, f'konto{i}', client='kiosk-2')
+
+    assert not throttle.allow('inne-konto', client='kiosk-2')
+    assert throttle.allow('inne-konto', client='kiosk-3')
+
+def test_successful_login_resets_user_limit(default_db, throttle):
+    UserManager.authenticate_user('admin', 'zle')
+    UserManager.authenticate_user('admin', 'zle')
+    assert UserManager.authenticate_user('admin', 'admin123')[1] is None
+    assert throttle.stats()['entries'] == 0
+
+def test_throttle_refills_and_prunes(throttle):
+    limiter = LoginThrottle(max_attempts=2, window=0.05, max_entries=10)
+    _fail(limiter, 'a')
+    _fail(limiter, 'a')
+    assert not limiter.allow('a')
+    time.sleep(0.03)
+    assert limiter.allow('a')
+
+    time.sleep(0.06)
+    for i in range(11):
+        _fail(limiter, f'user{i}')
+    assert limiter.stats()['entries'] <= 10
+
+def test_allow_reserves_tokens_for_concurrent_attempts(throttle):
+    # Trzy próby dopuszczone, zanim którakolwiek się zakończyła, wyczerpują limit
+    for _ in range(3):
+        assert throttle.allow('admin', client='kiosk-1')
+    assert not throttle.allow('admin', client='kiosk-1')
+
+    throttle.reset('admin', client='kiosk-1')
+    assert throttle.allow('admin', client='kiosk-1')
+    throttle.release('admin', client='kiosk-1')
+    assert throttle.stats()['entries'] == 1
+
+def test_throttle_flood_of_usernames_prunes_in_batches():
+    limiter = LoginThrottle(max_attempts=3, window=60, max_entries=100, prune_ratio=0.9)
+    for i in range(1000):
+        _fail(limiter, f'bot{i}')
+
+    stats = limiter.stats()
+    assert stats['entries'] <= 100
+    # Pierwsze przycięcie po 101 wpisach, kolejne co 11 nowych nazw (90 -> 101)
+    assert stats['prunes'] == 1 + (1000 - 101) // 11
+
+def test_throttle_state_is_persisted(default_db):
+    limiter = LoginThrottle(max_attempts=3, window=60)
+    for _ in range(3):
+        _fail(limiter, 'admin', client='kiosk-1')
+    assert limiter.persist() == 2
+
+    restored = LoginThrottle(max_attempts=3, window=60)
+    assert restored.load() == 2
+    assert not restored.allow('admin')
+
+    limiter.reset('admin')
+    limiter.persist()
+    assert LoginThrottle(max_attempts=3, window=60).load() == 1
+
+def test_rejections_under_flood_are_counted(throttle):
+    for _ in range(3):
+        _fail(throttle, 'admin', client='atakujacy')
+
+    attempts = 1000
+    for _ in range(attempts):
+        assert not throttle.allow('admin', client='atakujacy')
+
+    assert throttle.stats()['rejected'] == attempts
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import csv
+import json
+import time
+import random
+
+import pytest
+
+from database.db_manager import DatabaseManager, trace_statements
+from database.models import Exercise, Language, Lesson
+from content.content_loader import (ContentError, ContentImporter, import_content, import_languages,
+                                    iter_json_array)
+from content.lesson_manager import ContentPack, ContentPackError, LessonManager, build_pack
+from content.exercise_manager import (answer_cache_stats, bounded_edit_distance, check_answer,
+                                      check_exercise_answer, compile_answer, normalize_answer)
+
+def lesson_pack(language='en', lessons=2, exercises=3):
+    return [
+        {
+            'language': language,
+            'category': 'Podstawy',
+            'title': f'Lekcja {i}',
+            'exercises': [
+                {'type': 'translation', 'content': f'Słowo {i}.{j}', 'correct_answer': f'word {i}.{j}'}
+                for j in range(exercises)
+            ],
+        }
+        for i in range(lessons)
+    ]
+
+def test_json_array_is_parsed_across_chunk_boundaries():
+    records = lesson_pack(lessons=5)
+    text = json.dumps(records, ensure_ascii=False, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=7)) == records
+    assert list(iter_json_array(io.StringIO(' [ ] '))) == []
+    assert list(iter_json_array(io.StringIO('[1, 22, 333]'), chunk_size=2)) == [1, 22, 333]
+
+@pytest.mark.parametrize('text', ['{"a": 1}', '[{"a": 1}', '[{"a": 1},]', '[{"a": 1} {"b": 2}]'])
+def test_json_array_rejects_invalid_documents(text):
+    with pytest.raises(ContentError):
+        list(iter_json_array(io.StringIO(text), chunk_size=4))
+
+def test_import_json_ndjson_and_csv(default_db, tmp_path):
+    json_path = tmp_path / 'pack.json'
+    json_path.write_text(json.dumps(lesson_pack('en')), encoding='utf-8')
+    
+    ndjson_path = tmp_path / 'pack.ndjson'
+    ndjson_path.write_text('\n'.join(json.dumps(record) for record in lesson_pack('de')), encoding='utf-8')
+    
+    csv_path = tmp_path / 'pack.csv'
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['language', 'category', 'lesson', 'type', 'content', 'correct_answer', 'options'])
+        writer.writerow(['ru', 'Алфавит', 'Буквы', 'choice', 'Привет', 'cześć', 'cześć|pa|dzień dobry'])
+        writer.writerow(['ru', 'Алфавит', 'Буквы', 'translation', 'Да', 'tak', ''])
+    
+    assert import_content(str(json_path))['exercises'] == 6
+    assert import_content(str(ndjson_path))['lessons'] == 2
+    report = import_content(str(csv_path))
+    assert (report['categories'], report['lessons'], report['exercises']) == (1, 1, 2)
+    
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM lessons") == 5
+        assert db.fetch_scalar("SELECT COUNT(*) FROM lesson_categories") == 3
+        row = db.fetch_one('''
+            SELECT e.options, e.order_index, l.title, c.name FROM exercises e
+            JOIN lessons l ON l.id = e.lesson_id JOIN lesson_categories c ON c.id = l.category_id
+            WHERE e.content = 'Привет'
+        ''')
+    assert json.loads(row['options']) == ['cześć', 'pa', 'dzień dobry']
+    assert (row['title'], row['name'], row['order_index']) == ('Буквы', 'Алфавит', 1)
+    
+    english = Lesson.get_by_language(1, with_exercises=True)
+    assert [lesson.title for lesson in english] == ['Lekcja 0', 'Lekcja 1']
+    assert [exercise.order_index for exercise in english[0].get_exercises()] == [1, 2, 3]
+
+def test_invalid_records_are_reported_and_reimport_skips_duplicates(default_db):
+    records = lesson_pack(lessons=2)
+    records.insert(1, {'language': 'xx', 'title': 'Nieznany język'})
+    records.insert(2, {'language': 'en', 'title': 'Zła lekcja', 'exercises': [{'type': 'translation'}]})
+    records.insert(3, 'nie obiekt')
+    
+    report = ContentImporter(batch_size=2).import_records(records)
+    assert (report['lessons'], report['exercises']) == (2, 6)
+    assert [number for number, _ in report['errors']] == [2, 3, 4]
+    assert 'content' in report['errors'][1][1]
+    
+    again = ContentImporter().import_records(lesson_pack(lessons=3))
+    assert (again['lessons'], again['exercises'], again['duplicates']) == (1, 3, 6)
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM exercises") == 9
+        assert db.fetch_scalar("SELECT COUNT(*) FROM lesson_categories") == 1
+
+def test_import_languages(default_db, tmp_path):
+    path = tmp_path / 'languages.json'
+    path.write_text(json.dumps([
+        {'code': 'IT', 'name': 'Italiano'},
+        {'code': 'ru', 'name': 'Russkij', 'is_active': False},
+        {'name': 'bez kodu'},
+    ]), encoding='utf-8')
+    assert import_languages(str(path)) == 2
+    
+    path.write_text(json.dumps({'uk': 'Українська'}), encoding='utf-8')
+    assert import_languages(str(path)) == 1
+    assert import_languages(str(tmp_path / 'brak.json')) == 0
+    
+    with DatabaseManager() as db:
+        languages = {row['code']: (row['name'], row['is_active'])
+                     for row in db.fetch_all("SELECT code, name, is_active FROM languages")}
+    assert languages['it'] == ('Italiano', 1)
+    assert languages['ru'] == ('Russkij', 0)
+    assert languages['uk'] == ('Українська', 1)
+    assert len(languages) == 8
+
+def write_ndjson(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def test_import_file_in_chunks(default_db, tmp_path):
+    path = tmp_path / 'pack.ndjson'
+    write_ndjson(path, lesson_pack('es', lessons=20, exercises=25))
+    report = import_content(str(path), batch_size=60)
+    assert (report['lessons'], report['exercises'], report['errors']) == (20, 500, [])
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM exercises") == 500
+        assert db.fetch_scalar("SELECT COUNT(*) FROM exercises_fts WHERE exercises_fts MATCH 'slowo'") == 500
+
+def test_import_bumps_content_version_once_per_chunk(default_db, tmp_path):
+    path = tmp_path / 'pack.ndjson'
+    write_ndjson(path, lesson_pack('es', lessons=20, exercises=25))
+    read_version = lambda db: db.fetch_scalar("SELECT value FROM app_meta WHERE key = 'content_version'")
+    with DatabaseManager() as db:
+        before = read_version(db)
+
+    with trace_statements(default_db) as statements:
+        import_content(str(path), batch_size=60)
+    chunks = statements.count('BEGIN IMMEDIATE')
+    assert chunks > 1
+    with DatabaseManager() as db:
+        assert read_version(db) - before == chunks
+        assert db.fetch_scalar("SELECT COUNT(*) FROM lessons_fts WHERE lessons_fts MATCH 'lekcja'") == 20
+        assert db.fetch_scalar("SELECT COUNT(*) FROM app_meta WHERE key = 'search_deferred'") == 0
+
+    # Zwykły zapis poza importem nadal podbija licznik
+    with DatabaseManager() as db:
+        db.insert('lesson_categories', {'name': 'Inne', 'language_id': 1})
+        assert read_version(db) - before == chunks + 1
+
+@pytest.mark.skipif('LINGUALEAP_BENCH_EXERCISES' not in os.environ,
+                    reason="pomiar wydajności - LINGUALEAP_BENCH_EXERCISES=100000")
+def test_import_benchmark(default_db, tmp_path):
+    total = int(os.environ['LINGUALEAP_BENCH_EXERCISES'])
+    path = tmp_path / 'bench.ndjson'
+    write_ndjson(path, lesson_pack('es', lessons=total // 50, exercises=50))
+    
+    start = time.perf_counter()
+    report = import_content(str(path))
+    elapsed = time.perf_counter() - start
+    
+    assert report['exercises'] == total
+    assert not report['errors']
+    # Cel: 100 tys. ćwiczeń w kilka sekund
+    assert elapsed < total / 10000
+
+@pytest.fixture
+def catalog(default_db):
+    """Baza z lekcjami w dwóch językach (jedna lekcja nieaktywna)."""
+    ContentImporter().import_records(lesson_pack('en', lessons=3) + lesson_pack('ru', lessons=1, exercises=2))
+    with DatabaseManager() as db:
+        db.execute_query("UPDATE lessons SET is_active = 0 WHERE title = 'Lekcja 2' AND language_id = 1")
+    return default_db
+
+def test_pack_matches_database(catalog, tmp_path):
+    path = str(tmp_path / 'content.pack')
+    assert build_pack(path) == {'languages': 6, 'lessons': 3, 'exercises': 8, 'size': os.path.getsize(path)}
+    
+    with ContentPack(path) as pack:
+        assert [language.to_dict() for language in pack.get_languages()] == \
+            [language.to_dict() for language in Language.get_active()]
+        for language_id in (1, 6):
+            lessons = Lesson.get_by_language(language_id)
+            assert [lesson.to_dict() for lesson in pack.get_lessons(language_id)] == \
+                [lesson.to_dict() for lesson in lessons]
+            for lesson in lessons:
+                assert [exercise.to_dict() for exercise in pack.get_exercises(lesson.id)] == \
+                    [exercise.to_dict() for exercise in Exercise.get_by_lesson(lesson.id)]
+        assert pack.get_lessons(2) == []
+        assert pack.get_lesson(3) is None
+        assert pack.get_lesson(4).title == 'Lekcja 0'
+        assert pack.exercise_count(1) == 3
+        
+        payload = pack.exercise_payload(4)
+        assert isinstance(payload, memoryview) and payload.readonly
+        assert json.loads(bytes(payload))[1][3] == 'Słowo 0.1'
+        payload.release()
+
+def test_pack_lookup_does_not_touch_database(catalog, tmp_path):
+    path = str(tmp_path / 'content.pack')
+    build_pack(path)
+    manager = LessonManager(path)
+    assert manager.pack() is not None
+    with trace_statements(catalog) as statements:
+        lessons = manager.get_lessons(1)
+        exercises = manager.get_exercises(lessons[0].id)
+    assert statements == []
+    assert [exercise.content for exercise in exercises] == ['Słowo 0.0', 'Słowo 0.1', 'Słowo 0.2']
+    manager.close()
+    
+    fallback = LessonManager(str(tmp_path / 'brak.pack'))
+    assert fallback.pack() is None
+    assert [lesson.title for lesson in fallback.get_lessons(1)] == ['Lekcja 0', 'Lekcja 1']
+
+def test_lesson_list_counts_exercises_without_loading_them(catalog, tmp_path):
+    expected = [('Lekcja 0', 3), ('Lekcja 1', 3)]
+    with trace_statements(catalog) as statements:
+        lessons = LessonManager(None).get_lesson_list(1)
+    assert [(lesson.title, count) for lesson, count in lessons] == expected
+    assert all('correct_answer' not in sql and 'content' not in sql for sql in statements)
+    
+    path = str(tmp_path / 'content.pack')
+    build_pack(path)
+    manager = LessonManager(path)
+    assert [(lesson.title, count) for lesson, count in manager.get_lesson_list(1)] == expected
+    manager.close()
+
+def test_stale_pack_falls_back_to_database(catalog, tmp_path):
+    path = str(tmp_path / 'content.pack')
+    build_pack(path)
+    manager = LessonManager(path, check_interval=0)
+    assert [lesson.title for lesson in manager.get_lessons(1)] == ['Lekcja 0', 'Lekcja 1']
+    assert 6 in [language.id for language in manager.get_languages()]
+    
+    ContentImporter().import_records(lesson_pack('en', lessons=4)[3:])
+    with DatabaseManager() as db:
+        db.execute_query("UPDATE languages SET is_active = 0 WHERE code = 'ru'")
+    assert [lesson.title for lesson in manager.get_lessons(1)] == ['Lekcja 0', 'Lekcja 1', 'Lekcja 3']
+    assert 6 not in [language.id for language in manager.get_languages()]
+    assert manager.pack() is None
+    
+    build_pack(path)
+    assert manager.pack() is not None
+    assert [lesson.title for lesson in manager.get_lessons(1)] == ['Lekcja 0', 'Lekcja 1', 'Lekcja 3']
+    manager.close()
+
+@pytest.mark.parametrize('data', [b'', b'XXXX' + bytes(20), b'LLCP\x01\x00\x00\x00\x05\x00\x00\x00' + bytes(12)])
+def test_corrupted_pack_is_rejected(tmp_path, data):
+    path = tmp_path / 'broken.pack'
+    path.write_bytes(data)
+    with pytest.raises(ContentPackError):
+        ContentPack(str(path))
+    assert LessonManager(str(path)).pack() is None
+
+@pytest.fixture
+def searchable(default_db):
+    """Baza z lekcjami i ćwiczeniami we wszystkich językach (słowa ze znakami diakrytycznymi)."""
+    ContentImporter().import_records([
+        {'language': 'pl', 'title': 'Łódź i okolice', 'description': 'Duże miasta',
+         'exercises': [{'type': 'translation', 'content': 'Zażółć gęślą jaźń', 'correct_answer': 'x'}]},
+        {'language': 'pl', 'title': 'Miasta Polski', 'description': 'Gdańsk i Kraków',
+         'exercises': [{'type': 'translation', 'content': 'Dworzec', 'correct_answer': 'station'}]},
+        {'language': 'de', 'title': 'Die Straße', 'exercises': [
+            {'type': 'translation', 'content': 'Übung', 'correct_answer': 'ćwiczenie'}]},
+        {'language': 'ru', 'title': 'Ёлка', 'exercises': [
+            {'type': 'translation', 'content': 'Привет', 'correct_answer': 'cześć'}]},
+        {'language': 'es', 'title': 'Mañana'},
+        {'language': 'fr', 'title': 'Le cœur et l\'élève'},
+    ])
+    return default_db
+
+@pytest.mark.parametrize('text, title', [
+    ('lodz', 'Łódź i okolice'),
+    ('ŁÓDŹ', 'Łódź i okolice'),
+    ('strasse', 'Die Straße'),
+    ('елка', 'Ёлка'),
+    ('ёлк', 'Ёлка'),
+    ('manana', 'Mañana'),
+    ('coeur eleve', 'Le cœur et l\'élève'),
+    ('okol', 'Łódź i okolice'),
+])
+def test_search_folds_diacritics_and_matches_prefixes(searchable, text, title):
+    manager = LessonManager(None)
+    assert [lesson.title for lesson in manager.search_lessons(text)] == [title]
+
+def test_search_ranks_title_matches_first(searchable):
+    manager = LessonManager(None)
+    assert [lesson.title for lesson in manager.search_lessons('miast')] == ['Miasta Polski', 'Łódź i okolice']
+    assert [lesson.title for lesson in manager.search_lessons('miast', language_id=3)] == []
+    assert manager.search_lessons('"') == []
+    assert manager.search_lessons('lodz" OR NOT x*') == []
+
+def test_search_index_follows_changes(searchable):
+    manager = LessonManager(None)
+    assert [exercise.content for exercise in manager.search_exercises('zazolc')] == ['Zażółć gęślą jaźń']
+    assert [exercise.content for exercise in manager.search_exercises('cwicz', language_id=4)] == ['Übung']
+    
+    with DatabaseManager() as db:
+        db.execute_query("UPDATE lessons SET title = 'Kraków' WHERE title = 'Łódź i okolice'")
+        db.insert('exercises', {'lesson_id': 1, 'type': 'translation', 'content': 'Wawel', 'correct_answer': 'y'})
+        db.delete('exercises', 'content = ?', ('Dworzec',))
+        db.execute_query("UPDATE lessons SET is_active = 0 WHERE title = 'Die Straße'")
+    assert [lesson.title for lesson in manager.search_lessons('krakow')] == ['Kraków', 'Miasta Polski']
+    assert manager.search_lessons('lodz') == []
+    assert [exercise.content for exercise in manager.search_exercises('wawel')] == ['Wawel']
+    assert manager.search_exercises('dworzec') == []
+    assert manager.search_lessons('strasse') == []
+
+def test_search_favorites_per_user(searchable):
+    with DatabaseManager() as db:
+        db.insert('users', {'username': 'ola', 'email': 'ola@example.com', 'password_hash': 'x', 'salt': 'x'})
+        db.insert_many('user_favorites', [
+            {'user_id': 1, 'word': 'źrebię', 'translation': 'foal', 'language_id': 2},
+            {'user_id': 1, 'word': 'Straße', 'translation': 'ulica', 'language_id': 4},
+            {'user_id': 2, 'word': 'źródło', 'translation': 'source', 'language_id': 2},
+        ])
+    manager = LessonManager(None)
+    assert [row['word'] for row in manager.search_favorites(1, 'zr')] == ['źrebię']
+    assert [row['word'] for row in manager.search_favorites(1, 'ulic')] == ['Straße']
+    assert [row['word'] for row in manager.search_favorites(2, 'zr')] == ['źródło']
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def test_bounded_edit_distance_matches_reference():
+    rng = random.Random(7)
+    alphabet = 'abcжзй ł'
+    for _ in range(3000):
+        pattern = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 70)))
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 70)))
+        if rng.random() < 0.5:
+            # Kilka losowych zmian wzorca - odległości w pobliżu limitu
+            text = list(pattern)
+            for _ in range(rng.randint(0, 4)):
+                text.insert(rng.randrange(len(text) + 1), rng.choice(alphabet))
+                text.pop(rng.randrange(len(text)))
+            text = ''.join(text)
+        peq = {}
+        for position, char in enumerate(pattern):
+            peq[char] = peq.get(char, 0) | 1 << position
+        expected = levenshtein(pattern, text)
+        for limit in (0, 1, 2, 3, 100):
+            distance = bounded_edit_distance(peq, len(pattern), text, limit)
+            assert distance == (expected if expected <= limit else None)
+
+@pytest.mark.parametrize('text, strict, folded', [
+    ('  Hello,   World! ', 'hello world', 'hello world'),
+    ('Zażółć gęślą JAŹŃ.', 'zażółć gęślą jaźń', 'zazolc gesla jazn'),
+    ('¿Qué tal?', 'qué tal', 'que tal'),
+    ('Die Straße', 'die strasse', 'die strasse'),
+    ("L'élève — cœur", 'lélève cœur', 'leleve coeur'),
+    ('Ёлка, Йогурт!', 'ёлка йогурт', 'елка иогурт'),
+    ('e\u0301te\u0301', 'été', 'ete'),
+])
+def test_normalize_answer(text, strict, folded):
+    assert normalize_answer(text, fold_diacritics=False) == strict
+    assert normalize_answer(text) == folded
+
+def test_check_answer_levels():
+    result = check_answer('Dziękuję!', 'dziękuję')
+    assert (result.correct, result.exact, result.typos) == (True, True, 0)
+    
+    result = check_answer('dziekuje', 'Dziękuję')
+    assert (result.correct, result.exact, result.typos, result.expected) == (True, False, 0, 'Dziękuję')
+    
+    result = check_answer('dziekuję bardzo', 'Dziękuję|Dziękuję bardzo')
+    assert (result.correct, result.typos, result.expected) == (True, 0, 'Dziękuję bardzo')
+    
+    assert check_answer('dziekije', 'Dziękuję').typos == 1
+    assert check_answer('dzikije', 'Dziękuję').correct is False
+    assert check_answer('thank you vrey much', 'thank you very much').typos == 2
+    assert not check_answer('cat', 'car')
+    assert not check_answer('', 'car')
+    
+    assert check_answer('be', '(to) be').exact
+    assert check_answer('to be', '(to) be').exact
+    # Puste warianty i powtórzenia są pomijane
+    assert [answer.text for answer in compile_answer('(to) (be)|to be')] == ['to be', 'to', 'be']
+
+def test_choice_exercises_do_not_tolerate_typos():
+    choice = Exercise({'correct_answer': 'Madrid', 'options': '["Madrid", "Malaga"]'})
+    translation = Exercise({'correct_answer': 'Madrid'})
+    assert not check_exercise_answer(choice, 'Madryd')
+    assert check_exercise_answer(translation, 'Madryd').typos == 1
+    assert check_exercise_answer(choice, 'madrid').exact
+
+def test_correct_answers_are_compiled_once():
+    compile_answer.cache_clear()
+    for _ in range(10):
+        check_answer('gracias', 'Gracias|Muchas gracias')
+    stats = answer_cache_stats()
+    assert (stats['misses'], stats['hits'], stats['size']) == (1, 9, 1)
+
+# Pary (poprawna odpowiedź, odpowiedź użytkownika) dla sześciu języków: dokładne,
+# bez znaków diakrytycznych, z literówkami i błędne
+BENCHMARK_ANSWERS = {
+    'en': [('Good morning|Morning', 'good morning'), ('thank you very much', 'thank you vrey much'),
+           ('(to) be', 'to bee'), ('cat', 'dog')],
+    'pl': [('Dziękuję bardzo', 'dziekuje bardzo'), ('Zażółć gęślą jaźń', 'zazolc gesla jazn'),
+           ('Przepraszam', 'przeprasam'), ('Łódź', 'Kraków')],
+    'es': [('¿Cómo estás?', 'como estas'), ('Buenos días', 'buenos dias'),
+           ('Muchas gracias', 'mucha gracias'), ('Mañana', 'ayer')],
+    'de': [('Die Straße', 'die strasse'), ('Entschuldigung', 'Entschuldigunk'),
+           ('Wie geht es dir?', 'wie geht es dir'), ('Brötchen', 'Käse')],
+    'fr': [("L'élève", 'leleve'), ("S'il vous plaît", 'sil vous plait'),
+           ('Au revoir', 'au revoar'), ('Le cœur', 'la tête')],
+    'ru': [('Здравствуйте', 'здраствуйте'), ('Спасибо', 'спасиба'),
+           ('Ёлка', 'елка'), ('До свидания', 'привет')],
+}
+
+def test_answers_in_all_languages():
+    pairs = [pair for language in BENCHMARK_ANSWERS.values() for pair in language]
+    results = [check_answer(answer, correct) for correct, answer in pairs]
+    assert [result.correct for result in results] == [True, True, True, False] * len(BENCHMARK_ANSWERS)
+
+@pytest.mark.skipif('LINGUALEAP_BENCH_ANSWERS' not in os.environ,
+                    reason="pomiar wydajności - LINGUALEAP_BENCH_ANSWERS=2000")
+def test_answer_checking_benchmark():
+    rounds = int(os.environ['LINGUALEAP_BENCH_ANSWERS'])
+    for language, language_pairs in BENCHMARK_ANSWERS.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for correct, answer in language_pairs:
+                check_answer(answer, correct)
+        per_check = (time.perf_counter() - start) / (rounds * len(language_pairs))
+        # Sprawdzenie (z odległością edycyjną) trwa kilka mikrosekund
+        assert per_check < 100e-6, f"{language}: {per_check * 1e6:.1f} µs"
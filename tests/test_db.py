@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+
+import re
+import sqlite3
+import threading
+import tracemalloc
+
+import pytest
+
+from database.db_manager import (ConnectionPool, DatabaseManager, close_all_pools,
+                                 compile_statement, get_pool, statement_cache_stats,
+                                 trace_statements)
+from database.cache import CatalogCache, catalog_cache
+from database.db_setup import CheckpointScheduler, ensure_db_exists
+from database.migrations import (MIGRATIONS, SCHEMA_VERSION, Migration, add_column, backfill,
+                                 get_schema_version, migrate)
+from database.models import Exercise, Language, Lesson, User
+from database.query_executor import QueryExecutor
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Ścieżka do pustej bazy z prostą tabelą testową."""
+    path = str(tmp_path / "test.db")
+    with DatabaseManager(path) as db:
+        db.execute_query("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield path
+    close_all_pools()
+
+def test_pool_reuses_connection_between_blocks(db_path):
+    pool = get_pool(db_path)
+    before = pool.stats()
+
+    for _ in range(5):
+        with DatabaseManager(db_path) as db:
+            db.insert('items', {'name': 'a'})
+
+    after = pool.stats()
+    assert after['misses'] == before['misses']
+    assert after['hits'] - before['hits'] == 5
+
+def test_nested_managers_get_separate_connections(db_path):
+    with DatabaseManager(db_path) as outer:
+        with DatabaseManager(db_path) as inner:
+            assert outer.connection is not inner.connection
+
+def test_connections_are_per_thread(db_path):
+    with DatabaseManager(db_path) as db:
+        main_connection = db.connection
+
+    seen = []
+    def worker():
+        with DatabaseManager(db_path) as db:
+            seen.append(db.connection)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert seen[0] is not main_connection
+
+def test_uncommitted_changes_are_rolled_back_on_release(db_path):
+    pool = get_pool(db_path)
+    connection = pool.acquire()
+    connection.execute("INSERT INTO items (name) VALUES ('x')")
+    pool.release(connection)
+
+    with DatabaseManager(db_path) as db:
+        assert db.fetch_all("SELECT * FROM items") == []
+
+def test_pool_times_out_when_exhausted(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "small.db"), max_size=1, timeout=0.05)
+    connection = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    pool.release(connection)
+
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['wait_time'] > 0
+    pool.close()
+
+def test_idle_connections_are_evicted(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "idle.db"), idle_timeout=0)
+    pool.release(pool.acquire())
+
+    assert pool.evict_idle() == 1
+    assert pool.stats()['idle'] == 0
+    pool.close()
+
+def test_transaction_commits_once_at_end(db_path):
+    with DatabaseManager(db_path) as db:
+        with db.transaction():
+            db.insert('items', {'name': 'a'})
+            db.insert('items', {'name': 'b'})
+            assert db.connection.in_transaction
+
+        assert not db.connection.in_transaction
+        assert len(db.fetch_all("SELECT * FROM items")) == 2
+
+def test_transaction_rolls_back_on_error(db_path):
+    with DatabaseManager(db_path) as db:
+        with pytest.raises(sqlite3.OperationalError):
+            with db.transaction():
+                db.insert('items', {'name': 'a'})
+                db.insert('missing_table', {'name': 'b'})
+
+        assert db.fetch_all("SELECT * FROM items") == []
+
+def test_nested_transaction_uses_savepoint(db_path):
+    with DatabaseManager(db_path) as db:
+        with db.transaction():
+            db.insert('items', {'name': 'outer'})
+            with pytest.raises(ValueError):
+                with db.transaction():
+                    db.insert('items', {'name': 'inner'})
+                    raise ValueError()
+
+        names = [row['name'] for row in db.fetch_all("SELECT name FROM items")]
+        assert names == ['outer']
+
+def test_insert_many_and_update_many(db_path):
+    with DatabaseManager(db_path) as db:
+        inserted = db.insert_many('items', ({'id': i, 'name': f"n{i}"} for i in range(1, 101)))
+        assert inserted == 100
+
+        updated = db.update_many('items', [{'id': i, 'name': 'x'} for i in range(1, 11)])
+        assert updated == 10
+
+        rows = db.fetch_all("SELECT name FROM items WHERE name = 'x'")
+        assert len(rows) == 10
+
+def test_storage_profile_is_applied_to_pooled_connections(app_db):
+    with DatabaseManager(app_db) as db:
+        pragma = lambda name: db.connection.execute(f"PRAGMA {name}").fetchone()[0]
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('temp_store') == 2   # MEMORY
+        assert pragma('busy_timeout') == 5000
+        assert pragma('foreign_keys') == 1
+
+def test_checkpoint_scheduler_collects_metrics(app_db):
+    with DatabaseManager(app_db) as db:
+        db.insert_many('languages', [{'code': f"x{i}", 'name': 'X'} for i in range(200)])
+
+    scheduler = CheckpointScheduler(app_db, optimize_interval=0)
+    assert scheduler.wal_size() > 0
+    scheduler.run_once()
+
+    metrics = scheduler.metrics()
+    assert metrics['checkpoints'] == 1
+    assert metrics['optimizations'] == 1
+    assert metrics['last_wal_size_before'] > 0
+    assert metrics['last_checkpoint_duration'] > 0
+    assert metrics['errors'] == 0
+
+def test_checkpoint_scheduler_evicts_idle_connections(app_db):
+    def use_database():
+        with DatabaseManager(app_db) as db:
+            db.fetch_scalar("SELECT COUNT(*) FROM languages")
+
+    worker = threading.Thread(target=use_database)
+    worker.start()
+    worker.join()
+    assert get_pool(app_db).stats()['idle'] >= 1
+
+    scheduler = CheckpointScheduler(app_db)
+    scheduler.run_once()
+
+    # Połączenie zakończonego wątku zostaje zamknięte, połączenie tego wątku (z checkpointu) zostaje
+    assert scheduler.metrics()['evicted_connections'] == 1
+    assert get_pool(app_db).stats()['idle'] == 1
+
+# Wyszukiwania po tabelach użytkownika wykonywane poza modelami (statystyki, osiągnięcia, ulubione)
+USER_LOOKUPS = [
+    ("SELECT 1 FROM user_progress WHERE user_id = ? AND lesson_id = ? AND completed = 1 LIMIT 1", (0, 1)),
+    ("SELECT lesson_id, completed FROM user_progress WHERE user_id = ?", (0,)),
+    ("SELECT achievement_id FROM user_achievements WHERE user_id = ?", (0,)),
+    ("SELECT 1 FROM user_achievements WHERE user_id = ? AND achievement_id = ?", (0, 1)),
+    ("SELECT word, translation FROM user_favorites WHERE user_id = ? AND language_id = ?", (0, 1)),
+]
+
+def run_model_queries():
+    """
+    Wywołuje wszystkie zapytania odczytu z database/models.py i wyszukiwania
+    z USER_LOOKUPS (plan nie zależy od danych).
+    """
+    User.get_by_username('nobody')
+    User.get_by_email('nobody@example.com')
+    User.get_by_id(0)
+    User({'id': 0}).get_stats()
+    User({'id': 0}).get_streak()
+    Language.get_by_code('xx')
+    Language.get_active()
+    Lesson.get_by_language(1)
+    Lesson.get_by_category(1)
+    Lesson({'id': 1}).get_exercises()
+    Exercise.get_by_lesson(1)
+    Exercise.get_by_lessons([2, 3])
+    with DatabaseManager() as db:
+        for sql, params in USER_LOOKUPS:
+            db.fetch_all(sql, params)
+
+def test_model_queries_use_indexes(default_db):
+    with trace_statements() as statements:
+        run_model_queries()
+
+    queries = {sql for sql in statements
+               if sql.lstrip().upper().startswith('SELECT') and re.search(r'\bWHERE\b', sql, re.IGNORECASE)}
+    assert len(queries) >= len(USER_LOOKUPS)
+    for table in ('user_progress', 'user_achievements', 'user_favorites'):
+        assert any(table in sql for sql in queries), table
+
+    with DatabaseManager() as db:
+        for sql in queries:
+            plan = [row['detail'] for row in db.fetch_all(f"EXPLAIN QUERY PLAN {sql}")]
+            for step in plan:
+                assert not step.startswith('SCAN'), f"{sql}: {plan}"
+                assert 'USE TEMP B-TREE' not in step, f"{sql}: {plan}"
+
+def test_indexes_are_added_to_existing_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE languages (id INTEGER PRIMARY KEY, code TEXT, name TEXT, is_active BOOLEAN)")
+    for table in ('lessons', 'exercises', 'user_progress', 'user_achievements', 'user_favorites'):
+        connection.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, language_id, category_id, is_active, "
+                           f"order_index, lesson_id, user_id, completed, achievement_id)")
+    connection.close()
+
+    ensure_db_exists(path)
+
+    connection = sqlite3.connect(path)
+    names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    connection.close()
+    assert 'idx_lessons_language' in names
+    assert 'idx_exercises_lesson' in names
+
+def test_new_database_is_at_latest_schema_version(app_db):
+    with DatabaseManager(app_db) as db:
+        assert get_schema_version(db.connection) == SCHEMA_VERSION
+
+def test_migrate_fast_path_reads_only_user_version(app_db):
+    with trace_statements(app_db) as statements:
+        assert migrate(app_db) == []
+    assert statements == ['PRAGMA user_version']
+
+def add_counter_column(conn):
+    add_column(conn, 'languages', 'lesson_count', 'INTEGER')
+
+def fill_counter_column(conn):
+    backfill(conn, 'languages', 'lesson_count = 0', 'lesson_count IS NULL', batch_size=2)
+
+def test_migration_with_batched_backfill(app_db):
+    migrations = MIGRATIONS + [Migration(SCHEMA_VERSION + 1, "licznik lekcji",
+                                         add_counter_column, fill_counter_column)]
+    report = migrate(app_db, migrations=migrations)
+
+    assert [version for version, _, _ in report] == [SCHEMA_VERSION + 1]
+    with DatabaseManager(app_db) as db:
+        assert get_schema_version(db.connection) == SCHEMA_VERSION + 1
+        rows = db.fetch_all("SELECT lesson_count FROM languages")
+        assert rows and all(row['lesson_count'] == 0 for row in rows)
+
+def test_failed_upgrade_leaves_schema_version(app_db):
+    def broken(conn):
+        conn.execute("ALTER TABLE languages ADD COLUMN lesson_count INTEGER")
+        conn.execute("SELECT * FROM no_such_table")
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(app_db, migrations=MIGRATIONS + [Migration(SCHEMA_VERSION + 1, "błąd", broken)])
+    with DatabaseManager(app_db) as db:
+        assert get_schema_version(db.connection) == SCHEMA_VERSION
+        assert 'lesson_count' not in [row['name'] for row in db.fetch_all("PRAGMA table_info(languages)")]
+
+def test_interrupted_backfill_is_resumed_without_rerunning_upgrade(app_db):
+    def add_column_once(conn):
+        # Celowo nieidempotentne - drugie wykonanie zgłosiłoby błąd
+        conn.execute("ALTER TABLE languages ADD COLUMN lesson_count INTEGER")
+    def crash(conn):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        migrate(app_db, migrations=MIGRATIONS + [Migration(SCHEMA_VERSION + 1, "licznik lekcji",
+                                                          add_column_once, crash)])
+    with DatabaseManager(app_db) as db:
+        assert get_schema_version(db.connection) == SCHEMA_VERSION + 1
+
+    migrations = MIGRATIONS + [Migration(SCHEMA_VERSION + 1, "licznik lekcji",
+                                         add_column_once, fill_counter_column)]
+    assert migrate(app_db, migrations=migrations) == []
+    with DatabaseManager(app_db) as db:
+        assert all(row['lesson_count'] == 0 for row in db.fetch_all("SELECT lesson_count FROM languages"))
+        assert db.fetch_scalar("SELECT COUNT(*) FROM schema_pending_backfills") == 0
+
+def test_migration_dry_run_does_not_touch_database(app_db):
+    migrations = MIGRATIONS + [Migration(SCHEMA_VERSION + 1, "licznik lekcji",
+                                         add_counter_column, fill_counter_column)]
+    report = migrate(app_db, dry_run=True, migrations=migrations)
+
+    assert len(report) == 1 and report[0][2] >= 0
+    with DatabaseManager(app_db) as db:
+        assert get_schema_version(db.connection) == SCHEMA_VERSION
+        columns = [row['name'] for row in db.fetch_all("PRAGMA table_info(languages)")]
+        assert 'lesson_count' not in columns
+
+def test_statement_cache_reuses_sql_for_repeated_writes(db_path):
+    with DatabaseManager(db_path) as db:
+        db.insert('items', {'name': 'warm'})
+        before = statement_cache_stats()
+        for i in range(10):
+            db.insert('items', {'name': f"n{i}"})
+            db.update('items', {'name': 'u'}, 'id = ?', (i,))
+        after = statement_cache_stats()
+
+    requests = (after['hits'] + after['misses']) - (before['hits'] + before['misses'])
+    assert requests == 20
+    assert after['misses'] - before['misses'] <= 1  # co najwyżej pierwszy UPDATE
+
+def test_compile_statement_builds_expected_sql():
+    assert compile_statement('insert', 'items', ('a', 'b')) == "INSERT INTO items (a, b) VALUES (?, ?)"
+    assert compile_statement('update', 'items', ('a',), 'id = ?') == "UPDATE items SET a = ? WHERE id = ?"
+    assert compile_statement('select', 'items', condition='id = ?') == "SELECT * FROM items WHERE id = ?"
+    assert compile_statement('delete', 'items', condition='id = ?') == "DELETE FROM items WHERE id = ?"
+    with pytest.raises(ValueError):
+        compile_statement('merge', 'items')
+
+def test_fetch_one_returns_first_row(db_path):
+    with DatabaseManager(db_path) as db:
+        db.insert_many('items', [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+        assert db.fetch_one("SELECT * FROM items ORDER BY id") == {'id': 1, 'name': 'a'}
+        assert db.fetch_one("SELECT * FROM items WHERE id = ?", (2,)) == {'id': 2, 'name': 'b'}
+        assert db.fetch_one("SELECT * FROM items WHERE id = ?", (3,)) is None
+
+def test_iter_rows_streams_in_batches(db_path):
+    with DatabaseManager(db_path) as db:
+        db.insert_many('items', ({'id': i, 'name': str(i)} for i in range(1, 1001)))
+
+        rows = db.iter_rows("SELECT id, name FROM items ORDER BY id", batch_size=64)
+        first = next(rows)
+        assert first['id'] == 1 and first['name'] == '1'
+        # Inne zapytania nie przerywają strumienia
+        assert db.fetch_scalar("SELECT COUNT(*) FROM items") == 1000
+        assert sum(1 for _ in rows) == 999
+
+def test_fetch_column_and_scalar(db_path):
+    with DatabaseManager(db_path) as db:
+        db.insert_many('items', ({'id': i, 'name': str(i)} for i in range(1, 11)))
+        assert db.fetch_column("SELECT id FROM items ORDER BY id", batch_size=3) == list(range(1, 11))
+        assert db.fetch_scalar("SELECT MAX(id) FROM items") == 10
+        assert db.fetch_scalar("SELECT id FROM items WHERE id > 100", default=0) == 0
+
+def test_models_are_built_directly_from_cursor(default_db):
+    admin = User.get_by_username('admin')
+    assert admin.username == 'admin' and admin.is_admin == 1
+    assert not hasattr(admin, '__dict__')
+    assert User.get_by_id(admin.id).email == 'admin@lingualeap.com'
+
+    languages = Language.get_active()
+    assert [language.code for language in languages] == ['en', 'pl', 'es', 'de', 'fr', 'ru']
+
+    with DatabaseManager() as db:
+        partial = db.fetch_model(Lesson, "SELECT 7 AS id, 'Tytuł' AS title, 'x' AS unknown")
+    assert (partial.id, partial.title, partial.xp_reward, partial.is_active) == (7, 'Tytuł', 10, True)
+
+class _DictLesson:
+    """Model w starym stylu: słownik na wiersz i setattr do __dict__ obiektu."""
+
+    def __init__(self, data):
+        for key, value in data.items():
+            setattr(self, key, value)
+
+def _peak_bytes_per_row(load, rows):
+    tracemalloc.start()
+    try:
+        result = load()
+        _, size = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(result) == rows
+    return size / rows
+
+def test_slots_models_use_less_memory_per_row(default_db):
+    rows = 2000
+    with DatabaseManager() as db:
+        db.insert_many('lessons', ({'title': f"Lekcja {i}", 'language_id': 1, 'order_index': i}
+                                   for i in range(rows)))
+        query = "SELECT * FROM lessons WHERE language_id = 1 AND is_active = 1 ORDER BY order_index"
+
+        before = _peak_bytes_per_row(lambda: [_DictLesson(item) for item in db.fetch_all(query)], rows)
+        after = _peak_bytes_per_row(lambda: db.fetch_models(Lesson, query), rows)
+
+    assert 0 < after < before * 0.75, f"alokacja na wiersz: dict + __dict__ = {before:.0f}, __slots__ = {after:.0f}"
+
+def test_catalog_cache_serves_repeated_lookups_without_queries(default_db):
+    first = Language.get_by_code('pl')
+    active = Language.get_active()
+    with trace_statements() as statements:
+        second = Language.get_by_code('pl')
+        by_id = Language.get_by_id(first.id)
+        again = Language.get_active()
+
+    assert second is first and by_id is first
+    assert any(language is first for language in again)
+    assert not [sql for sql in statements if 'FROM languages' in sql]
+    assert active == again and active is not again
+    assert catalog_cache.stats()['hits'] >= 3
+
+def test_catalog_cache_is_invalidated_by_save(default_db):
+    language = Language.get_by_code('pl')
+    language.name = 'Polish'
+    language.save()
+    assert Language.get_by_code('pl').name == 'Polish'
+
+def test_catalog_cache_detects_external_content_changes(default_db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, 'check_interval', 0)
+    assert Language.get_by_code('xx') is None
+
+    with DatabaseManager() as db:
+        db.insert('languages', {'code': 'xx', 'name': 'Test'})
+
+    assert Language.get_by_code('xx').name == 'Test'
+
+def test_catalog_cache_evicts_least_recently_used():
+    cache = CatalogCache(max_size=2)
+    cache._validate = lambda: None
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_query_projection_defers_unselected_columns(default_db):
+    with DatabaseManager() as db:
+        db.insert('lessons', {'id': 1, 'title': 'Powitania', 'language_id': 2, 'order_index': 1})
+        db.insert_many('exercises', ({'lesson_id': 1, 'type': 'text', 'content': f"Treść {i}",
+                                      'correct_answer': 'a', 'hint': 'podpowiedź', 'order_index': i}
+                                     for i in range(3)))
+
+    with trace_statements() as statements:
+        exercises = (Exercise.query().only('type', 'order_index')
+                     .where("lesson_id = ?", 1).order_by("order_index").all())
+    assert statements == ["SELECT id, type, order_index FROM exercises "
+                          "WHERE (lesson_id = 1) ORDER BY order_index"]
+    assert [exercise.order_index for exercise in exercises] == [0, 1, 2]
+
+    with trace_statements() as statements:
+        assert exercises[0].hint == 'podpowiedź'
+        assert exercises[0].content == 'Treść 0'
+    assert len(statements) == 1  # wszystkie odroczone kolumny jednym zapytaniem
+
+def test_list_views_read_only_rendered_columns(default_db):
+    with DatabaseManager() as db:
+        db.insert_many('lessons', ({'id': i, 'title': f'Lekcja {i}', 'description': 'opis', 'language_id': 2,
+                                    'order_index': i} for i in (1, 2)))
+        db.insert_many('exercises', ({'lesson_id': 1, 'type': 'text', 'content': f"Treść {i}",
+                                      'correct_answer': 'a', 'order_index': i} for i in range(3)))
+
+    with trace_statements() as statements:
+        user = User.get_by_username('admin')
+        lessons = Lesson.get_list(2)
+        counts = Exercise.count_by_lessons([lesson.id for lesson in lessons])
+        outline = Exercise.get_outline(1)
+    assert 'password_hash' not in statements[0] and 'salt' not in statements[0]
+    assert 'description' not in statements[1]
+    assert all('content' not in sql for sql in statements[2:])
+    assert user.username == 'admin' and [lesson.title for lesson in lessons] == ['Lekcja 1', 'Lekcja 2']
+    assert counts == {1: 3, 2: 0}
+    assert [exercise.type for exercise in outline] == ['text'] * 3
+
+    with trace_statements() as statements:
+        assert User.get_by_username('admin', with_credentials=True).password_hash
+        assert user.password_hash
+    assert len(statements) == 2
+
+    with trace_statements() as statements:
+        assert User.get_by_email(user.email).username == 'admin'
+        assert User.get_by_email(user.email, with_credentials=True).salt
+    assert 'password_hash' not in statements[0] and len(statements) == 2
+
+def test_query_count_first_and_validation(default_db):
+    assert Language.query().where("is_active = 1").count() == 6
+    assert Language.query().only('code').order_by("code").first().code == 'de'
+    with pytest.raises(ValueError):
+        Language.query().only('password_hash')
+    with pytest.raises(AttributeError):
+        Language().missing_attribute
+
+def test_eager_loading_avoids_query_per_lesson(default_db):
+    with DatabaseManager() as db:
+        db.insert_many('lessons', ({'id': i, 'title': f"Lekcja {i}", 'language_id': 2, 'order_index': i}
+                                   for i in range(1, 21)))
+        db.insert_many('exercises', ({'lesson_id': i % 20 + 1, 'type': 'text', 'content': str(i),
+                                      'correct_answer': 'a', 'order_index': i} for i in range(100)))
+
+    with trace_statements() as statements:
+        lessons = Lesson.get_by_language(2, with_exercises=True)
+        counts = [len(lesson.get_exercises()) for lesson in lessons]
+
+    content_queries = [sql for sql in statements if 'FROM lessons' in sql or 'FROM exercises' in sql]
+    assert len(content_queries) == 2
+    assert counts == [5] * 20
+    assert [e.order_index for e in lessons[0].get_exercises()] == sorted(e.order_index for e in lessons[0].get_exercises())
+
+    # Prefetch zasila też cache, więc pojedyncze pobrania nie wykonują zapytań
+    with trace_statements() as statements:
+        Exercise.get_by_lesson(lessons[3].id)
+    assert not [sql for sql in statements if 'FROM exercises' in sql]
+
+@pytest.fixture
+def executor():
+    executor = QueryExecutor(max_workers=1)
+    yield executor
+    executor.shutdown()
+
+def test_executor_coalesces_identical_inflight_queries(executor):
+    release = threading.Event()
+    calls = []
+
+    def slow_query(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    first = executor.submit(slow_query, 21, key=('answer',))
+    second = executor.submit(slow_query, 21, key=('answer',))
+    release.set()
+
+    assert first is not second
+    assert first.result(5) == second.result(5) == 42
+    assert calls == [21]
+    assert executor.stats()['coalesced'] == 1
+
+def test_executor_cancels_group_without_delivering_results(executor):
+    release = threading.Event()
+    executor.submit(release.wait, 5)  # zajmuje jedyny wątek
+    pending = executor.submit(lambda: 'tab', group='tab:1')
+    other = executor.submit(lambda: 'other', group='tab:2')
+
+    assert executor.cancel_group('tab:1') == 1
+    release.set()
+
+    assert pending.cancelled()
+    assert other.result(5) == 'other'
+    assert executor.stats()['cancelled'] == 1
+
+def test_executor_keeps_shared_job_while_someone_waits(executor):
+    release = threading.Event()
+    executor.submit(release.wait, 5)
+    cancelled = executor.submit(lambda: 'data', key='k', group='tab:1')
+    waiting = executor.submit(lambda: 'data', key='k', group='tab:2')
+
+    executor.cancel_group('tab:1')
+    release.set()
+
+    assert cancelled.cancelled()
+    assert waiting.result(5) == 'data'
+
+def test_executor_propagates_errors(executor):
+    def failing():
+        raise sqlite3.OperationalError("database is locked")
+
+    future = executor.submit(failing)
+    with pytest.raises(sqlite3.OperationalError):
+        future.result(5)
+    assert executor.stats()['failed'] == 1
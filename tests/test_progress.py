@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.db_manager import DatabaseManager, trace_statements
+from progress.achievements import AchievementEngine, RuleError, parse_requirement
+from progress.spaced_repetition import ReviewScheduler, ReviewState, sm2
+from progress.streak_manager import StreakManager
+from progress.user_stats import StatsEngine
+
+@pytest.fixture
+def default_db(default_db):
+    """Baza aplikacji z trzema lekcjami, trzema ćwiczeniami i dwoma dodatkowymi użytkownikami."""
+    with DatabaseManager() as db:
+        with db.transaction():
+            db.insert_many('lessons', [
+                {'title': f'Lekcja {i}', 'language_id': 1, 'xp_reward': 10, 'order_index': i}
+                for i in range(1, 4)
+            ])
+            db.insert_many('exercises', [
+                {'lesson_id': 1, 'type': 'translation', 'content': f'Słowo {i}', 'correct_answer': f'word {i}',
+                 'order_index': i}
+                for i in range(1, 4)
+            ])
+            db.insert_many('users', [
+                {'username': name, 'email': f'{name}@example.com', 'password_hash': 'x', 'salt': 'x'}
+                for name in ('ola', 'jan')
+            ])
+            for table in ('user_stats', 'user_streaks'):
+                db.insert_many(table, [{'user_id': 2}, {'user_id': 3}])
+    return default_db
+
+@pytest.fixture
+def engine(default_db):
+    return StatsEngine(flush_size=1000, flush_interval=60)
+
+def test_stats_are_buffered_and_flushed_in_one_transaction(default_db, engine):
+    engine.record_answer(2, 1, correct=True, answer='word 1')
+    engine.record_answer(2, 2, correct=False, answer='wrod 2')
+    engine.record_lesson_completion(2, 1, 15)
+    engine.record_lesson_completion(2, 1, 12)
+    engine.record_lesson_completion(3, 2, 10)
+    assert engine.pending(2)['total_xp'] == 27
+
+    with trace_statements(default_db) as statements:
+        assert engine.flush() == 5
+    assert sum(1 for sql in statements if sql.strip().upper() == 'BEGIN IMMEDIATE') == 1
+    assert sum(1 for sql in statements if sql.strip().upper() == 'COMMIT') == 1
+
+    stats = engine.get_stats(2)
+    assert stats['total_xp'] == 27
+    assert stats['lessons_completed'] == 1
+    assert (stats['exercises_completed'], stats['correct_answers'], stats['incorrect_answers']) == (2, 1, 1)
+    assert engine.get_stats(3)['lessons_completed'] == 1
+
+    # Powtórne ukończenie lekcji daje XP, ale nie zwiększa lessons_completed
+    engine.record_lesson_completion(2, 1, 5)
+    assert engine.get_stats(2)['lessons_completed'] == 1
+    assert engine.check_consistency() == []
+
+def test_flush_size_triggers_write(default_db):
+    engine = StatsEngine(flush_size=3, flush_interval=60)
+    for exercise_id in (1, 2, 3):
+        engine.record_answer(2, exercise_id, correct=True)
+
+    assert engine.stats()['buffered_events'] == 0
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT correct_answers FROM user_stats WHERE user_id = 2") == 3
+
+def test_failed_flush_keeps_progress_and_stats_together(default_db, engine):
+    engine.record_lesson_completion(2, 1, 10)
+    engine.record_lesson_completion(2, 999, 10)   # naruszenie klucza obcego
+
+    assert engine.flush() == 0
+    assert engine.stats()['buffered_events'] == 2
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_progress") == 0
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_stats WHERE total_xp > 0") == 0
+
+def test_rebuild_fixes_inconsistent_stats(default_db, engine):
+    engine.record_answer(2, 1, correct=True)
+    engine.record_answer(2, 2, correct=False)
+    engine.record_lesson_completion(2, 1, 10)
+    engine.record_lesson_completion(2, 2, 20)
+    engine.record_lesson_completion(3, 3, 30)
+    engine.flush()
+
+    with DatabaseManager() as db:
+        db.execute_query("UPDATE user_stats SET total_xp = 0, lessons_completed = 7 WHERE user_id = 2")
+        db.execute_query("UPDATE user_stats SET exercises_completed = 1 WHERE user_id = 3")
+        db.execute_query("UPDATE user_stats SET correct_answers = 0 WHERE user_id = 2")
+
+    mismatches = engine.check_consistency(batch_size=2)
+    assert (2, 'total_xp', 0, 30) in mismatches
+    assert (2, 'lessons_completed', 7, 2) in mismatches
+    assert (3, 'exercises_completed', 1, 0) in mismatches
+    assert (2, 'correct_answers', 0, 1) in mismatches
+    with DatabaseManager() as db:
+        db.execute_query("DELETE FROM user_stats WHERE user_id = 1")
+    assert engine.check_consistency(user_ids=[1]) == [(1, 'user_stats', None, 'wiersz')]
+
+    with trace_statements(default_db) as statements:
+        assert engine.rebuild(batch_size=2) == 3
+    aggregates = [sql for sql in statements if 'GROUP BY user_id' in sql]
+    assert len(aggregates) == 4
+    # Agregaty są czytane wewnątrz transakcji zapisu
+    boundaries = [sql for sql in statements if sql in ('BEGIN IMMEDIATE', 'COMMIT') or 'GROUP BY user_id' in sql]
+    assert boundaries == ['BEGIN IMMEDIATE', aggregates[0], aggregates[1], 'COMMIT',
+                          'BEGIN IMMEDIATE', aggregates[2], aggregates[3], 'COMMIT']
+
+    assert engine.check_consistency() == []
+    assert engine.get_stats(1)['total_xp'] == 0
+
+def test_answer_events_are_invisible_until_flush_and_lost_only_with_buffer(default_db, engine):
+    engine.record_answer(2, 1, correct=True)
+    engine.record_answer(2, 2, correct=True)
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM answer_events") == 0
+
+    # Awaria procesu = utrata obiektu z buforem; baza pozostaje spójna
+    crashed = StatsEngine(flush_size=1000, flush_interval=60)
+    crashed.record_answer(3, 3, correct=False)
+    del crashed
+
+    engine.flush()
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM answer_events") == 2
+        assert db.fetch_scalar("SELECT COUNT(*) FROM answer_events WHERE user_id = 3") == 0
+    assert engine.check_consistency() == []
+
+def test_answer_events_are_append_only(default_db, engine):
+    engine.record_answer(2, 1, correct=True)
+    engine.flush()
+
+    with DatabaseManager() as db:
+        with pytest.raises(sqlite3.IntegrityError):
+            db.connection.execute("UPDATE answer_events SET correct = 0")
+        with pytest.raises(sqlite3.IntegrityError):
+            db.connection.execute("DELETE FROM answer_events")
+
+def test_full_buffer_is_flushed_by_background_thread(default_db):
+    engine = StatsEngine(flush_size=5, flush_interval=60)
+    flushed_in = []
+    engine.add_listener(lambda user_id, changed: flushed_in.append(threading.current_thread().name))
+    engine.start()
+    try:
+        for _ in range(5):
+            engine.record_answer(2, 1, correct=True)
+        deadline = time.monotonic() + 5
+        while not flushed_in and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert flushed_in == ['stats-flush']
+
+        # Zatrzymanie (zamknięcie aplikacji) zapisuje resztę bufora
+        engine.record_answer(2, 2, correct=False)
+    finally:
+        engine.stop()
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM answer_events") == 6
+
+@pytest.mark.parametrize('requirement', [
+    "__import__('os').system('x')",
+    'lessons_completed >= ',
+    'unknown_metric > 1',
+    'lessons_completed >= 1 xor total_xp > 5',
+    'lessons_completed >= -1',
+])
+def test_rule_parser_rejects_invalid_requirements(requirement):
+    with pytest.raises(RuleError):
+        parse_requirement(requirement)
+
+def test_rule_predicate_and_sql():
+    engine = AchievementEngine()
+    engine.load([(1, 'lessons_completed >= 2 and total_xp > 10 or current_streak == 7')])
+    rule = engine.rules()[0]
+
+    assert rule.metrics == {'lessons_completed', 'total_xp', 'current_streak'}
+    assert rule({'lessons_completed': 2, 'total_xp': 11, 'current_streak': 0})
+    assert not rule({'lessons_completed': 2, 'total_xp': 10, 'current_streak': 0})
+    assert rule({'lessons_completed': 0, 'total_xp': 0, 'current_streak': 7})
+    assert 'OR' in rule.sql() and 'AND' in rule.sql()
+
+def test_stats_change_awards_only_affected_rules(default_db, engine):
+    achievements = AchievementEngine()
+    engine.add_listener(achievements.on_stats_change)
+
+    engine.record_answer(2, 1, correct=True)
+    engine.flush()
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM user_achievements") == 0
+
+    engine.record_lesson_completion(2, 1, 10)
+    engine.flush()
+    with DatabaseManager() as db:
+        assert db.fetch_column("SELECT achievement_id FROM user_achievements WHERE user_id = 2") == [1]
+
+    # Zdobyte osiągnięcie jest pomijane bez zapytań do bazy
+    with trace_statements(default_db) as statements:
+        assert achievements.on_stats_change(2, {'lessons_completed'}) == []
+    assert statements == []
+
+def test_award_all_uses_set_based_inserts(default_db, engine):
+    engine.record_lesson_completion(2, 1, 10)
+    engine.record_lesson_completion(3, 2, 10)
+    engine.flush()
+    with DatabaseManager() as db:
+        db.insert_many('lessons', [{'title': f'Obca {code}', 'language_id': language_id}
+                                   for language_id, code in ((2, 'pl'), (3, 'es'))])
+        db.execute_query("UPDATE user_streaks SET current_streak = 7 WHERE user_id = 1")
+    engine.record_lesson_completion(3, 4, 10)
+    engine.record_lesson_completion(3, 5, 10)
+    engine.flush()
+
+    achievements = AchievementEngine()
+    with trace_statements(default_db) as statements:
+        assert achievements.award_all() == 4
+    assert sum(1 for sql in statements if 'INSERT INTO user_achievements' in sql) == 3
+    assert achievements.award_all() == 0
+
+    with DatabaseManager() as db:
+        earned = db.fetch_all("SELECT user_id, achievement_id FROM user_achievements ORDER BY user_id, achievement_id")
+    assert [(row['user_id'], row['achievement_id']) for row in earned] == [(1, 2), (2, 1), (3, 1), (3, 3)]
+
+def test_streak_grows_daily_and_resets_after_gap(default_db):
+    streaks = StreakManager(reset_hours=36, tz=timezone.utc)
+    day = datetime(2026, 3, 1, 18, 0, tzinfo=timezone.utc)
+
+    assert streaks.record_activity(2, day) == 1
+    with trace_statements(default_db) as statements:
+        assert streaks.record_activity(2, day + timedelta(hours=2)) == 1
+    assert statements == []
+
+    assert streaks.record_activity(2, day + timedelta(days=1)) == 2
+    assert streaks.record_activity(2, day + timedelta(days=2, hours=-10)) == 3
+    assert streaks.get_streak(2, day + timedelta(days=4))['current_streak'] == 0
+    assert streaks.record_activity(2, day + timedelta(days=4)) == 1
+
+    # Stan z bazy po utracie pamięci podręcznej
+    assert StreakManager(tz=timezone.utc).get_streak(2, day + timedelta(days=4))['max_streak'] == 3
+
+def test_streak_day_boundary_follows_timezone(default_db):
+    warsaw = timezone(timedelta(hours=2))
+    streaks = StreakManager(tz=warsaw)
+    # 21:30 UTC i 22:30 UTC to różne dni w strefie UTC+2
+    evening = datetime(2026, 6, 1, 21, 30, tzinfo=timezone.utc)
+
+    streaks.record_activity(2, evening - timedelta(hours=2))
+    assert streaks.record_activity(2, evening) == 1
+    assert streaks.record_activity(2, evening + timedelta(hours=1)) == 2
+
+def test_same_day_activity_is_flushed(default_db):
+    streaks = StreakManager(tz=timezone.utc)
+    day = datetime(2026, 3, 1, 8, 0, tzinfo=timezone.utc)
+    streaks.record_activity(2, day)
+    streaks.record_activity(2, day + timedelta(hours=5))
+
+    assert streaks.flush() == 1
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT last_activity_date FROM user_streaks WHERE user_id = 2") == '2026-03-01 13:00:00'
+
+def test_rollover_resets_expired_streaks_with_index(default_db):
+    streaks = StreakManager(tz=timezone.utc)
+    now = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+    streaks.record_activity(2, now - timedelta(hours=40))
+    streaks.record_activity(3, now - timedelta(hours=3))
+
+    with DatabaseManager() as db:
+        plan = db.fetch_all(
+            "EXPLAIN QUERY PLAN UPDATE user_streaks SET current_streak = 0 "
+            "WHERE current_streak > 0 AND last_activity_date < ?", ('x',)
+        )
+    assert 'idx_user_streaks_active' in ' '.join(row['detail'] for row in plan)
+
+    assert streaks.rollover(now) == 1
+    assert streaks.get_streak(2, now)['current_streak'] == 0
+    assert streaks.get_streak(3, now)['current_streak'] == 1
+    assert streaks.rollover(now) == 0
+
+def test_start_runs_first_rollover_in_background(default_db, monkeypatch):
+    streaks = StreakManager(tz=timezone.utc)
+    started = threading.Event()
+    release = threading.Event()
+    threads = []
+    
+    def slow_rollover(now=None):
+        threads.append(threading.current_thread())
+        started.set()
+        release.wait(5)
+        return 0
+    monkeypatch.setattr(streaks, 'rollover', slow_rollover)
+    
+    streaks.start()
+    assert started.wait(5)
+    assert threads == [streaks._thread]
+    release.set()
+    streaks.stop()
+
+def check_rollover(users):
+    """Zeruje wygasłe streaki users użytkowników i sprawdza wynik oraz plan zapytania."""
+    now = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+    with DatabaseManager() as db:
+        db.connection.execute("PRAGMA foreign_keys = OFF")
+        with db.transaction():
+            db.cursor.executemany(
+                "INSERT INTO user_streaks (user_id, current_streak, max_streak, last_activity_date) VALUES (?, 3, 3, ?)",
+                ((100 + i, (now - timedelta(hours=i % 72)).strftime('%Y-%m-%d %H:%M:%S')) for i in range(users))
+            )
+        db.connection.execute("PRAGMA foreign_keys = ON")
+
+    streaks = StreakManager(tz=timezone.utc)
+    expected = sum(1 for i in range(users) if i % 72 > 36)
+    assert streaks.rollover(now) == expected
+    assert streaks.rollover(now) == 0
+
+    # Powtórny przebieg czyta tylko aktywne streaki z częściowego indeksu
+    with DatabaseManager() as db:
+        plan = db.fetch_all(
+            "EXPLAIN QUERY PLAN UPDATE user_streaks SET current_streak = 0 "
+            "WHERE current_streak > 0 AND last_activity_date < ?", ('x',)
+        )
+        active = db.fetch_scalar("SELECT COUNT(*) FROM user_streaks WHERE current_streak > 0")
+    assert 'idx_user_streaks_active' in ' '.join(row['detail'] for row in plan)
+    assert active == users - expected
+
+def test_rollover_uses_partial_index(default_db):
+    check_rollover(720)
+
+@pytest.mark.skipif('LINGUALEAP_BENCH_USERS' not in os.environ,
+                    reason="pomiar wydajności - LINGUALEAP_BENCH_USERS=1000000")
+def test_rollover_at_scale(default_db):
+    check_rollover(int(os.environ['LINGUALEAP_BENCH_USERS']))
+
+def test_sm2_intervals():
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    state = ReviewState()
+    intervals = []
+    for _ in range(4):
+        state = sm2(state, 5, now)
+        intervals.append(state.interval)
+    assert intervals[:2] == [1.0, 6.0]
+    assert intervals[3] > intervals[2] > 6.0
+    assert state.due_at == now + timedelta(days=state.interval)
+
+    failed = sm2(state, 1, now)
+    assert (failed.repetitions, failed.interval, failed.lapses) == (0, 1.0, 1)
+    assert failed.ease < state.ease
+    assert sm2(ReviewState(ease=1.3), 0, now).ease == 1.3
+
+@pytest.fixture
+def reviews(default_db):
+    """Harmonogram powtórek z 200 ćwiczeniami użytkownika 2 o różnych terminach."""
+    with DatabaseManager() as db:
+        with db.transaction():
+            db.insert_many('exercises', [
+                {'lesson_id': 2, 'type': 'translation', 'content': f'Zdanie {i}', 'correct_answer': f'sentence {i}',
+                 'order_index': i}
+                for i in range(200)
+            ])
+    scheduler = ReviewScheduler(heap_size=100, preload_hours=12, flush_size=1000)
+    start = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    for offset, exercise_id in enumerate(range(4, 204)):
+        scheduler.enroll(2, [exercise_id], start + timedelta(hours=offset - 150))
+    return scheduler
+
+def test_review_session_uses_index_range_read(default_db, reviews):
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    with DatabaseManager() as db:
+        plan = ' '.join(row['detail'] for row in db.fetch_all(
+            "EXPLAIN QUERY PLAN SELECT exercise_id FROM review_items "
+            "WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?", (2, 'x', 50)
+        ))
+    assert 'idx_review_items_due' in plan
+    assert 'TEMP B-TREE' not in plan
+
+    with trace_statements(default_db) as statements:
+        due = reviews.due_items(2, 50, now)
+        again = reviews.due_items(2, 50, now)
+    assert len(statements) == 1
+    assert due == again == list(range(4, 54))
+    assert reviews.due_items(3, 50, now) == []
+
+def test_review_updates_heap_and_flushes(reviews):
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    due = reviews.due_items(2, 50, now)
+    for exercise_id in due[:10]:
+        reviews.review(2, exercise_id, 5, now)
+    reviews.record_answer(2, due[10], correct=False, now=now)
+
+    after = reviews.due_items(2, 50, now)
+    assert after[:39] == due[11:]
+    assert due[10] not in after and due[0] not in after
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM review_items WHERE last_review IS NOT NULL") == 0
+
+    assert reviews.flush() == 11
+    with DatabaseManager() as db:
+        rows = db.fetch_all("SELECT exercise_id, repetitions, lapses, due_at FROM review_items "
+                            "WHERE last_review IS NOT NULL ORDER BY exercise_id")
+    assert len(rows) == 11
+    assert [row['lapses'] for row in rows] == [0] * 10 + [1]
+    assert all(row['due_at'] == '2026-03-02 12:00:00' for row in rows)
+
+    # Po wyczerpaniu kopca kolejne zaległe elementy są doczytywane z bazy
+    assert len(reviews.due_items(2, 200, now)) == 151 - 11
+
+def test_reschedule_overdue_spreads_backlog(reviews):
+    now = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+    assert reviews.reschedule_overdue(now, daily_limit=60) == 151 - 60
+    with DatabaseManager() as db:
+        days = db.fetch_all("SELECT due_at, COUNT(*) AS n FROM review_items "
+                            "WHERE user_id = 2 AND due_at LIKE '%:30:00' GROUP BY due_at ORDER BY due_at")
+    assert [(row['due_at'], row['n']) for row in days] == [('2026-03-02 12:30:00', 60), ('2026-03-03 12:30:00', 31)]
+    assert len(reviews.due_items(2, 200, now)) == 60
+    assert reviews.reschedule_overdue(now, daily_limit=60) == 0
+
+def test_reschedule_keeps_unsaved_reviews(reviews, monkeypatch):
+    now = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+    due = reviews.due_items(2, 10, now)
+    reviews.review(2, due[0], 5, now)
+    reviews.reschedule_overdue(now, daily_limit=60)
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM review_items WHERE last_review IS NOT NULL") == 1
+
+    # Zmiany, których nie udało się zapisać, przeżywają wyczyszczenie pamięci
+    reviews.review(2, due[1], 5, now)
+    original_flush = reviews.flush
+    monkeypatch.setattr(reviews, 'flush', lambda user_id=None: 0)
+    reviews.reschedule_overdue(now, daily_limit=60)
+    reviews.forget(2)
+    assert due[1] not in reviews.due_items(2, 200, now)
+    assert original_flush() == 1
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT COUNT(*) FROM review_items WHERE last_review IS NOT NULL") == 2
+
+def test_review_during_load_is_not_overwritten(reviews, monkeypatch):
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    original_fetch_all = DatabaseManager.fetch_all
+    reviewer = threading.Thread(target=lambda: (reviews.review(2, 4, 5, now), reviews.flush(2)))
+
+    def fetch_during_review(db, query, params=None):
+        rows = original_fetch_all(db, query, params)
+        if not reviewer.is_alive() and 'FROM review_items' in query:
+            # Ocena z innego wątku w trakcie odczytu zakresu
+            reviewer.start()
+            reviewer.join(0.2)
+        return rows
+    monkeypatch.setattr(DatabaseManager, 'fetch_all', fetch_during_review)
+
+    reviews.due_items(2, 50, now)
+    reviewer.join(5)
+    monkeypatch.setattr(DatabaseManager, 'fetch_all', original_fetch_all)
+
+    assert 4 not in reviews.due_items(2, 50, now)
+    with DatabaseManager() as db:
+        assert db.fetch_scalar("SELECT repetitions FROM review_items WHERE user_id = 2 AND exercise_id = 4") == 1
+
+def test_start_reschedules_overdue_in_background(reviews, monkeypatch):
+    started = threading.Event()
+    threads = []
+    
+    def reschedule(now=None):
+        threads.append(threading.current_thread())
+        started.set()
+        return 0
+    monkeypatch.setattr(reviews, 'reschedule_overdue', reschedule)
+    
+    reviews.start()
+    assert started.wait(5)
+    assert threads == [reviews._thread]
+    reviews.stop()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from database.query_executor import query_executor
+
+logger = logging.getLogger(__name__)
+
+class _ResultRelay(QObject):
+    """Przenosi wywołania zwrotne z wątków puli do wątku interfejsu."""
+    
+    delivered = pyqtSignal(object)
+    
+    def __init__(self):
+        super().__init__()
+        # Sygnał emitowany z innego wątku trafia do kolejki zdarzeń wątku GUI
+        self.delivered.connect(self._run)
+    
+    def _run(self, callback):
+        callback()
+
+_relay = None
+
+def _get_relay():
+    """Zwraca obiekt przekaźnika utworzony w wątku interfejsu."""
+    global _relay
+    if _relay is None:
+        _relay = _ResultRelay()
+    return _relay
+
+def run_async(fn, *args, on_result=None, on_error=None, key=None, group=None, **kwargs):
+    """
+    Wykonuje fn(*args, **kwargs) w puli wątków (query_executor), a wynik
+    przekazuje do on_result w wątku interfejsu. Musi być wywołane z wątku GUI.
+    Zwraca Future, który można anulować (np. przy zmianie zakładki).
+    """
+    relay = _get_relay()
+    future = query_executor.submit(fn, *args, key=key, group=group, **kwargs)
+    
+    def done(finished):
+        if finished.cancelled():
+            return
+        error = finished.exception()
+        if error is not None:
+            if on_error:
+                relay.delivered.emit(lambda: on_error(error))
+            else:
+                logger.error(f"Błąd podczas ładowania danych w tle: {error}")
+            return
+        if on_result:
+            result = finished.result()
+            relay.delivered.emit(lambda: on_result(result))
+    
+    future.add_done_callback(done)
+    return future
+
+def cancel_group(group):
+    """Anuluje oczekujące zadania z grupy (np. zakładki, którą opuszczono)."""
+    return query_executor.cancel_group(group)
@@ -9,9 +9,14 @@ from PyQt5.QtGui import QIcon, QPixmap, QFont
 from PyQt5.QtCore import Qt, QSize, pyqtSignal
 
 from auth.login_manager import LoginManager
-from database.models import Language, Lesson, User
+from content.lesson_manager import lesson_manager
+from progress.user_stats import stats_engine
+from progress.streak_manager import streak_manager
+from progress.spaced_repetition import review_scheduler
+from progress.achievements import achievement_engine
 from ui.lesson_browser import LessonBrowserWidget
 from ui.profile_view import ProfileWidget
+from ui.async_loader import run_async, cancel_group
 from config import APP_NAME, LOGO_PATH
 
 logger = logging.getLogger(__name__)
@@ -30,6 +35,8 @@ class DashboardWindow(QMainWindow):
         
         self.setWindowTitle(f"{APP_NAME} - Dashboard")
         self.setMinimumSize(900, 700)
+        self.load_group = f"dashboard:{id(self)}"
+        self.user_data_loaded = False
         self.setup_ui()
         self.load_user_data()
     
@@ -65,9 +72,9 @@ class DashboardWindow(QMainWindow):
         top_bar.addWidget(user_info)
         
         # Przycisk wylogowania
-        logout_button = QPushButton("Wyloguj")
-        logout_button.clicked.connect(self.handle_logout)
-        top_bar.addWidget(logout_button)
+        self.logout_button = QPushButton("Wyloguj")
+        self.logout_button.clicked.connect(self.handle_logout)
+        top_bar.addWidget(self.logout_button)
         
         main_layout.addLayout(top_bar)
         
@@ -156,13 +163,38 @@ class DashboardWindow(QMainWindow):
         self.profile_widget = ProfileWidget(self.user)
         self.tab_widget.addTab(self.profile_widget, "Profil")
         
+        # Zmiana zakładki anuluje ładowanie danych dashboardu, które nie jest już potrzebne
+        self.tab_widget.currentChanged.connect(self.tab_changed)
+        
         # Dodanie widoku z zakładkami do głównego layoutu
         main_layout.addWidget(self.tab_widget)
     
+    def tab_changed(self, index):
+        """Anuluje ładowanie danych po opuszczeniu zakładki Dashboard i wznawia je po powrocie."""
+        if index == 0:
+            if not self.user_data_loaded:
+                self.load_user_data()
+        else:
+            cancel_group(self.load_group)
+    
     def load_user_data(self):
-        """Wczytuje dane użytkownika i aktualizuje UI."""
-        # Pobieranie języków
-        languages = Language.get_active()
+        """Zleca wczytanie danych użytkownika w tle - UI zostanie zaktualizowane po ich pobraniu."""
+        run_async(
+            self.fetch_user_data,
+            on_result=self.apply_user_data,
+            on_error=lambda error: logger.error(f"Nie udało się wczytać danych dashboardu: {error}"),
+            key=('dashboard', self.user.id),
+            group=self.load_group
+        )
+    
+    def fetch_user_data(self):
+        """Pobiera dane dashboardu z bazy (wykonywane w wątku puli)."""
+        return lesson_manager.get_languages(), stats_engine.get_stats(self.user.id), streak_manager.get_streak(self.user.id)
+    
+    def apply_user_data(self, data):
+        """Aktualizuje UI danymi pobranymi w tle (wykonywane w wątku interfejsu)."""
+        languages, stats, streak_info = data
+        self.user_data_loaded = True
         
         # Tworzenie kart dla każdego języka
         for i, language in enumerate(languages):
@@ -195,14 +227,12 @@ class DashboardWindow(QMainWindow):
             self.languages_grid.addWidget(language_frame, row, col)
         
         # Aktualizacja statystyk
-        stats = self.user.get_stats()
         if stats:
             self.xp_label.setText(f"Łączne doświadczenie: {stats['total_xp']} XP")
             self.lessons_completed_label.setText(f"Ukończone lekcje: {stats['lessons_completed']}")
             self.exercises_completed_label.setText(f"Ukończone ćwiczenia: {stats['exercises_completed']}")
         
         # Aktualizacja streaka
-        streak_info = self.user.get_streak()
         if streak_info:
             self.streak_label.setText(f"Aktualny streak: {streak_info['current_streak']} dni")
     
@@ -222,15 +252,39 @@ class DashboardWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
+            # Zapis postępów i zamknięcie sesji w tle - okno logowania pojawi się po ich zakończeniu
+            cancel_group(self.load_group)
+            self.logout_button.setEnabled(False)
+            run_async(
+                self.end_session, self.user.id,
+                on_result=self.logout_finished,
+                on_error=self.logout_failed
+            )
+    
+    def end_session(self, user_id):
+        """Zapisuje postępy użytkownika i unieważnia jego sesję (wykonywane w wątku puli)."""
+        try:
+            stats_engine.flush()
+            streak_manager.forget(user_id)
+            review_scheduler.forget(user_id)
+            achievement_engine.forget(user_id)
+        finally:
             LoginManager.logout()
-            
-            # Otwarcie okna logowania
-            from ui.login_window import LoginWindow
-            self.login_window = LoginWindow()
-            self.login_window.show()
-            
-            # Zamknięcie dashboardu
-            self.close()
+    
+    def logout_finished(self, result=None):
+        """Przełącza na okno logowania po wylogowaniu (wykonywane w wątku interfejsu)."""
+        # Otwarcie okna logowania
+        from ui.login_window import LoginWindow
+        self.login_window = LoginWindow()
+        self.login_window.show()
+        
+        # Zamknięcie dashboardu
+        self.close()
+    
+    def logout_failed(self, error):
+        """Wylogowuje mimo błędu zapisu (wykonywane w wątku interfejsu)."""
+        logger.error(f"Błąd podczas wylogowania: {error}")
+        self.logout_finished()
     
     def open_admin_panel(self):
         """Otwiera panel administratora."""
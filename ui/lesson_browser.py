@@ -3,21 +3,33 @@
 import logging
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
                            QComboBox, QScrollArea, QGridLayout, QGroupBox, QFrame,
-                           QSizePolicy, QProgressBar, QStackedWidget)
+                           QSizePolicy, QProgressBar, QStackedWidget, QLineEdit,
+                           QListWidget, QListWidgetItem)
 from PyQt5.QtGui import QIcon, QPixmap, QFont
-from PyQt5.QtCore import Qt, QSize, pyqtSignal
+from PyQt5.QtCore import Qt, QSize, QTimer, pyqtSignal
 
 from database.models import Language, Lesson
+from content.lesson_manager import lesson_manager
 from ui.exercise_view import ExerciseView
+from ui.async_loader import run_async, cancel_group
+from config import SEARCH_DEBOUNCE_MS
 
 logger = logging.getLogger(__name__)
 
 class LessonBrowserWidget(QWidget):
     """Widget do przeglądania i wyboru lekcji."""
     
+    # Emitowany z ID lekcji wybranej z listy lekcji
+    lesson_selected = pyqtSignal(int)
+    # Emitowany z ID lekcji wybranej z wyników wyszukiwania
+    lesson_search_selected = pyqtSignal(int)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_language_id = None
+        self.search_group = f"lesson_search:{id(self)}"
+        self.lessons_group = f"lesson_list:{id(self)}"
+        self.search_text = ""
         self.setup_ui()
         self.load_languages()
     
@@ -37,8 +49,25 @@ class LessonBrowserWidget(QWidget):
         
         top_panel.addStretch()
         
+        # Wyszukiwarka lekcji - zapytanie jest wysyłane dopiero po chwili bez pisania
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Szukaj lekcji...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.schedule_search)
+        top_panel.addWidget(self.search_edit)
+        
         main_layout.addLayout(top_panel)
         
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        
+        self.search_results = QListWidget()
+        self.search_results.setVisible(False)
+        self.search_results.itemActivated.connect(self.search_result_activated)
+        main_layout.addWidget(self.search_results)
+        
         # Obszar z lekcjami
         self.lesson_area_stack = QStackedWidget()
         
@@ -60,4 +89,124 @@ class LessonBrowserWidget(QWidget):
         
         # Tytuł sekcji lekcji
         self.lessons_title = QLabel("Lekcje")
-        self.lessons_title.setFont(QFont("Segoe UI", 14, QFont.Bold))
\ No newline at end of file
+        self.lessons_title.setFont(QFont("Segoe UI", 14, QFont.Bold))
+        lessons_layout.addWidget(self.lessons_title)
+        
+        # Lista lekcji - tylko tytuł, nagroda i liczba ćwiczeń (bez treści ćwiczeń)
+        self.lessons_list = QListWidget()
+        self.lessons_list.itemActivated.connect(self.lesson_activated)
+        lessons_layout.addWidget(self.lessons_list)
+        
+        self.lesson_area_stack.addWidget(self.lessons_widget)
+        main_layout.addWidget(self.lesson_area_stack)
+    
+    def load_languages(self):
+        """Wczytuje aktywne języki w tle."""
+        run_async(
+            lesson_manager.get_languages,
+            on_result=self.show_languages,
+            on_error=lambda error: logger.error(f"Błąd podczas ładowania języków: {error}"),
+            key=('languages',)
+        )
+    
+    def show_languages(self, languages):
+        """Wypełnia listę wyboru języka."""
+        selected = self.current_language_id
+        self.language_combo.blockSignals(True)
+        self.language_combo.clear()
+        self.language_combo.addItem("-- wybierz --", None)
+        for language in languages:
+            self.language_combo.addItem(language.name, language.id)
+        self.language_combo.blockSignals(False)
+        if selected is not None:
+            self.select_language(selected)
+    
+    def select_language(self, language_id):
+        """Wybiera język (np. ostatnio używany z dashboardu)."""
+        self.current_language_id = language_id
+        index = self.language_combo.findData(language_id)
+        if index < 0:
+            # Języki jeszcze się wczytują - wybór zostanie zastosowany w show_languages
+            return
+        if index == self.language_combo.currentIndex():
+            self.language_changed(index)
+        else:
+            self.language_combo.setCurrentIndex(index)
+    
+    def language_changed(self, index):
+        """Wczytuje w tle listę lekcji wybranego języka."""
+        language_id = self.language_combo.itemData(index)
+        self.current_language_id = language_id
+        cancel_group(self.lessons_group)
+        if language_id is None:
+            self.lesson_area_stack.setCurrentIndex(0)
+            return
+        run_async(
+            lesson_manager.get_lesson_list, language_id,
+            on_result=lambda lessons: self.show_lessons(language_id, lessons),
+            on_error=lambda error: logger.error(f"Błąd podczas ładowania lekcji: {error}"),
+            key=('lesson_list', language_id),
+            group=self.lessons_group
+        )
+    
+    def show_lessons(self, language_id, lessons):
+        """Wyświetla listę lekcji (o ile dotyczy bieżącego języka)."""
+        if language_id != self.current_language_id:
+            return
+        self.lessons_list.clear()
+        for lesson, exercise_count in lessons:
+            item = QListWidgetItem(f"{lesson.title} - {exercise_count} ćwiczeń, {lesson.xp_reward} XP")
+            item.setData(Qt.UserRole, lesson.id)
+            self.lessons_list.addItem(item)
+        self.lessons_title.setText(f"Lekcje ({len(lessons)})")
+        self.lesson_area_stack.setCurrentIndex(1)
+    
+    def lesson_activated(self, item):
+        """Przekazuje ID lekcji wybranej z listy."""
+        lesson_id = item.data(Qt.UserRole)
+        if lesson_id is not None:
+            self.lesson_selected.emit(lesson_id)
+    
+    def schedule_search(self, text):
+        """Odkłada wyszukiwanie do chwili, gdy użytkownik przestanie pisać (debouncing)."""
+        self.search_text = text.strip()
+        if not self.search_text:
+            self.search_timer.stop()
+            cancel_group(self.search_group)
+            self.show_search_results("", [])
+            return
+        # Każde naciśnięcie klawisza przesuwa termin wyszukiwania
+        self.search_timer.start()
+    
+    def run_search(self):
+        """Wyszukuje lekcje w tle; nieaktualne zapytania są anulowane."""
+        text = self.search_text
+        cancel_group(self.search_group)
+        run_async(
+            lesson_manager.search_lessons, text, self.current_language_id,
+            on_result=lambda lessons: self.show_search_results(text, lessons),
+            on_error=lambda error: logger.error(f"Błąd podczas wyszukiwania lekcji: {error}"),
+            key=('lesson_search', text, self.current_language_id),
+            group=self.search_group
+        )
+    
+    def show_search_results(self, text, lessons):
+        """Wyświetla wyniki wyszukiwania (o ile dotyczą bieżącego tekstu)."""
+        if text != self.search_text:
+            return
+        self.search_results.clear()
+        for lesson in lessons:
+            item = QListWidgetItem(lesson.title)
+            item.setData(Qt.UserRole, lesson.id)
+            if lesson.description:
+                item.setToolTip(lesson.description)
+            self.search_results.addItem(item)
+        if text and not lessons:
+            self.search_results.addItem(QListWidgetItem("Brak wyników"))
+        self.search_results.setVisible(bool(text))
+    
+    def search_result_activated(self, item):
+        """Przekazuje ID lekcji wybranej z wyników wyszukiwania."""
+        lesson_id = item.data(Qt.UserRole)
+        if lesson_id is not None:
+            self.lesson_search_selected.emit(lesson_id)
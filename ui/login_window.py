@@ -11,6 +11,7 @@ from auth.user_manager import UserManager
 from auth.login_manager import LoginManager
 from ui.main_window import MainWindow
 from ui.dashboard import DashboardWindow
+from ui.async_loader import run_async
 from config import APP_NAME, LOGO_PATH
 
 logger = logging.getLogger(__name__)
@@ -87,9 +88,9 @@ class LoginWindow(QMainWindow):
         login_layout.addWidget(self.login_error_label)
         
         # Przycisk logowania
-        login_button = QPushButton("Zaloguj się")
-        login_button.clicked.connect(self.handle_login)
-        login_layout.addWidget(login_button)
+        self.login_button = QPushButton("Zaloguj się")
+        self.login_button.clicked.connect(self.handle_login)
+        login_layout.addWidget(self.login_button)
         
         # Formularz rejestracji
         register_layout = QVBoxLayout(register_tab)
@@ -126,9 +127,9 @@ class LoginWindow(QMainWindow):
         register_layout.addWidget(self.register_error_label)
         
         # Przycisk rejestracji
-        register_button = QPushButton("Zarejestruj się")
-        register_button.clicked.connect(self.handle_register)
-        register_layout.addWidget(register_button)
+        self.register_button = QPushButton("Zarejestruj się")
+        self.register_button.clicked.connect(self.handle_register)
+        register_layout.addWidget(self.register_button)
         
         # Przycisk do testowania aplikacji bez logowania (tylko w fazie rozwoju)
         debug_login_button = QPushButton("Debuguj bez logowania")
@@ -145,13 +146,28 @@ class LoginWindow(QMainWindow):
             self.login_error_label.setVisible(True)
             return
         
-        # Autentykacja użytkownika
+        # Autentykacja użytkownika i utworzenie sesji w tle - haszowanie i zapytania nie blokują okna
+        self.login_button.setEnabled(False)
+        self.login_error_label.setVisible(False)
+        run_async(
+            self.authenticate, username, password,
+            on_result=self.login_finished,
+            on_error=lambda error: self.login_finished((None, "Wystąpił błąd podczas logowania. Spróbuj ponownie."))
+        )
+    
+    def authenticate(self, username, password):
+        """Uwierzytelnia użytkownika i zapisuje jego sesję (wykonywane w wątku puli)."""
         user, error = UserManager.authenticate_user(username, password)
+        if user and not LoginManager.login(user):
+            return None, "Nie udało się utworzyć sesji. Spróbuj ponownie."
+        return user, error
+    
+    def login_finished(self, result):
+        """Obsługuje wynik logowania (wykonywane w wątku interfejsu)."""
+        user, error = result
+        self.login_button.setEnabled(True)
         
         if user:
-            # Zapisanie informacji o zalogowanym użytkowniku
-            LoginManager.login(user)
-            
             # Otwarcie głównego okna aplikacji
             self.dashboard = DashboardWindow()
             self.dashboard.show()
@@ -180,15 +196,26 @@ class LoginWindow(QMainWindow):
             self.register_error_label.setVisible(True)
             return
         
-        # Rejestracja użytkownika
-        user, error = UserManager.register_user(username, email, password)
+        # Rejestracja użytkownika w tle - haszowanie hasła nie blokuje okna
+        self.register_button.setEnabled(False)
+        self.register_error_label.setVisible(False)
+        run_async(
+            UserManager.register_user, username, email, password,
+            on_result=self.register_finished,
+            on_error=lambda error: self.register_finished((None, "Wystąpił błąd podczas rejestracji. Spróbuj ponownie."))
+        )
+    
+    def register_finished(self, result):
+        """Obsługuje wynik rejestracji (wykonywane w wątku interfejsu)."""
+        user, error = result
+        self.register_button.setEnabled(True)
         
         if user:
             # Wyświetlenie informacji o sukcesie
             QMessageBox.information(
                 self,
                 "Rejestracja udana",
-                f"Konto dla użytkownika {username} zostało utworzone. Możesz się teraz zalogować."
+                f"Konto dla użytkownika {user.username} zostało utworzone. Możesz się teraz zalogować."
             )
             
             # Przełączenie na zakładkę logowania